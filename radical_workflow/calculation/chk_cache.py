@@ -0,0 +1,132 @@
+import os
+import re
+import gzip
+import glob
+import shutil
+import hashlib
+import subprocess
+
+
+def model_chemistry(level_of_theory):
+    """Reduce a Gaussian route line to its method/basis, e.g. 'wb97xd/def2svp'."""
+    for token in level_of_theory.lower().split():
+        if "/" in token and not token.startswith("iop"):
+            return token
+    return " ".join(level_of_theory.lower().split())
+
+
+def add_guess_read(level_of_theory):
+    m = re.search(r'guess=\(([^)]*)\)', level_of_theory, flags=re.IGNORECASE)
+    if m:
+        return level_of_theory[:m.start()] + f"guess=(read,{m[1]})" + level_of_theory[m.end():]
+    m = re.search(r'guess=(\w+)', level_of_theory, flags=re.IGNORECASE)
+    if m:
+        return level_of_theory[:m.start()] + f"guess=(read,{m[1]})" + level_of_theory[m.end():]
+    return level_of_theory + " guess=read"
+
+
+class CheckpointCache:
+    """
+    Size-capped store of Gaussian checkpoints keyed by mol_id and model chemistry.
+    Entries are gzip-compressed .chk files, or compressed formatted .fchk files if
+    formatted=True (portable across machines, needs formchk/unfchk from g16_path).
+    The least recently used entries are evicted once the store exceeds max_size_mb.
+    """
+    def __init__(self, cache_dir, max_size_mb=20000, formatted=False, g16_path=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size_mb * 1024 * 1024
+        self.formatted = formatted
+        self.g16_path = g16_path
+        if formatted:
+            assert g16_path is not None, "g16_path is needed for formchk/unfchk"
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def suffix(self):
+        return ".fchk.gz" if self.formatted else ".chk.gz"
+
+    def entry_path(self, mol_id, level_of_theory):
+        digest = hashlib.sha1(model_chemistry(level_of_theory).encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{mol_id}_{digest}{self.suffix}")
+
+    def put(self, mol_id, level_of_theory, chk_path):
+        if not os.path.exists(chk_path):
+            return False
+        entry = self.entry_path(mol_id, level_of_theory)
+        src = chk_path
+        if self.formatted:
+            src = os.path.splitext(chk_path)[0] + ".fchk"
+            subprocess.run([os.path.join(self.g16_path, "formchk"), chk_path, src], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if not os.path.exists(src):
+                return False
+
+        # write to a temporary name first so that other workers never read a partial entry
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+        with open(src, "rb") as f_in, gzip.open(tmp_entry, "wb", compresslevel=3) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.replace(tmp_entry, entry)
+        if self.formatted:
+            os.remove(src)
+
+        self.evict()
+        return True
+
+    def get(self, mol_id, chk_path, level_of_theory, any_level=False):
+        """
+        Restore the checkpoint of mol_id computed at level_of_theory to chk_path. With
+        any_level, the most recent entry of mol_id at another level is used if there is none.
+        Returns True if a checkpoint was restored.
+        """
+        entries = [self.entry_path(mol_id, level_of_theory)]
+        if any_level:
+            others = glob.glob(os.path.join(self.cache_dir, f"{mol_id}_*{self.suffix}"))
+            others.sort(key=lambda x: self.mtime(x), reverse=True)
+            entries.extend(entry for entry in others if entry != entries[0])
+
+        for entry in entries:
+            dst = os.path.splitext(chk_path)[0] + ".fchk" if self.formatted else chk_path
+            try:
+                with gzip.open(entry, "rb") as f_in, open(dst, "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            except (FileNotFoundError, OSError, EOFError):
+                # evicted by another worker or corrupted, try the next one
+                continue
+            if self.formatted:
+                subprocess.run([os.path.join(self.g16_path, "unfchk"), dst, chk_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                os.remove(dst)
+                if not os.path.exists(chk_path):
+                    continue
+            try:
+                os.utime(entry)
+            except FileNotFoundError:
+                pass
+            return True
+        return False
+
+    @staticmethod
+    def mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except FileNotFoundError:
+            return 0.0
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry in glob.glob(os.path.join(self.cache_dir, f"*{self.suffix}")):
+            try:
+                stat = os.stat(entry)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                pass
+            total_size -= size
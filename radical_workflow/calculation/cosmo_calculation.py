@@ -1,5 +1,7 @@
 from fileinput import filename
 import os
+import re
+import copy
 import shutil
 import subprocess
 import csv
@@ -8,12 +10,23 @@ import traceback
 import pickle as pkl
 import tarfile
 
+from joblib import Parallel, delayed
+
 from .utils import REPLACE_LETTER
+from .watchdog import run_command
+from radical_workflow.parser.tar_archive import install_tar
+from radical_workflow.parser.cosmo_parser import read_cosmo_tab_lines
 
 from rdkit import Chem
 from .file_parser import mol2xyz
 
-def cosmo_calc(mol_id, cosmotherm_path, cosmo_database_path, charge, mult, T_list, df_pure, xyz, scratch_dir, tmp_mol_dir, save_dir, input_dir):
+def cosmo_calc(mol_id, cosmotherm_path, cosmo_database_path, charge, mult, T_list, df_pure, xyz, scratch_dir, tmp_mol_dir, save_dir, input_dir, watchdog_rules=None, solvent_batch_size=1, n_jobs=1, max_retries=2, turbomole_n_procs=None, solvent_database_dir=None):
+    """
+    Run Turbomole and then COSMOtherm for every solvent in df_pure, n_jobs cosmotherm processes
+    at a time. A solvent is done once its .tab file is in tmp_mol_dir, so a rerun of the molecule
+    only runs the solvents that are still missing. Failed solvents are retried max_retries times.
+    n_jobs is the core budget of the task, the two Turbomole jobs default to half of it each.
+    """
     num_atoms = len(xyz.splitlines())
     xyz = str(num_atoms) + "\n\n" + xyz
 
@@ -32,21 +45,18 @@ def cosmo_calc(mol_id, cosmotherm_path, cosmo_database_path, charge, mult, T_lis
         #turbomole
         print(f"Running Turbomole for {mol_id}...")
 
-        os.makedirs("xyz")
-        xyz_mol_id = f'{mol_id}.xyz'
-        with open(os.path.join("xyz", xyz_mol_id), "w+") as f:
-            f.write(xyz)
-
-        txtfile = f'{mol_id}.txt'
-        with open(txtfile, "w+") as f:
-            f.write(f"{mol_id} {charge} {mult}")
-
-        #run the job
-        logfile = mol_id + '.log'
-        outfile = mol_id + '.out'
-        with open(outfile, 'w') as out:
-            subprocess.run(f'calculate -l {txtfile} -m BP-TZVPD-FINE-COSMO-SP -f xyz -din xyz > {logfile}', shell=True, stdout=out, stderr=out)
-            subprocess.run(f'calculate -l {txtfile} -m BP-TZVPD-GAS-SP -f xyz -din xyz > {logfile}', shell=True, stdout=out, stderr=out)
+        #run the cosmo and gas phase jobs at the same time, each with half of the n_jobs cores of this task
+        if turbomole_n_procs is None:
+            turbomole_n_procs = max(n_jobs // 2, 1)
+        jobs = [start_turbomole_sp(mol_id, charge, mult, xyz, method, turbomole_n_procs) for method in TURBOMOLE_METHODS]
+        for method, (proc, out) in zip(TURBOMOLE_METHODS, jobs):
+            proc.wait()
+            out.close()
+            #copy the results back as they would be after running in this folder
+            for file in os.listdir(method):
+                if file != method and file.endswith(method) and os.path.isdir(os.path.join(method, file)):
+                    shutil.copytree(os.path.join(method, file), file, dirs_exist_ok=True)
+            print(f"Turbomole {method} done for {mol_id}")
 
         #copy the cosmo and energy files
         for file in os.listdir("CosmofilesBP-TZVPD-FINE-COSMO-SP"):
@@ -71,40 +81,39 @@ def cosmo_calc(mol_id, cosmotherm_path, cosmo_database_path, charge, mult, T_lis
         
         print(f"Turbomole calculation done for {mol_id}")
 
+    cosmo_command = os.path.join(cosmotherm_path, "COSMOtherm", "BIN-LINUX", "cosmotherm")
+
+    if solvent_batch_size > 1:
+        # solvents left over from a failed batch are run one by one below
+        cosmo_calc_solvent_batches(mol_id, cosmo_command, cosmotherm_path, cosmo_database_path, T_list, df_pure, solvent_batch_size, tmp_mol_dir, watchdog_rules, n_jobs, solvent_database_dir)
+
     # prepare for cosmo calculation
+    rows = []
     for index, row in df_pure.iterrows():
         cosmo_name = "".join(letter if letter not in REPLACE_LETTER else REPLACE_LETTER[letter] for letter in row.cosmo_name)
-        inpfile = f'{mol_id}_{cosmo_name}.inp'
-        tabfile = f'{mol_id}_{cosmo_name}.tab'
-        outfile = f'{mol_id}_{cosmo_name}.out'
-
-        if os.path.exists(os.path.join(tmp_mol_dir, tabfile)):
-            continue
-
-        print(f"Running COSMO calculation for {mol_id} in {index} {row.cosmo_name}...")
-
-        script = generate_cosmo_input(mol_id, cosmotherm_path, cosmo_database_path, T_list, row)
-        
-        with open(inpfile, "w+") as f:
-            f.write(script)
+        if not os.path.exists(os.path.join(tmp_mol_dir, f'{mol_id}_{cosmo_name}.tab')):
+            rows.append((index, row))
 
-        cosmo_command = os.path.join(cosmotherm_path, "COSMOtherm", "BIN-LINUX", "cosmotherm")
-        subprocess.run(f'{cosmo_command} {inpfile}', shell=True)
-
-        if not os.path.exists(tabfile):
-            print(f"COSMO calculation failed for {mol_id} in {index} {row.cosmo_name}")
-            os.chdir(current_dir)
-            return 
-        else:
-            shutil.copyfile(tabfile, os.path.join(tmp_mol_dir, tabfile))
-            shutil.copyfile(outfile, os.path.join(tmp_mol_dir, outfile))
-            print(f"COSMO calculation done for {mol_id} in {index} {row.cosmo_name}")
+    # each job gets its own copy of the watchdog rules as they keep the state of one log
+    done = Parallel(n_jobs=n_jobs, backend="threading")(delayed(cosmo_calc_solvent)(mol_id, cosmo_command, cosmotherm_path, cosmo_database_path, T_list, index, row, tmp_mol_dir, copy.deepcopy(watchdog_rules), max_retries, solvent_database_dir) for index, row in rows)
+    if not all(done):
+        print(f"COSMO calculation failed for {mol_id} in {len(done) - sum(done)} solvents, returning it to the inputs")
+        os.chdir(current_dir)
+        shutil.rmtree(scratch_dir_mol_id)
+        try:
+            os.rename(os.path.join(input_dir, f"{mol_id}.tmp"), os.path.join(input_dir, f"{mol_id}.in"))
+        except FileNotFoundError as e:
+            print(e)
+        return
 
     #tar the cosmo, energy and tab files
     tar_file = f"{mol_id}.tar"
     tar = tarfile.open(tar_file, "w")
     tar.add(os.path.join(tmp_mol_dir, energyfile))
     tar.add(os.path.join(tmp_mol_dir, cosmofile))
+    for file in sorted(os.listdir(tmp_mol_dir)):
+        if file.startswith(f"{mol_id}_batch_") and file.endswith(".out"):
+            tar.add(os.path.join(tmp_mol_dir, file))
 
     for index, row in df_pure.iterrows():
         solvent = row.cosmo_name
@@ -121,11 +130,13 @@ def cosmo_calc(mol_id, cosmotherm_path, cosmo_database_path, charge, mult, T_lis
             return
         each_data_list = get_dHsolv_value(each_data_list)
         tar.add(tabfile)
-        tar.add(outfile)
+        # solvents run in a batch share the batch .out file
+        if os.path.exists(outfile):
+            tar.add(outfile)
         
     tar.close()
 
-    shutil.copyfile(tar_file, os.path.join(save_dir, tar_file))
+    install_tar(tar_file, os.path.join(save_dir, tar_file))
     try:
         os.remove(os.path.join(input_dir, f"{mol_id}.tmp"))
         shutil.rmtree(tmp_mol_dir)
@@ -138,24 +149,122 @@ def cosmo_calc(mol_id, cosmotherm_path, cosmo_database_path, charge, mult, T_lis
     os.chdir(current_dir)
     shutil.rmtree(scratch_dir_mol_id)
     
-def generate_cosmo_input(name, cosmotherm_path, cosmo_database_path, T_list, row):
+TURBOMOLE_METHODS = ["BP-TZVPD-FINE-COSMO-SP", "BP-TZVPD-GAS-SP"]
+
+def start_turbomole_sp(mol_id, charge, mult, xyz, method, n_procs):
     """
-    Modified from ACS and Yunsie's code
+    Start a Turbomole single point with `calculate` in its own folder named after the method,
+    with its own log and n_procs cores. Returns the process and its open stdout file.
+    """
+    os.makedirs(os.path.join(method, "xyz"))
+    with open(os.path.join(method, "xyz", f'{mol_id}.xyz'), "w+") as f:
+        f.write(xyz)
+
+    txtfile = f'{mol_id}.txt'
+    with open(os.path.join(method, txtfile), "w+") as f:
+        f.write(f"{mol_id} {charge} {mult}")
+
+    env = os.environ.copy()
+    env["PARNODES"] = str(n_procs)
+    env["OMP_NUM_THREADS"] = str(n_procs)
+    logfile = f'{mol_id}_{method}.log'
+    out = open(os.path.join(method, f'{mol_id}_{method}.out'), 'w')
+    proc = subprocess.Popen(f'calculate -l {txtfile} -m {method} -f xyz -din xyz > {logfile}', shell=True, stdout=out, stderr=out, cwd=method, env=env)
+    return proc, out
+
+def cosmo_calc_solvent(mol_id, cosmo_command, cosmotherm_path, cosmo_database_path, T_list, index, row, tmp_mol_dir, watchdog_rules=None, max_retries=2, solvent_database_dir=None):
+    """Run cosmotherm for one solvent in the current directory. Returns True once its .tab file is in tmp_mol_dir."""
+    cosmo_name = "".join(letter if letter not in REPLACE_LETTER else REPLACE_LETTER[letter] for letter in row.cosmo_name)
+    inpfile = f'{mol_id}_{cosmo_name}.inp'
+    tabfile = f'{mol_id}_{cosmo_name}.tab'
+    outfile = f'{mol_id}_{cosmo_name}.out'
+
+    script = generate_cosmo_input(mol_id, cosmotherm_path, cosmo_database_path, T_list, row, solvent_database_dir)
+    with open(inpfile, "w+") as f:
+        f.write(script)
+
+    for attempt in range(max_retries + 1):
+        print(f"Running COSMO calculation for {mol_id} in {index} {row.cosmo_name}...")
+        run_command(f'{cosmo_command} {inpfile}', outfile, None, watchdog_rules)
+
+        if os.path.exists(tabfile):
+            shutil.copyfile(tabfile, os.path.join(tmp_mol_dir, tabfile))
+            shutil.copyfile(outfile, os.path.join(tmp_mol_dir, outfile))
+            print(f"COSMO calculation done for {mol_id} in {index} {row.cosmo_name}")
+            return True
+        print(f"COSMO calculation failed for {mol_id} in {index} {row.cosmo_name} (attempt {attempt + 1})")
+    return False
+
+def cosmo_calc_solvent_batches(mol_id, cosmo_command, cosmotherm_path, cosmo_database_path, T_list, df_pure, solvent_batch_size, tmp_mol_dir, watchdog_rules=None, n_jobs=1, solvent_database_dir=None):
+    """
+    Run the solvents without a .tab file solvent_batch_size at a time, each batch in a single
+    cosmotherm process, and write the usual {mol_id}_{cosmo_name}.tab file for every solvent
+    of the batch that finished.
     """
+    rows = []
+    for index, row in df_pure.iterrows():
+        cosmo_name = "".join(letter if letter not in REPLACE_LETTER else REPLACE_LETTER[letter] for letter in row.cosmo_name)
+        if not os.path.exists(os.path.join(tmp_mol_dir, f'{mol_id}_{cosmo_name}.tab')):
+            rows.append((cosmo_name, row))
+
+    batches = [rows[start:start + solvent_batch_size] for start in range(0, len(rows), solvent_batch_size)]
+    Parallel(n_jobs=n_jobs, backend="threading")(delayed(cosmo_calc_solvent_batch)(mol_id, cosmo_command, cosmotherm_path, cosmo_database_path, T_list, batch, tmp_mol_dir, copy.deepcopy(watchdog_rules), solvent_database_dir) for batch in batches)
+
+def cosmo_calc_solvent_batch(mol_id, cosmo_command, cosmotherm_path, cosmo_database_path, T_list, batch, tmp_mol_dir, watchdog_rules=None, solvent_database_dir=None):
+    """Run one batch of solvents in a single cosmotherm process and split its .tab per solvent."""
+    batch_name = f"{mol_id}_batch_{batch[0][0]}"
+    inpfile = f'{batch_name}.inp'
+    tabfile = f'{batch_name}.tab'
+    outfile = f'{batch_name}.out'
+
+    print(f"Running COSMO calculation for {mol_id} in {len(batch)} solvents ({batch_name})...")
+
+    script = generate_cosmo_batch_input(mol_id, cosmotherm_path, cosmo_database_path, T_list, [row for _, row in batch], solvent_database_dir)
+    with open(inpfile, "w+") as f:
+        f.write(script)
+
+    run_command(f'{cosmo_command} {inpfile}', outfile, None, watchdog_rules)
+
+    if not os.path.exists(tabfile):
+        print(f"COSMO calculation failed for {mol_id} in {batch_name}")
+        return
+
+    solvent_tabs = split_cosmo_batch_tab(tabfile, len(batch), len(T_list))
+    for (cosmo_name, row), solvent_tab in zip(batch, solvent_tabs):
+        if solvent_tab is None:
+            print(f"COSMO calculation failed for {mol_id} in {row.cosmo_name} ({batch_name})")
+            continue
+        with open(os.path.join(tmp_mol_dir, f'{mol_id}_{cosmo_name}.tab'), "w") as f:
+            f.write(solvent_tab)
+    if os.path.exists(outfile):
+        shutil.copyfile(outfile, os.path.join(tmp_mol_dir, outfile))
+    print(f"COSMO calculation done for {mol_id} in {batch_name}")
 
-    script = f"""ctd = BP_TZVPD_FINE_21.ctd cdir = "{cosmotherm_path}/COSMOthermX/../COSMOtherm/CTDATA-FILES" ldir = "{cosmotherm_path}/COSMOthermX/../licensefiles"
+COSMO_INPUT_HEADER = """ctd = BP_TZVPD_FINE_21.ctd cdir = "{cosmotherm_path}/COSMOthermX/../COSMOtherm/CTDATA-FILES" ldir = "{cosmotherm_path}/COSMOthermX/../licensefiles"
 notempty wtln ehfile
 !! generated by COSMOthermX !!
 """
 
-    #solvent
+def get_solvent_dir(cosmotherm_path, cosmo_database_path, row, solvent_database_dir=None):
+    """
+    Folder with the .cosmo files of a solvent, in the COSMOtherm or COSMObase database, or in
+    solvent_database_dir/{source} if the solvents were staged with cosmo_staging. Solvents
+    that failed to stage (staged column False) are read from the database.
+    """
     first_letter = row.cosmo_name[0]
     if not first_letter.isalpha() and not first_letter.isnumeric():
         first_letter = '0'
+    if solvent_database_dir is not None and row.get("staged", True):
+        return f"{solvent_database_dir}/{row.source}/{first_letter}"
     if row.source == "COSMOtherm":
-        solvent_dir = f"{cosmotherm_path}/COSMOtherm/DATABASE-COSMO/BP-TZVPD-FINE/{first_letter}"
+        return f"{cosmotherm_path}/COSMOtherm/DATABASE-COSMO/BP-TZVPD-FINE/{first_letter}"
     elif row.source == "COSMObase":
-        solvent_dir = f"{cosmo_database_path}/BP-TZVPD-FINE/{first_letter}"
+        return f"{cosmo_database_path}/BP-TZVPD-FINE/{first_letter}"
+
+def generate_cosmo_solvent_input(cosmotherm_path, cosmo_database_path, row, solvent_database_dir=None):
+    """The compound lines for the .cosmo files of one solvent, all its conformers in one Comp."""
+    script = ""
+    solvent_dir = get_solvent_dir(cosmotherm_path, cosmo_database_path, row, solvent_database_dir)
     script += "f = \"" + row.cosmo_name + "_c0.cosmo\" fdir=\"" + solvent_dir + "\""
     if int(row.cosmo_conf) > 1:
         script += " Comp = \"" + row.cosmo_name + "\" [ VPfile"
@@ -164,43 +273,92 @@ notempty wtln ehfile
         script += " ]\n"
     else:
         script += " VPfile\n"
+    return script
+
+def generate_cosmo_input(name, cosmotherm_path, cosmo_database_path, T_list, row, solvent_database_dir=None):
+    """
+    Modified from ACS and Yunsie's code
+    """
+
+    script = COSMO_INPUT_HEADER.format(cosmotherm_path=cosmotherm_path)
+
+    #solvent
+    script += generate_cosmo_solvent_input(cosmotherm_path, cosmo_database_path, row, solvent_database_dir)
 
     #solute
     script += "f = \"" + name + ".cosmo\" fdir=\".\" VPfile\n"
     for T in T_list:
         script += "henry  xh={ 1 0 } tk=" + str(T) + " GSOLV  \n"
     return script
+
+def generate_cosmo_batch_input(name, cosmotherm_path, cosmo_database_path, T_list, rows, solvent_database_dir=None):
+    """
+    One input with all solvents in rows followed by the solute, and a henry job for every
+    solvent and temperature, solvent by solvent in the order of rows.
+    """
+    script = COSMO_INPUT_HEADER.format(cosmotherm_path=cosmotherm_path)
+
+    #solvents
+    for row in rows:
+        script += generate_cosmo_solvent_input(cosmotherm_path, cosmo_database_path, row, solvent_database_dir)
+
+    #solute
+    script += "f = \"" + name + ".cosmo\" fdir=\".\" VPfile\n"
+    n_compounds = len(rows) + 1
+    for i in range(len(rows)):
+        xh = ["0"] * n_compounds
+        xh[i] = "1"
+        for T in T_list:
+            script += "henry  xh={ " + " ".join(xh) + " } tk=" + str(T) + " GSOLV  \n"
+    return script
+
+def split_cosmo_batch_tab(tab_file_path, n_solvents, n_temps):
+    """
+    Split the .tab of a batch input into the .tab text of each solvent, as written by a run
+    with only that solvent and the solute. The compound table of every job is cut down to
+    the row of its solvent and the row of the solute. Returns a list in the order of the
+    solvents, with None for solvents whose jobs did not all finish.
+    """
+    with open(tab_file_path, 'r') as f:
+        lines = f.readlines()
+
+    job_starts = [i for i, line in enumerate(lines) if "Settings  job" in line]
+    if not job_starts:
+        return [None] * n_solvents
+    preamble = lines[:job_starts[0]]
+    job_starts.append(len(lines))
+
+    jobs = []
+    for start, end in zip(job_starts[:-1], job_starts[1:]):
+        block = lines[start:end]
+        header = next((i for i, line in enumerate(block) if "Nr Compound" in line), None)
+        compound_rows = block[header + 1:header + 1 + n_solvents + 1] if header is not None else []
+        if len(compound_rows) < n_solvents + 1:
+            jobs.append(None)
+            continue
+        jobs.append((block[:header + 1], compound_rows, block[header + 1 + n_solvents + 1:]))
+
+    solvent_tabs = []
+    for i in range(n_solvents):
+        solvent_jobs = jobs[i * n_temps:(i + 1) * n_temps]
+        if len(solvent_jobs) < n_temps or any(job is None for job in solvent_jobs):
+            solvent_tabs.append(None)
+            continue
+        solvent_tab = list(preamble)
+        for head, compound_rows, tail in solvent_jobs:
+            solvent_tab += head
+            for nr, compound_row in enumerate([compound_rows[i], compound_rows[-1]], start=1):
+                solvent_tab.append(re.sub(r'^(\s*)\d+', lambda m: f"{m[1]}{nr}", compound_row, count=1))
+            solvent_tab += tail
+        solvent_tabs.append("".join(solvent_tab))
+    return solvent_tabs
             
 def read_cosmo_tab_result(tab_file_path):
     """
-    Modified from Yunsie's code
+    Read a .tab file into [solvent_name, solute_name, temp, H, ln(gamma), pv, Gsolv, None] lists.
     """
-    each_data_list = []
-    # initialize everything
-    solvent_name, solute_name, temp = None, None, None
-    result_values = None
     with open(tab_file_path, 'r') as f:
-        line = f.readline()
-        while line:
-            # get the temperature and mole fraction
-            if "Settings  job" in line:
-                temp = line.split('T=')[1].split('K')[0].strip()  # temp in K
-
-            # get the result values
-            if "Nr Compound" in line:
-                line = f.readline()
-                solvent_name = line.split()[1]
-                line = f.readline()
-                solute_name = line.split()[1]
-                result_values = line.split()[2:6]  # H (in bar), ln(gamma), pv (vapor pressure in bar), Gsolv (kcal/mol)
-                # save the result as one list
-                each_data_list.append(
-                    [solvent_name, solute_name, temp] + result_values + [None])
-                # initialize everything
-                solvent_name, solute_name, temp = None, None, None
-                result_values = None
-            line = f.readline()
-    return each_data_list
+        return read_cosmo_tab_lines(f)
 
 def get_dHsolv_value(each_data_list):
     # compute solvation enthalpy
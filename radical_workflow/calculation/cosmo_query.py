@@ -0,0 +1,200 @@
+import os
+import shutil
+import sqlite3
+
+from .utils import REPLACE_LETTER
+from .watchdog import run_command
+from .cosmo_calculation import generate_cosmo_input, read_cosmo_tab_result
+from radical_workflow.parser.tar_archive import IndexedTarFile
+from radical_workflow.parser.cosmo_parser import read_cosmo_tab_lines
+
+def cosmo_tar_path(outputs_dir, mol_id):
+    ids = str(int(int(mol_id.split("id")[1])/1000))
+    return os.path.join(outputs_dir, f"outputs_{ids}", f"{mol_id}.tar")
+
+
+def temperature_key(T):
+    return round(float(T), 2)
+
+
+class SolvationQueryService:
+    """
+    Answer (solute, solvent, temperature) queries from a sqlite cache of COSMOtherm results and
+    queue the combinations that are missing. The cache is filled from the tabs already in the
+    COSMO tar of a solute and from run_pending, which runs cosmotherm only for the queued
+    combinations with the .cosmo and .energy files stored in the tar of the solute.
+    dHsolv at T is computed from dGsolv at T - 1 and T + 1, so these are queued along with T.
+    """
+    def __init__(self, cache_path, df_pure, outputs_dir=os.path.join("output", "COSMO_calc", "outputs"),
+                 cosmotherm_path=None, cosmo_database_path=None, solvent_database_dir=None):
+        self.cache_path = cache_path
+        self.outputs_dir = outputs_dir
+        self.cosmotherm_path = cosmotherm_path
+        self.cosmo_database_path = cosmo_database_path
+        self.solvent_database_dir = solvent_database_dir
+        self.solvent_rows = {row.cosmo_name: row for _, row in df_pure.iterrows()}
+
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (solute TEXT, solvent TEXT, temperature REAL, "
+                          "H REAL, lngamma REAL, pv REAL, dGsolv REAL, PRIMARY KEY (solute, solvent, temperature))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pending (solute TEXT, solvent TEXT, temperature REAL, "
+                          "PRIMARY KEY (solute, solvent, temperature))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS ingested (solute TEXT PRIMARY KEY, tar_mtime REAL)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def cosmo_name(self, solvent):
+        return "".join(letter if letter not in REPLACE_LETTER else REPLACE_LETTER[letter] for letter in solvent)
+
+    def insert_tab_records(self, solute, solvent, each_data_list):
+        for _, _, temp, H, lngamma, pv, dGsolv, _ in each_data_list:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (solute, solvent, temperature_key(temp), float(H), float(lngamma), float(pv), float(dGsolv)))
+            self.conn.execute("DELETE FROM pending WHERE solute = ? AND solvent = ? AND temperature = ?",
+                              (solute, solvent, temperature_key(temp)))
+
+    def ingest_tar(self, solute):
+        """Load the tabs in the COSMO tar of a solute into the cache, once per version of the tar."""
+        tar_path = cosmo_tar_path(self.outputs_dir, solute)
+        if not os.path.isfile(tar_path):
+            return
+        tar_mtime = os.path.getmtime(tar_path)
+        row = self.conn.execute("SELECT tar_mtime FROM ingested WHERE solute = ?", (solute,)).fetchone()
+        if row is not None and row[0] == tar_mtime:
+            return
+
+        cosmo_name_to_solvent = {self.cosmo_name(solvent): solvent for solvent in self.solvent_rows}
+        with IndexedTarFile(tar_path) as tar:
+            for member in tar:
+                basename = os.path.basename(member.name)
+                if not basename.endswith(".tab") or not basename.startswith(f"{solute}_"):
+                    continue
+                solvent = cosmo_name_to_solvent.get(basename[len(solute) + 1:-len(".tab")])
+                if solvent is None:
+                    continue
+                lines = tar.read(member).decode("utf-8").splitlines(keepends=True)
+                self.insert_tab_records(solute, solvent, read_cosmo_tab_lines(lines))
+        self.conn.execute("INSERT OR REPLACE INTO ingested VALUES (?, ?)", (solute, tar_mtime))
+        self.conn.commit()
+
+    def has_result(self, solute, solvent, T):
+        return self.conn.execute("SELECT 1 FROM results WHERE solute = ? AND solvent = ? AND temperature = ?",
+                                 (solute, solvent, temperature_key(T))).fetchone() is not None
+
+    def lookup(self, solute, solvent, T):
+        rows = self.conn.execute("SELECT temperature, H, lngamma, pv, dGsolv FROM results WHERE solute = ? AND solvent = ? "
+                                 "AND temperature IN (?, ?, ?)", (solute, solvent, temperature_key(T - 1), temperature_key(T), temperature_key(T + 1))).fetchall()
+        values = {temp: rest for temp, *rest in rows}
+        if temperature_key(T) not in values:
+            return None
+        H, lngamma, pv, dGsolv = values[temperature_key(T)]
+        dHsolv = None
+        if temperature_key(T - 1) in values and temperature_key(T + 1) in values:
+            dSsolv = - (values[temperature_key(T + 1)][3] - values[temperature_key(T - 1)][3]) / 2
+            dHsolv = dGsolv + T * dSsolv
+        return dict(H=H, lngamma=lngamma, pv=pv, dGsolv=dGsolv, dHsolv=dHsolv)
+
+    def query(self, solutes, solvents, temperatures, enthalpy=True):
+        """
+        Return ({(solute, solvent, T): values}, [missing (solute, solvent, T)]). Missing
+        combinations, and with enthalpy also their T - 1 and T + 1 neighbours, are queued.
+        Solvents that are not in df_pure cannot be run, so they raise a ValueError.
+        """
+        unknown_solvents = [solvent for solvent in solvents if solvent not in self.solvent_rows]
+        if unknown_solvents:
+            raise ValueError(f"{' '.join(unknown_solvents)} not in the solvent list")
+        results, missing = dict(), []
+        for solute in solutes:
+            self.ingest_tar(solute)
+            for solvent in solvents:
+                for T in temperatures:
+                    T = float(T)
+                    values = self.lookup(solute, solvent, T)
+                    if values is not None and (values["dHsolv"] is not None or not enthalpy):
+                        results[(solute, solvent, T)] = values
+                        continue
+                    missing.append((solute, solvent, T))
+                    for queued_T in ([T - 1, T, T + 1] if enthalpy else [T]):
+                        if self.has_result(solute, solvent, queued_T):
+                            continue
+                        self.conn.execute("INSERT OR IGNORE INTO pending VALUES (?, ?, ?)", (solute, solvent, temperature_key(queued_T)))
+        self.conn.commit()
+        return results, missing
+
+    def get_pending(self):
+        pending = dict()
+        for solute, solvent, T in self.conn.execute("SELECT solute, solvent, temperature FROM pending ORDER BY solute, solvent, temperature"):
+            pending.setdefault((solute, solvent), []).append(T)
+        return pending
+
+    def run_pending(self, scratch_dir, watchdog_rules=None):
+        """
+        Run cosmotherm for the queued combinations, one run per solute and solvent covering all
+        its queued temperatures. Returns the number of runs that produced a .tab file.
+        """
+        assert self.cosmotherm_path is not None, "cosmotherm_path is needed to run pending queries"
+        cosmo_command = os.path.join(self.cosmotherm_path, "COSMOtherm", "BIN-LINUX", "cosmotherm")
+        current_dir = os.getcwd()
+        n_done = 0
+
+        pending = self.get_pending()
+        solute_to_pending = dict()
+        for (solute, solvent), T_list in pending.items():
+            solute_to_pending.setdefault(solute, []).append((solvent, T_list))
+
+        for solute, solvent_T_lists in solute_to_pending.items():
+            solute_scratch_dir = os.path.join(scratch_dir, solute)
+            os.makedirs(solute_scratch_dir, exist_ok=True)
+            os.chdir(solute_scratch_dir)
+            if not self.extract_solute_files(solute):
+                print(f"No .cosmo and .energy files for {solute}, Turbomole has to be run first")
+                os.chdir(current_dir)
+                shutil.rmtree(solute_scratch_dir)
+                continue
+
+            for solvent, T_list in solvent_T_lists:
+                if solvent not in self.solvent_rows:
+                    # queued by a cache made with another solvent list
+                    print(f"{solvent} is not in the solvent list, removing it from the queue")
+                    self.conn.execute("DELETE FROM pending WHERE solute = ? AND solvent = ?", (solute, solvent))
+                    self.conn.commit()
+                    continue
+                cosmo_name = self.cosmo_name(solvent)
+                inpfile = f'{solute}_{cosmo_name}.inp'
+                tabfile = f'{solute}_{cosmo_name}.tab'
+                outfile = f'{solute}_{cosmo_name}.out'
+
+                script = generate_cosmo_input(solute, self.cosmotherm_path, self.cosmo_database_path, T_list, self.solvent_rows[solvent], self.solvent_database_dir)
+                with open(inpfile, "w+") as f:
+                    f.write(script)
+                run_command(f'{cosmo_command} {inpfile}', outfile, None, watchdog_rules)
+
+                if not os.path.exists(tabfile):
+                    print(f"COSMO calculation failed for {solute} in {solvent}")
+                    continue
+                self.insert_tab_records(solute, solvent, read_cosmo_tab_result(tabfile))
+                self.conn.commit()
+                n_done += 1
+                print(f"COSMO calculation done for {solute} in {solvent} at {' '.join(str(T) for T in T_list)} K")
+
+            os.chdir(current_dir)
+            shutil.rmtree(solute_scratch_dir)
+        return n_done
+
+    def extract_solute_files(self, solute):
+        """Extract {solute}.cosmo and {solute}.energy from the COSMO tar of the solute to the current folder."""
+        tar_path = cosmo_tar_path(self.outputs_dir, solute)
+        if not os.path.isfile(tar_path):
+            return False
+        needed = {f"{solute}.cosmo", f"{solute}.energy"}
+        with IndexedTarFile(tar_path) as tar:
+            for member in tar:
+                basename = os.path.basename(member.name)
+                if basename in needed:
+                    with open(basename, "wb") as f:
+                        f.write(tar.read(member))
+                    needed.remove(basename)
+        return not needed
+
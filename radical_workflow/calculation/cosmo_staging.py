@@ -0,0 +1,114 @@
+import os
+import json
+import fcntl
+import hashlib
+
+from .cosmo_calculation import get_solvent_dir
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+
+def sha256sum(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def copy_with_sha256(src, dst):
+    """Copy src to dst and return the sha256 of the content read from src."""
+    h = hashlib.sha256()
+    with open(src, "rb") as f_in, open(dst, "wb") as f_out:
+        for chunk in iter(lambda: f_in.read(1024 * 1024), b""):
+            h.update(chunk)
+            f_out.write(chunk)
+    return h.hexdigest()
+
+
+def solvent_cosmo_files(cosmotherm_path, cosmo_database_path, row):
+    """Return (source path, path relative to the staging folder) of every .cosmo file of a solvent."""
+    src_dir = get_solvent_dir(cosmotherm_path, cosmo_database_path, row)
+    staged_dir = os.path.relpath(get_solvent_dir(cosmotherm_path, cosmo_database_path, row, "."), ".")
+    files = []
+    for k in range(int(row.cosmo_conf)):
+        cosmo_file = f"{row.cosmo_name}_c{k}.cosmo"
+        files.append((os.path.join(src_dir, cosmo_file), os.path.join(staged_dir, cosmo_file)))
+    return files
+
+
+def stage_solvent_database(df_pure, cosmotherm_path, cosmo_database_path, staging_dir):
+    """
+    Copy the .cosmo files of the solvents in df_pure to staging_dir, laid out as expected by
+    get_solvent_dir with solvent_database_dir=staging_dir, and return the set of cosmo_names
+    of the solvents whose files are all staged. Mark the others with mark_staged_solvents so
+    that they are read from the shared database.
+    Workers on the same node share the copy: the first one holds a lock while copying and the
+    others wait for it. A manifest keeps the size, mtime and sha256 of every source file and
+    the size and mtime of its copy, which is hashed once when it is made. Files whose source
+    or copy changed since then are copied again.
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    manifest_path = os.path.join(staging_dir, MANIFEST_FILE)
+    staged_solvents = set()
+
+    with open(os.path.join(staging_dir, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            manifest = dict()
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+
+            n_copied = 0
+            for _, row in df_pure.iterrows():
+                staged = True
+                for src, rel_path in solvent_cosmo_files(cosmotherm_path, cosmo_database_path, row):
+                    dst = os.path.join(staging_dir, rel_path)
+                    try:
+                        stat = os.stat(src)
+                    except FileNotFoundError:
+                        print(f"{src} not found, not staged")
+                        staged = False
+                        continue
+                    entry = manifest.get(rel_path)
+                    try:
+                        dst_stat = os.stat(dst)
+                    except FileNotFoundError:
+                        dst_stat = None
+                    if entry is not None and dst_stat is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime \
+                            and entry.get("staged_size") == dst_stat.st_size and entry.get("staged_mtime") == dst_stat.st_mtime:
+                        continue
+
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    tmp_dst = f"{dst}.tmp"
+                    digest = copy_with_sha256(src, tmp_dst)
+                    if sha256sum(tmp_dst) != digest:
+                        print(f"Copy of {src} does not match its source, not staged")
+                        os.remove(tmp_dst)
+                        manifest.pop(rel_path, None)
+                        staged = False
+                        continue
+                    os.replace(tmp_dst, dst)
+                    dst_stat = os.stat(dst)
+                    manifest[rel_path] = dict(size=stat.st_size, mtime=stat.st_mtime, sha256=digest,
+                                              staged_size=dst_stat.st_size, staged_mtime=dst_stat.st_mtime)
+                    n_copied += 1
+                if staged:
+                    staged_solvents.add(row.cosmo_name)
+
+            with open(f"{manifest_path}.tmp", "w") as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+            print(f"Staged solvent database in {staging_dir}, {n_copied} files copied, {len(df_pure) - len(staged_solvents)} solvents not staged")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return staged_solvents
+
+
+def mark_staged_solvents(df_pure, staged_solvents):
+    """Add the staged column read by get_solvent_dir, False for solvents that are read from the shared database."""
+    df_pure["staged"] = df_pure.cosmo_name.isin(staged_solvents)
+    return df_pure
@@ -10,9 +10,45 @@ import time
 from .file_parser import mol2xyz, xyz2com, write_mol_to_sdf
 from .grab_QM_descriptors import read_log
 from .log_parser import G16Log
+from .watchdog import run_command
+from .chk_cache import add_guess_read
 from radical_workflow.parser.dft_opt_freq_parser import dft_opt_freq_parser
 
-def dft_scf_qm_descriptor(folder, sdf, g16_path, level_of_theory, n_procs, logger, job_ram, base_charge):
+QM_DESCRIPTOR_JOBS = {'neutral': (0, 1), 'plus1': (1, 2), 'minus1': (-1, 2)}
+QM_DESCRIPTOR_LEVEL_OF_THEORY = 'b3lyp/def2svp'
+
+def write_qm_descriptor_input(xyz, mol_id, jobtype, base_charge, n_procs, job_ram, guess_read=False):
+    charge_shift, mult = QM_DESCRIPTOR_JOBS[jobtype]
+    route = f'# {QM_DESCRIPTOR_LEVEL_OF_THEORY} nmr=GIAO' if jobtype == 'neutral' else f'# {QM_DESCRIPTOR_LEVEL_OF_THEORY}'
+    route += ' scf=(maxcycle=512, xqc) pop=(full,mbs,hirshfeld,nbo6read)'
+    if guess_read:
+        route += ' guess=read'
+    head = '%chk={}.chk\n%nprocshared={}\n%mem={}mb\n{}\n'.format(mol_id, n_procs, job_ram, route)
+
+    comfile = os.path.join(jobtype, mol_id + '.gjf')
+    xyz2com(xyz, head=head, comfile=comfile, charge=base_charge + charge_shift, mult=mult, footer='$NBO BNDIDX $END\n')
+
+def qm_descriptor_job_done(mol_id, jobtype):
+    outfile = os.path.join(jobtype, mol_id + '.out')
+    if not os.path.exists(outfile):
+        return False
+    with open(outfile) as f:
+        return "Aborted" not in f.read()
+
+def start_qm_descriptor_job(g16_command, mol_id, jobtype):
+    comfile = mol_id + '.gjf'
+    logfile = mol_id + '.log'
+    out = open(os.path.join(jobtype, mol_id + '.out'), 'w')
+    proc = subprocess.Popen('{} < {} >> {}'.format(g16_command, comfile, logfile), shell=True, cwd=jobtype, stdout=out, stderr=out)
+    return proc, out
+
+def dft_scf_qm_descriptor(folder, sdf, g16_path, level_of_theory, n_procs, logger, job_ram, base_charge, concurrent_ions=False, chk_cache=None):
+    """
+    With concurrent_ions, the neutral job runs first and the plus1 and minus1 jobs then start
+    together from a copy of the neutral checkpoint (guess=read), splitting n_procs and job_ram.
+    If a chk_cache is given, jobs that do not start from the neutral checkpoint start from the
+    checkpoint of the molecule cached at QM_DESCRIPTOR_LEVEL_OF_THEORY when there is one.
+    """
     basename = os.path.basename(sdf)
 
     parent_folder = os.getcwd()
@@ -23,49 +59,37 @@ def dft_scf_qm_descriptor(folder, sdf, g16_path, level_of_theory, n_procs, logge
 
         xyz = mol2xyz(Chem.SDMolSupplier(sdf, removeHs=False, sanitize=False)[0])
 
-        pwd = os.getcwd()
-
         g16_command = os.path.join(g16_path, 'g16')
+        logfile = mol_id + '.log'
         QM_descriptors = {}
-        for jobtype in ['neutral', 'plus1', 'minus1']:
+        for jobtype in QM_DESCRIPTOR_JOBS:
             os.makedirs(jobtype, exist_ok=True)
 
-            if jobtype == 'neutral':
-                charge = base_charge
-                mult = 1
-                head = '%chk={}.chk\n%nprocshared={}\n%mem={}mb\n# b3lyp/def2svp nmr=GIAO scf=(maxcycle=512, xqc) ' \
-                       'pop=(full,mbs,hirshfeld,nbo6read)\n'.format(mol_id, n_procs, job_ram)
-            elif jobtype == 'plus1':
-                charge = base_charge + 1
-                mult = 2
-                head = '%chk={}.chk\n%nprocshared={}\n%mem={}mb\n# b3lyp/def2svp scf=(maxcycle=512, xqc) ' \
-                       'pop=(full,mbs,hirshfeld,nbo6read)\n'.format(mol_id, n_procs, job_ram)
-            elif jobtype == 'minus1':
-                charge = base_charge - 1
-                mult = 2
-                head = '%chk={}.chk\n%nprocshared={}\n%mem={}mb\n# b3lyp/def2svp scf=(maxcycle=512, xqc) ' \
-                       'pop=(full,mbs,hirshfeld,nbo6read)\n'.format(mol_id, n_procs, job_ram)
-
-
-            os.chdir(jobtype)
-            comfile = mol_id + '.gjf'
-            xyz2com(xyz, head=head, comfile=comfile, charge=charge, mult=mult, footer='$NBO BNDIDX $END\n')
-
-            logfile = mol_id + '.log'
-            outfile = mol_id + '.out'
-            if not os.path.exists(outfile):
-                with open(outfile, 'w') as out:
-                    subprocess.run('{} < {} >> {}'.format(g16_command, comfile, logfile), shell=True, stdout=out, stderr=out)
-                    QM_descriptors[jobtype] = read_log(logfile, jobtype)
-            else:
-                with open(outfile) as f:
-                    if "Aborted" in f.read():
-                        with open(outfile, 'w') as out:
-                            subprocess.run('{} < {} >> {}'.format(g16_command, comfile, logfile), shell=True, stdout=out, stderr=out)
-                            QM_descriptors[jobtype] = read_log(logfile, jobtype)
-                    else:
-                        QM_descriptors[jobtype] = read_log(logfile, jobtype)
-            os.chdir(pwd)
+        sequential_jobs = ['neutral'] if concurrent_ions else ['neutral', 'plus1', 'minus1']
+        for jobtype in sequential_jobs:
+            if not qm_descriptor_job_done(mol_id, jobtype):
+                guess_read = chk_cache is not None and chk_cache.get(mol_id, os.path.join(jobtype, mol_id + '.chk'), QM_DESCRIPTOR_LEVEL_OF_THEORY)
+                write_qm_descriptor_input(xyz, mol_id, jobtype, base_charge, n_procs, job_ram, guess_read=guess_read)
+                proc, out = start_qm_descriptor_job(g16_command, mol_id, jobtype)
+                proc.wait()
+                out.close()
+            QM_descriptors[jobtype] = read_log(os.path.join(jobtype, logfile), jobtype)
+
+        if concurrent_ions:
+            ion_jobs = [jobtype for jobtype in ['plus1', 'minus1'] if not qm_descriptor_job_done(mol_id, jobtype)]
+            neutral_chk = os.path.join('neutral', mol_id + '.chk')
+            guess_read = os.path.exists(neutral_chk)
+            running = []
+            for jobtype in ion_jobs:
+                if guess_read:
+                    shutil.copyfile(neutral_chk, os.path.join(jobtype, mol_id + '.chk'))
+                write_qm_descriptor_input(xyz, mol_id, jobtype, base_charge, max(n_procs // len(ion_jobs), 1), job_ram // len(ion_jobs), guess_read=guess_read)
+                running.append(start_qm_descriptor_job(g16_command, mol_id, jobtype))
+            for proc, out in running:
+                proc.wait()
+                out.close()
+            for jobtype in ['plus1', 'minus1']:
+                QM_descriptors[jobtype] = read_log(os.path.join(jobtype, logfile), jobtype)
 
         QM_descriptors_return = copy.deepcopy(QM_descriptors)
         QM_descriptor_calc = dict()
@@ -97,7 +121,7 @@ def dft_scf_qm_descriptor(folder, sdf, g16_path, level_of_theory, n_procs, logge
 
     return QM_descriptors_return
 
-def dft_scf_opt(mol_id, mol_smi, mol_id_to_xyz_dict, g16_path, DFT_opt_freq_theories, n_procs, job_ram, base_charge, mult, scratch_dir, suboutputs_dir, subinputs_dir):
+def dft_scf_opt(mol_id, mol_smi, mol_id_to_xyz_dict, g16_path, DFT_opt_freq_theories, n_procs, job_ram, base_charge, mult, scratch_dir, suboutputs_dir, subinputs_dir, watchdog_rules=None, chk_cache=None):
     current_dir = os.getcwd()
 
     for level_of_theory in DFT_opt_freq_theories:
@@ -117,9 +141,11 @@ def dft_scf_opt(mol_id, mol_smi, mol_id_to_xyz_dict, g16_path, DFT_opt_freq_theo
 
         start_time = time.time()
         with open(outfile, 'w') as out:
-            subprocess.run('{} < {} >> {}'.format(g16_command, comfile, logfile), shell=True, stdout=out, stderr=out)
+            reason = run_command('{} < {} >> {}'.format(g16_command, comfile, logfile), logfile, out, watchdog_rules)
         end_time = time.time()
         print(f"Optimization of {mol_id} with {level_of_theory} took {end_time - start_time} seconds.")
+        if reason is not None:
+            print(f"Optimization of {mol_id} with {level_of_theory} aborted by watchdog: {reason}")
 
         # check for convergence
         start_time = time.time()
@@ -129,6 +155,8 @@ def dft_scf_opt(mol_id, mol_smi, mol_id_to_xyz_dict, g16_path, DFT_opt_freq_theo
         
         if valid_job:
             shutil.copyfile(logfile, os.path.join(suboutputs_dir, logfile))
+            if chk_cache is not None:
+                chk_cache.put(mol_id, level_of_theory, f"{mol_id}.chk")
             try:
                 os.remove(os.path.join(subinputs_dir, f"{mol_id}.tmp"))
             except FileNotFoundError:
@@ -151,12 +179,15 @@ def dft_scf_opt(mol_id, mol_smi, mol_id_to_xyz_dict, g16_path, DFT_opt_freq_theo
     print(f"{mol_id} failed for all levels of theory.")
     return False
 
-def dft_scf_sp(mol_id, g16_path, level_of_theory, n_procs, logger, job_ram, base_charge, mult):
+def dft_scf_sp(mol_id, g16_path, level_of_theory, n_procs, logger, job_ram, base_charge, mult, chk_cache=None):
     sdf = mol_id + ".sdf"
 
     mol = Chem.SDMolSupplier(sdf, removeHs=False, sanitize=False)[0]
     xyz = mol2xyz(mol)
 
+    if chk_cache is not None and chk_cache.get(mol_id, f"{mol_id}.chk", level_of_theory):
+        level_of_theory = add_guess_read(level_of_theory)
+
     g16_command = os.path.join(g16_path, 'g16')
     head = '%chk={}.chk\n%nprocshared={}\n%mem={}mb\n{}\n'.format(mol_id, n_procs, job_ram, level_of_theory)
 
@@ -184,7 +215,7 @@ def save_dft_sp_results(folder, done_jobs_record, task_id, mol_id_to_smi_dict, s
             each_data_list = [mol_id, mol_id_to_smi_dict[mol_id]]
             for semiempirical_method in semiempirical_methods:
                 log_file_path = os.path.join(folder, mol_id, semiempirical_method, mol_id + '.log')
-                g16log = G16Log(log_file_path)
+                g16log = G16Log(log_file_path, fields=['E'])
                 en = g16log.E
                 each_data_list.append(str(en))
             csvwriter.writerow(each_data_list)
\ No newline at end of file
@@ -1,16 +1,16 @@
 from __future__ import print_function, absolute_import
 import shutil
-import subprocess
 
 from rdkit import Chem
 from rdkit.Chem import AllChem
 from .log_parser import XtbLog
+from .watchdog import run_command
 from .file_parser import write_mol_to_sdf, load_sdf
 import os
 from rdmc.mol import RDKitMol
 
 # algorithm to generate nc conformations
-def _genConf(smi, mol_id, XTB_path, conf_search_FFs, max_n_conf, max_try, rms, E_cutoff_fraction, rmspost, n_lowest_E_confs_to_save, scratch_dir, suboutputs_dir, subinputs_dir):
+def _genConf(smi, mol_id, XTB_path, conf_search_FFs, max_n_conf, max_try, rms, E_cutoff_fraction, rmspost, n_lowest_E_confs_to_save, scratch_dir, suboutputs_dir, subinputs_dir, watchdog_rules=None):
     mol = RDKitMol.FromSmiles(smi)
     nr = int(AllChem.CalcNumRotatableBonds(mol._mol))
 
@@ -51,10 +51,11 @@ def _genConf(smi, mol_id, XTB_path, conf_search_FFs, max_n_conf, max_try, rms, E
                 xtb_command = os.path.join(XTB_path, 'xtb')
                 output_file_mol_id = f'{mol_id}_{id}.log'
                 with open(output_file_mol_id, 'w') as out:
-                    subprocess.call([xtb_command, '--gfnff', input_file_mol_id, '--opt'],
-                                    stdout=out, stderr=out)
+                    reason = run_command('{} --gfnff {} --opt'.format(xtb_command, input_file_mol_id), output_file_mol_id, out, watchdog_rules)
+                if reason is not None:
+                    print(f"{mol_id}_{id} aborted by watchdog: {reason}")
                 if os.path.exists(output_file_mol_id):
-                    log = XtbLog(output_file_mol_id)
+                    log = XtbLog(output_file_mol_id, fields=['E'])
                     if log.termination:
                         try:
                             en = float(log.E)
@@ -0,0 +1,80 @@
+import os
+import re
+
+from .file_parser import xyz2com
+from .watchdog import run_command
+
+CHK_PATTERN = re.compile(r'^\s*%chk=(\S+?)(\.chk)?\s*$', flags=re.IGNORECASE)
+
+
+def write_link1_input(jobs, comfile):
+    """
+    Write one Gaussian input that runs all jobs one after another, separated by --Link1--.
+    Each job is a dict with name, head, xyz, charge, mult and footer, as passed to xyz2com.
+    A %chk line named after the job is added to heads without one, as it is used to split
+    the combined log again.
+    """
+    steps = []
+    for job in jobs:
+        head = job["head"]
+        if "%chk" not in head.lower():
+            head = f"%chk={job['name']}.chk\n" + head
+        job_comfile = f"{job['name']}.gjf"
+        xyz2com(job["xyz"], head=head, comfile=job_comfile, charge=job["charge"], mult=job["mult"], footer=job["footer"])
+        with open(job_comfile) as f:
+            steps.append(f.read().rstrip("\n") + "\n\n")
+
+    with open(comfile, "w") as f:
+        f.write("--Link1--\n".join(steps))
+
+
+def split_link1_log(logfile, names):
+    """
+    Split the log of a --Link1-- batch into {name}.log for every job that ran. The log is cut
+    after each termination line and the steps are assigned to jobs by the echoed %chk line,
+    so that the automatic freq step of an opt freq job stays with its optimization.
+    Returns the names of the jobs for which a log was written.
+    """
+    with open(logfile) as f:
+        lines = f.readlines()
+
+    steps = []
+    step = []
+    for line in lines:
+        step.append(line)
+        if "Normal termination" in line or "Error termination" in line:
+            steps.append(step)
+            step = []
+    if step:
+        steps.append(step)
+
+    job_lines = {}
+    current = None
+    for step in steps:
+        for line in step:
+            m = CHK_PATTERN.match(line)
+            if m and os.path.basename(m[1]) in names:
+                current = os.path.basename(m[1])
+                break
+        if current is None:
+            continue
+        job_lines.setdefault(current, []).extend(step)
+
+    for name, job_log in job_lines.items():
+        with open(f"{name}.log", "w") as f:
+            f.writelines(job_log)
+    return [name for name in names if name in job_lines]
+
+
+def run_g16_link1_batch(jobs, g16_path, batch_name, out=None, watchdog_rules=None):
+    """Run the jobs in one g16 process in the current directory and split the log per job."""
+    comfile = f"{batch_name}.gjf"
+    logfile = f"{batch_name}.log"
+    write_link1_input(jobs, comfile)
+
+    g16_command = os.path.join(g16_path, 'g16')
+    run_command('{} < {} >> {}'.format(g16_command, comfile, logfile), logfile, out, watchdog_rules)
+
+    if not os.path.exists(logfile):
+        return []
+    return split_link1_log(logfile, [job["name"] for job in jobs])
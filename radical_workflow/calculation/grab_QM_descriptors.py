@@ -2,8 +2,15 @@ from .log_parser import G16Log
 import numpy as np
 
 
+# the G16Log fields read_log uses, the rest of the log is not parsed
+READ_LOG_FIELDS = ['Coords', 'AtomsType', 'mulliken_charge', 'mulliken_dipole_moment', 'mulliken_spin_density',
+                   'hirshfeld_charges', 'hirshfeld_spin_density', 'hirshfeld_dipoles', 'NPA_Charge', 'electron_configuration',
+                   'bond_index_matrix', 'lone_pairs', 'bond_lewis', 'bond_non_lewis', 'bond_lewis_contribution',
+                   'bond_non_lewis_contribution', 'NMR', 'homo', 'lumo']
+
+
 def read_log(log, jobtype):
-    log = G16Log(log)
+    log = G16Log(log, fields=READ_LOG_FIELDS)
     if log.termination:
         QMs = {}
     else:
@@ -2,6 +2,9 @@ import os, sys
 import re
 import numpy as np
 
+from radical_workflow.parser.xtb_orca_log import XtbLog
+from radical_workflow.parser.log_blocks import rows_to_array
+
 periodictable = ["", "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar",
                  "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br",
                  "Kr", "Rb", "Sr", "Y", "Zr",
@@ -20,8 +23,311 @@ def elementID(massno):
         return "XX"
 
 
+# patterns of the lines at which the sections parsed by G16Log start
+G16_TRIGGERS = [
+    ("error", r"Error termination"),
+    ("charge_mult", r"Charge\s*=\s*-?\d+\s*Multiplicity\s*=\s*-?\d+"),
+    ("cpu", r"Job cpu time"),
+    ("orientation", r"Standard orientation"),
+    ("scf", r"SCF Done"),
+    ("thermal_E", r"Sum of electronic and thermal Energies"),
+    ("thermal_G", r"Sum of electronic and thermal Free Energies="),
+    ("freq", r"Frequencies --"),
+    ("integrated", r"Integrated intensity \(I\) in km\.mol\^-1"),
+    ("fundamental", r"Fundamental Bands"),
+    ("overtones", r"Overtones"),
+    ("combination", r"Combination Bands"),
+    ("mulliken", r"Mulliken charges(?: and spin densities)?:"),
+    ("dipole", r"Dipole moment"),
+    ("hirshfeld", r"Hirshfeld charges, spin densities, dipoles, and CM5 charges"),
+    ("npa", r"Atom\s+No\s+Charge\s+Core\s+Valence\s+Rydberg\s+Total"),
+    ("isotropic", r"Isotropic\s*="),
+    ("alpha_occ", r"Alpha  occ\."),
+    ("alpha_virt", r"Alpha virt\."),
+]
+# every line is searched with the plain alternation, which is much faster than the one with named
+# groups; the latter only tells which trigger a matching line is
+G16_TRIGGER_RE = re.compile("|".join(f"(?:{pattern})" for _, pattern in G16_TRIGGERS))
+G16_TRIGGER_NAME_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in G16_TRIGGERS))
+
+CHARGE_MULT_RE = re.compile(r'Charge\s*=\s*(-?\d+)\s*Multiplicity\s*=\s*(-?\d+)')
+COORD_RE = re.compile(r'(\d+)\s+(\d+)\s+(\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)')
+FLOAT_RE = re.compile(r'-?\d+\.\d+')
+UNSIGNED_FLOAT_RE = re.compile(r'(\d+\.\d+)')
+SIGNED_FLOAT_RE = re.compile(r'(-?\d+\.\d+)')
+SCF_RE = re.compile(r'=\s+(-?\d+\.\d+)')
+ISOTROPIC_RE = re.compile(r'Isotropic\s*=\s*(-?\d+\.\d+)')
+NPA_CHARGE_RE = re.compile(r'(\S+)\s*(\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)')
+ELECTRON_CONFIGURATION_RE = re.compile(r'(\d+\S+)\(\s?(-?\d+\.\d+)\)')
+ATOM_INDEX_RE = re.compile(r'\s+(\d+)')
+LONE_PAIR_RE = re.compile(r'\((\d+\.\d+)\)\s+LP\s+\(\s+(\d+)\)\s+\S+\s+(\d+)')
+BOND_RE = re.compile(r'\((\d+\.\d+)\)\s+BD[\*\s]+\(\s+(\d+)\)\s+\S+\s+(\d+)-\s+\S+\s+(\d+)')
+PERCENT_RE = re.compile(r'(\d+\.\d+)%')
+
+
+# the triggers that each Get method of G16Log needs ReadLog to collect, in the order G16Log runs them
+G16_METHOD_TRIGGERS = {
+    "GetChargeMult": ["charge_mult"],
+    "GetCoords": ["orientation"],
+    "GetNPA": ["npa"],
+    "GetCPU": ["cpu"],
+    "GetE": ["scf", "thermal_E"],
+    "GetFreq": ["freq", "integrated", "fundamental", "overtones", "combination"],
+    "GetG": ["thermal_G"],
+    "GetMulliken": ["mulliken", "dipole"],
+    "GetNMR": ["isotropic"],
+    "GetHirshfeld": ["hirshfeld"],
+    "GetHOMOLUMO": ["alpha_occ", "alpha_virt"],
+}
+# these fail on some logs, G16Log then goes on without their fields
+G16_OPTIONAL_METHODS = {"GetNPA", "GetHirshfeld"}
+# GetNPA and GetNMR size their arrays by the number of atoms
+G16_METHOD_DEPENDENCIES = {"GetNPA": ["GetCoords"], "GetNMR": ["GetCoords"]}
+
+# the Get method that sets each field of G16Log
+G16_FIELD_METHODS = {
+    "formal_charge": "GetChargeMult", "mult": "GetChargeMult",
+    "AtomsNum": "GetCoords", "AtomsType": "GetCoords", "Coords": "GetCoords",
+    "NPA_Charge": "GetNPA", "electron_configuration": "GetNPA", "bond_index_matrix": "GetNPA", "lone_pairs": "GetNPA",
+    "bond_lewis": "GetNPA", "bond_non_lewis": "GetNPA", "bond_lewis_contribution": "GetNPA", "bond_non_lewis_contribution": "GetNPA",
+    "CPU": "GetCPU",
+    "E": "GetE",
+    "har_frequencies": "GetFreq", "har_wavenumbers": "GetFreq", "har_intensities": "GetFreq",
+    "an_wavenumbers": "GetFreq", "an_intensities": "GetFreq", "over_wavenumbers": "GetFreq",
+    "over_intensities": "GetFreq", "com_wavenumbers": "GetFreq", "com_intensities": "GetFreq",
+    "G": "GetG",
+    "mulliken_charge": "GetMulliken", "mulliken_spin_density": "GetMulliken", "mulliken_dipole_moment": "GetMulliken",
+    "NMR": "GetNMR",
+    "hirshfeld_charges": "GetHirshfeld", "hirshfeld_spin_density": "GetHirshfeld", "hirshfeld_dipoles": "GetHirshfeld",
+    "homo": "GetHOMOLUMO", "lumo": "GetHOMOLUMO",
+}
+
+
+class LogSection:
+    """Stripped lines of a section of a log, collected while the log is read."""
+    def __init__(self, skip=0, end=None, n_lines=None):
+        self.skip = skip
+        self.end = end
+        self.n_lines = n_lines
+        self.lines = []
+
+    def feed(self, line):
+        """Add a stripped line, returns False once the section is complete."""
+        if self.skip:
+            self.skip -= 1
+            return True
+        if self.end is not None and self.end(line):
+            return False
+        self.lines.append(line)
+        return self.n_lines is None or len(self.lines) < self.n_lines
+
+
+def coords_end():
+    found_coord = [False]
+    def end(line):
+        if COORD_RE.search(line):
+            found_coord[0] = True
+        return found_coord[0] and line.find('-----------') > -1
+    return end
+
+
+def nbo_end():
+    """End of the NBO output parsed by GetNPA: the blank line after the bond orbital list."""
+    n_after_header = [None]
+    def end(line):
+        if line.find('Normal termination') > -1:
+            return True
+        if n_after_header[0] is None:
+            if line.find('(Occupancy)   Bond orbital / Coefficients / Hybrids') > -1:
+                n_after_header[0] = 0
+            return False
+        n_after_header[0] += 1
+        return n_after_header[0] > 2 and not line
+    return end
+
+
+class NBOParseError(Exception):
+    """A section of the NBO output of a log that could not be parsed, with the line it failed at."""
+    def __init__(self, section, message, line_index=None, line=None):
+        self.section = section
+        self.line_index = line_index
+        self.line = line
+        if line_index is not None:
+            message = f"{message} at line {line_index} of the NBO output: {line!r}"
+        super().__init__(f"{section}: {message}")
+
+
+# the lines at which the parts of the NBO output start, in the order they are printed
+NBO_MARKERS = [
+    ("npa_end", "====="),
+    ("electron_configuration", "Natural Electron Configuration"),
+    ("wiberg", "Wiberg bond index matrix in the NAO basis"),
+    ("bond_orbitals", "(Occupancy)   Bond orbital / Coefficients / Hybrids"),
+]
+
+
+def locate_nbo_sections(lines):
+    """Index of the marker line of each part of the NBO output in lines, found in one pass."""
+    offsets = dict()
+    markers = iter(NBO_MARKERS)
+    name, marker = next(markers)
+    for i, line in enumerate(lines):
+        if line.find(marker) > -1:
+            offsets[name] = i
+            name, marker = next(markers, (None, None))
+            if name is None:
+                break
+    return offsets
+
+
+def nbo_section_start(offsets, section, skip):
+    if section not in offsets:
+        raise NBOParseError(section, "section not found")
+    return offsets[section] + skip
+
+
+def parse_npa_charges(lines, offsets, n_atoms):
+    """(n_atoms, 3) array of the natural charge, valence and total population of each atom."""
+    end = nbo_section_start(offsets, "npa_end", 0)
+    if end > n_atoms:
+        raise NBOParseError("npa", f"{end} rows for {n_atoms} atoms", end - 1, lines[end - 1])
+    rows = []
+    for i in range(end):
+        m = NPA_CHARGE_RE.search(lines[i])
+        if m is None:
+            raise NBOParseError("npa", "malformed row", i, lines[i])
+        rows.append((m[3], m[5], m[6]))
+    NPA_Charge = np.zeros([n_atoms, 3])
+    if rows:
+        NPA_Charge[:len(rows)] = np.array(rows, dtype=float)
+    return NPA_Charge
+
+
+def parse_electron_configuration(lines, offsets, n_atoms):
+    """(n_atoms, 5) array of the valence orbital populations of each atom."""
+    start = nbo_section_start(offsets, "electron_configuration", 2)
+    electron_configuration = np.zeros([n_atoms, 5])
+    for i in range(start, len(lines)):
+        m = ELECTRON_CONFIGURATION_RE.findall(lines[i])
+        if not m:
+            break
+        atom = i - start
+        if atom >= n_atoms or len(m) > 5:
+            raise NBOParseError("electron_configuration", "too many atoms or orbitals", i, lines[i])
+        electron_configuration[atom, :len(m)] = [float(x[1]) for x in m]
+    return electron_configuration
+
+
+def parse_wiberg_matrix(lines, offsets, n_atoms):
+    """(n_atoms, n_atoms) float32 Wiberg bond index matrix, filled block of columns by block."""
+    i = nbo_section_start(offsets, "wiberg", 2)
+    bond_index_matrix = np.zeros([n_atoms, n_atoms], dtype='float32')
+    end = None
+    while end != n_atoms:
+        # header of the next block of columns
+        while i < len(lines) and not ATOM_INDEX_RE.findall(lines[i]):
+            i += 1
+        if i == len(lines):
+            raise NBOParseError("wiberg", f"matrix ends before column {n_atoms}")
+        m = ATOM_INDEX_RE.findall(lines[i])
+        start, end = int(m[0]) - 1, int(m[-1])
+        i += 2
+
+        rows = []
+        while i < len(lines):
+            m = FLOAT_RE.findall(lines[i])
+            if not m:
+                break
+            if len(m) != end - start or len(rows) == n_atoms:
+                raise NBOParseError("wiberg", f"row does not fit columns {start + 1}-{end} of the matrix", i, lines[i])
+            rows.append(m)
+            i += 1
+        if rows:
+            bond_index_matrix[:len(rows), start:end] = np.array(rows, dtype='float32')
+        i += 1
+    return bond_index_matrix
+
+
+def parse_bond_orbitals(lines, offsets, n_atoms):
+    """
+    Occupancies of the lone pairs, and occupancies and polarizations of the Lewis and non-Lewis
+    bond orbitals, collected in one pass over the NBO listing and written to the arrays at once.
+    """
+    i = nbo_section_start(offsets, "bond_orbitals", 2)
+    non_lewis = False
+    lone_pair_inds, lone_pair_occus = [], []
+    bond_inds = {False: [], True: []}
+    bond_values = {False: [], True: []}
+
+    def next_line(i, message):
+        if i >= len(lines):
+            raise NBOParseError("bond_orbitals", message, i - 1, lines[i - 1])
+        return lines[i], i + 1
+
+    while True:
+        line = lines[i] if i < len(lines) else ''
+        i += 1
+        if line.find('non-Lewis') > -1:
+            non_lewis = True
+
+        m = LONE_PAIR_RE.search(line)
+        if m:
+            occu, lp, atom_num = float(m[1]), int(m[2]), int(m[3])
+            if atom_num > n_atoms or lp > 4:
+                raise NBOParseError("bond_orbitals", "lone pair out of range", i - 1, line)
+            lone_pair_inds.append((atom_num - 1, lp - 1))
+            lone_pair_occus.append(occu)
+            continue
+
+        m = BOND_RE.search(line)
+        if m:
+            occu, bd, start, end = float(m[1]), int(m[2]) - 1, int(m[3]) - 1, int(m[4]) - 1
+            if max(start, end) >= n_atoms or bd > 2:
+                raise NBOParseError("bond_orbitals", "bond orbital out of range", i - 1, line)
+            line, i = next_line(i, "bond orbital without polarizations")
+            p1 = PERCENT_RE.search(line)
+            if p1 is None:
+                raise NBOParseError("bond_orbitals", "no polarization", i - 1, line)
+            while True:
+                line, i = next_line(i, "bond orbital without a second polarization")
+                p2 = PERCENT_RE.search(line)
+                if p2:
+                    break
+            bond_inds[non_lewis].append((start, end, bd))
+            bond_values[non_lewis].append((occu, float(p1[1]) / 100, float(p2[1]) / 100))
+
+        if not line.strip():
+            break
+
+    lone_pairs = np.zeros([n_atoms, 4], dtype='float32')
+    if lone_pair_inds:
+        atoms, lps = np.array(lone_pair_inds).T
+        lone_pairs[atoms, lps] = lone_pair_occus
+
+    arrays = []
+    for kind in [False, True]:
+        bond = np.zeros([n_atoms, n_atoms, 3], dtype='float32')
+        bond_contribution = np.zeros([n_atoms, n_atoms, 3, 2], dtype='float32')
+        if bond_inds[kind]:
+            start, end, bd = np.array(bond_inds[kind]).T
+            occu, p1, p2 = np.array(bond_values[kind], dtype='float32').T
+            bond[start, end, bd] = occu
+            bond[end, start, bd] = occu
+            bond_contribution[start, end, bd] = np.stack([p1, p2], axis=1)
+            bond_contribution[end, start, bd] = np.stack([p2, p1], axis=1)
+        arrays += [bond, bond_contribution]
+    bond_lewis, bond_lewis_contribution, bond_non_lewis, bond_non_lewis_contribution = arrays
+    return lone_pairs, bond_lewis, bond_non_lewis, bond_lewis_contribution, bond_non_lewis_contribution
+
+
 class G16Log:
-    def __init__(self, file):
+    """
+    Parsed g16 log. By default every field is parsed when the log is read. With fields, a list
+    of names from G16_FIELD_METHODS, the scan only collects the sections those fields come from
+    and each field is parsed on first access, so e.g. G16Log(log, fields=["E"]) skips the NBO,
+    NMR and Hirshfeld parsing entirely. Other fields are then not available.
+    """
+    def __init__(self, file, fields=None):
         # default values for thermochemical calculations
         if '.log' not in file:
             raise TypeError('A g16 .log file must be provided')
@@ -29,154 +335,200 @@ class G16Log:
         self.file = file
         self.name = os.path.basename(file)
 
+        self.methods = None
+        if fields is not None:
+            unknown = [field for field in fields if field not in G16_FIELD_METHODS]
+            if unknown:
+                raise ValueError(f"Unknown G16Log fields: {unknown}")
+            self.methods = {G16_FIELD_METHODS[field] for field in fields}
+            for method in list(self.methods):
+                self.methods.update(G16_METHOD_DEPENDENCIES.get(method, []))
+        self.done = set()
+        self.parse_errors = dict()
+
+        self.ReadLog()
         self.GetTermination()
         if not self.termination:
             self.GetError()
-        else:
-            self.GetChargeMult()
-            self.GetCoords()
+        elif self.methods is None:
+            for method in G16_METHOD_TRIGGERS:
+                self.RunGet(method)
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set, parses a requested field on first access
+        attributes = self.__dict__
+        method = G16_FIELD_METHODS.get(name)
+        if method is None or attributes.get("methods") is None or method not in attributes["methods"] \
+                or method in attributes["done"] or not attributes.get("termination"):
+            raise AttributeError(f"'G16Log' object has no attribute '{name}'")
+        self.RunGet(method)
+        return getattr(self, name)
+
+    def RunGet(self, method):
+        self.done.add(method)
+        if method in G16_OPTIONAL_METHODS:
             try:
-                self.GetNPA()
-            except:
-                pass
-            self.GetCPU()
-            self.GetE()
-            self.GetFreq()
-            self.GetG()
-            self.GetMulliken()
-            self.GetNMR()
-            try:
-                self.GetHirshfeld()
-            except:
-                pass
-            self.GetHOMOLUMO()
+                getattr(self, method)()
+            except Exception as e:
+                # the fields of the method are left unset, parse_errors tells why, e.g. an NBOParseError
+                self.parse_errors[method] = e
+        else:
+            getattr(self, method)()
+
+    def ReadLog(self):
+        """
+        Read the log once and keep the lines of the sections that the Get methods parse. Every
+        line is searched with G16_TRIGGER_RE only; the lines of a section are kept from its
+        trigger to its end, while other sections are tracked in parallel.
+        """
+        sections = dict(last_line="", error=None, charge_mult=None, cpu=None, coords=None, E=None, G=None,
+                        freqs=[], fundamental=None, overtones=None, combination=None, mulliken=None,
+                        dipole=None, hirshfeld=None, npa=None, isotropic=[], alpha_occ=[], alpha_virt=None)
+        open_sections = dict()
+        integrated = False
+
+        trigger_re, trigger_name_re = G16_TRIGGER_RE, G16_TRIGGER_NAME_RE
+        if self.methods is not None:
+            # only the triggers of the requested fields, the re module caches the compiled patterns
+            names = {"error"}.union(*[G16_METHOD_TRIGGERS[method] for method in self.methods])
+            triggers = [(name, pattern) for name, pattern in G16_TRIGGERS if name in names]
+            trigger_re = re.compile("|".join(f"(?:{pattern})" for _, pattern in triggers))
+            trigger_name_re = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in triggers))
 
-    def GetTermination(self):
         with open(self.file) as fh:
-            txt = fh.readlines()
-            txt = [x.strip() for x in txt]
-            if txt[-1].find("Normal termination") > -1:
-                self.termination = True
-                return True
-            self.termination = False
+            for line in fh:
+                sections["last_line"] = line
+                if open_sections:
+                    stripped = line.strip()
+                    for name, section in list(open_sections.items()):
+                        if not section.feed(stripped):
+                            del open_sections[name]
+
+                if trigger_re.search(line) is None:
+                    continue
+                name = trigger_name_re.search(line).lastgroup
+
+                if name == "error":
+                    if sections["error"] is None:
+                        sections["error"] = line
+                elif name == "charge_mult":
+                    if sections["charge_mult"] is None:
+                        sections["charge_mult"] = line
+                elif name == "cpu":
+                    if sections["cpu"] is None:
+                        sections["cpu"] = line
+                elif name == "orientation":
+                    # only the last orientation is kept
+                    sections["coords"] = open_sections["coords"] = LogSection(end=coords_end())
+                elif name in ("scf", "thermal_E"):
+                    if sections["E"] is None:
+                        sections["E"] = (name, line)
+                elif name == "thermal_G":
+                    if sections["G"] is None:
+                        sections["G"] = line
+                elif name == "freq":
+                    sections["freqs"].append(line)
+                elif name == "integrated":
+                    integrated = True
+                elif name == "fundamental":
+                    if integrated and sections["fundamental"] is None:
+                        sections["fundamental"] = open_sections["fundamental"] = LogSection(skip=2, end=lambda line: not line)
+                elif name == "overtones":
+                    if sections["fundamental"] is not None and "fundamental" not in open_sections and sections["overtones"] is None:
+                        sections["overtones"] = open_sections["overtones"] = LogSection(skip=2, end=lambda line: not line)
+                elif name == "combination":
+                    if sections["fundamental"] is not None and "fundamental" not in open_sections and "overtones" not in open_sections \
+                            and sections["combination"] is None:
+                        sections["combination"] = open_sections["combination"] = LogSection(skip=2, end=lambda line: not line)
+                elif name == "mulliken":
+                    # the Mulliken charges are those printed last before the first dipole moment
+                    if sections["dipole"] is None and line.lstrip().startswith("Mulliken charges"):
+                        sections["mulliken"] = open_sections["mulliken"] = LogSection(skip=1, end=lambda line: line.find('Mulliken charges') > -1)
+                elif name == "dipole":
+                    if sections["dipole"] is None and sections["mulliken"] is not None and line.lstrip().startswith("Dipole moment"):
+                        sections["dipole"] = open_sections["dipole"] = LogSection(n_lines=1)
+                elif name == "hirshfeld":
+                    sections["hirshfeld"] = open_sections["hirshfeld"] = LogSection(skip=1, end=lambda line: line.find('Tot') > -1)
+                elif name == "npa":
+                    if sections["npa"] is None:
+                        sections["npa"] = open_sections["npa"] = LogSection(skip=1, end=nbo_end())
+                elif name == "isotropic":
+                    sections["isotropic"].append(line)
+                elif name == "alpha_occ":
+                    if sections["alpha_virt"] is None:
+                        sections["alpha_occ"].append(line)
+                elif name == "alpha_virt":
+                    if sections["alpha_virt"] is None:
+                        sections["alpha_virt"] = line
+
+        self.sections = sections
+
+    def GetTermination(self):
+        if self.sections["last_line"].strip().find("Normal termination") > -1:
+            self.termination = True
+            return True
+        self.termination = False
 
     def GetError(self):
-        with open(self.file) as fh:
-            for line in (fh):
-                if line.find("Error termination") > -1:
-                    self.error = line
-                    return True
-            self.error = None
+        self.error = self.sections["error"]
+        return True if self.error is not None else None
 
     def GetChargeMult(self):
-        with open(self.file) as fh:
-            for line in (fh):
-                m = re.search('Charge\s*=\s*(-?\d+)\s*Multiplicity\s*=\s*(-?\d+)', line)
-                if m:
-                    self.formal_charge = int(m[1])
-                    self.mult = int(m[2])
-                    break
+        if self.sections["charge_mult"] is not None:
+            m = CHARGE_MULT_RE.search(self.sections["charge_mult"])
+            self.formal_charge = int(m[1])
+            self.mult = int(m[2])
 
     def GetCPU(self):
-        with open(self.file) as fh:
-            for line in (fh):
-                if line.find("Job cpu time") > -1:
-                    days = int(line.split()[3])
-                    hours = int(line.split()[5])
-                    mins = int(line.split()[7])
-                    secs = float(line.split()[9])
-
-                    self.CPU = [days, hours, mins, secs]
-                    break
+        line = self.sections["cpu"]
+        if line is not None:
+            days = int(line.split()[3])
+            hours = int(line.split()[5])
+            mins = int(line.split()[7])
+            secs = float(line.split()[9])
+
+            self.CPU = [days, hours, mins, secs]
 
     def GetCoords(self):
-        with open(self.file) as fh:
-            starting = False
-            found_coord = False
-            for line in (fh):
-                if line.find('Standard orientation') > -1:
-                    starting = True
-                    AtomsNum = []
-                    AtomsType = []
-                    Coords = []
-                    sep = 0
-                    found_coord = False
-                if starting:
-                    m = re.search('(\d+)\s+(\d+)\s+(\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)',
-                                  line)
-                    if not m: continue
-                    AtomsNum.append(int(m.group(2)))
-                    AtomsType.append(elementID(int(m.group(2))))
-                    Coords.append([float(m.group(4)), float(m.group(5)), float(m.group(6))])
-                    found_coord = True
-                if found_coord and line.find('-----------') > -1:
-                    starting = False
-                    found_coord = False
-        self.AtomsNum = AtomsNum
-        self.AtomsType = AtomsType
-        self.Coords = np.array(Coords)
+        # the section is the title lines of the table and then its rows
+        lines = self.sections["coords"].lines
+        first_row = next((i for i, line in enumerate(lines) if COORD_RE.search(line)), len(lines))
+        table = rows_to_array(lines[first_row:], 6)
+        self.AtomsNum = table[:, 1].astype(int).tolist()
+        self.AtomsType = [elementID(num) for num in self.AtomsNum]
+        self.Coords = table[:, 3:6] if len(table) else np.array([])
 
     def GetG(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-        for i, line in enumerate(txt):
-            if line.find('Sum of electronic and thermal Free Energies=') > -1:
-                m = re.search('-?\d+\.\d+', line)
-                if m:
-                    self.G = float(m.group(0))
-                    break
+        if self.sections["G"] is not None:
+            m = FLOAT_RE.search(self.sections["G"])
+            if m:
+                self.G = float(m.group(0))
 
     def GetE(self):
         self.E = None
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-        for i, line in enumerate(txt):
-            if line.find('Sum of electronic and thermal Energies') > -1:
-                m = re.search('-?\d+\.\d+', line)
+        if self.sections["E"] is not None:
+            name, line = self.sections["E"]
+            if name == "thermal_E":
+                m = FLOAT_RE.search(line)
                 if m:
                     self.E = float(m.group(0))
-            elif line.find('SCF Done') > -1:
-                m = re.search('=\s+(-?\d+\.\d+)', line)
+            else:
+                m = SCF_RE.search(line)
                 if m:
                     self.E = float(m[1])
-            if self.E is not None:
-                break
 
     def GetFreq(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-
         freqs = []
-        for line in txt:
-            if 'Frequencies --' in line:
-                splits = line.split()
-                freqs.extend(float(freq) for freq in splits[2:])
-
-        for i, line in enumerate(txt):
-            if line.find('Integrated intensity (I) in km.mol^-1') > -1:
-                txt = txt[i+2:]
-                break
-
-        for i, line in enumerate(txt):
-            if line.find('Fundamental Bands') > -1:
-                txt = txt[i+3:]
+        for line in self.sections["freqs"]:
+            splits = line.split()
+            freqs.extend(float(freq) for freq in splits[2:])
 
         an_wavenumbers = []
         an_intensities = []
         har_wavenumbers = []
         har_intensities = []
-        for i, line in enumerate(txt):
-            if not line:
-                txt = txt[i+1:]
-                break
-
-            m = re.findall('(\d+\.\d+)', line)
+        for line in self.sections["fundamental"].lines if self.sections["fundamental"] is not None else []:
+            m = UNSIGNED_FLOAT_RE.findall(line)
 
             if len(m) != 4:
                 continue
@@ -185,38 +537,24 @@ class G16Log:
             har_intensities.append(float(m[2]))
             an_wavenumbers.append(float(m[1]))
             an_intensities.append(float(m[3]))
-        for i, line in enumerate(txt):
-            if line.find('Overtones') > -1:
-                txt = txt[i+3:]
 
         over_wavenumbers = []
         over_intensities = []
-        for i, line in enumerate(txt):
-            if not line:
-                txt = txt[i+1:]
-                break
-            m = re.findall('(\d+\.\d+)', line)
+        for line in self.sections["overtones"].lines if self.sections["overtones"] is not None else []:
+            m = UNSIGNED_FLOAT_RE.findall(line)
             if len(m) != 3:
                 continue
 
             over_wavenumbers.append(float(m[1]))
             over_intensities.append(float(m[2]))
 
-        for i, line in enumerate(txt):
-            if line.find('Combination Bands') > -1:
-                txt = txt[i+3:]
-
         com_wavenumbers = []
         com_intensities = []
-        for i, line in enumerate(txt):
-            if not line:
-                txt = txt[i+1:]
-                break
-
-            m = re.findall('(\d+\.\d+)', line)
+        for line in self.sections["combination"].lines if self.sections["combination"] is not None else []:
+            m = UNSIGNED_FLOAT_RE.findall(line)
             if len(m) != 3:
                 continue
-                
+
             com_wavenumbers.append(float(m[1]))
             com_intensities.append(float(m[2]))
 
@@ -240,67 +578,30 @@ class G16Log:
             self.har_frequencies = freqs
 
     def GetMulliken(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-        txt = (x.strip() for x in txt)
-
-        starting = False
-        dipole_moment = ''
-        while True:
-            try:
-                line = next(txt)
-            except StopIteration as e:
-                break
+        if self.sections["mulliken"] is None or self.sections["dipole"] is None or not self.sections["dipole"].lines:
+            return
 
-            if re.match('Mulliken charges:', line) or re.match('Mulliken charges and spin densities:', line):
-                _ = next(txt)
-                line = next(txt)
+        mulliken = []
+        spin_density = []
+        for line in self.sections["mulliken"].lines:
+            m = SIGNED_FLOAT_RE.findall(line)
+            mulliken.append(m[0])
 
-                mulliken = []
-                spin_density = []
+            if len(m) > 1:
+                spin_density.append(m[1])
 
-                starting = True
-
-
-            if starting:
-                if line.find('Mulliken charges') > -1:
-                    starting =False
-                    continue
-
-                m = re.findall('(-?\d+\.\d+)', line)
-                mulliken.append(m[0])
-
-                if len(m) > 1:
-                    spin_density.append(m[1])
-
-            if re.match('Dipole moment', line):
-                line = next(txt)
-                m = re.findall('(-?\d+\.\d+)', line)
-                dipole_moment = m
-
-            if dipole_moment:
-                self.mulliken_charge = np.array(mulliken)
-                self.mulliken_spin_density = np.array(spin_density)
-                self.mulliken_dipole_moment = np.array(dipole_moment)
-
-                break
+        dipole_moment = SIGNED_FLOAT_RE.findall(self.sections["dipole"].lines[0])
+        if dipole_moment:
+            self.mulliken_charge = np.array(mulliken)
+            self.mulliken_spin_density = np.array(spin_density)
+            self.mulliken_dipole_moment = np.array(dipole_moment)
 
     def GetHirshfeld(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-        for i, line in enumerate(txt):
-            if line.find('Hirshfeld charges, spin densities, dipoles, and CM5 charges') > -1:
-                txt = txt[i+2:]
-
         hirshfeld_charges = []
         hirshfeld_spin_density = []
         hirshfeld_dipoles = []
-        for i, line in enumerate(txt):
-            if line.find('Tot') > -1:
-                break
-            m = re.findall('(-?\d+\.\d+)', line)
+        for line in self.sections["hirshfeld"].lines if self.sections["hirshfeld"] is not None else []:
+            m = SIGNED_FLOAT_RE.findall(line)
             if m:
                 hirshfeld_charges.append(m[0])
                 hirshfeld_spin_density.append(m[1])
@@ -317,262 +618,39 @@ class G16Log:
 
 
     def GetNPA(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-        # charge and multiplicity
-        # if self.mult == 1:
-        #     only_charge = False
-        # else:
-        #     only_charge = True
-
-        # NPA charge
-        NPA_Charge = np.zeros([len(self.AtomsNum), 3])
-        for i, line in enumerate(txt):
-            m = re.search('Atom\s+No\s+Charge\s+Core\s+Valence\s+Rydberg\s+Total', line)
-            if m:
-                txt = txt[i + 2:]
-                break
-
-        for i, line in enumerate(txt):
-            if re.search('=====', line):
-                txt = txt[i + 1:]
-                break
-            m = re.search('(\S+)\s*(\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)',
-                          line)
-            NPA_Charge[i, :] = [float(m[3]), float(m[5]), float(m[6])]
-        self.NPA_Charge = NPA_Charge
-
-        # if only_charge:
-        #     return
-
-        # valence electron configuration
-        for i, line in enumerate(txt):
-            if line.find('Natural Electron Configuration') > -1:
-                txt = txt[i + 2:]
-                break
-
-        electron_configuration = []
-        for i, line in enumerate(txt):
-            m = [float(x[1]) for x in re.findall(r'(\d+\S+)\(\s?(-?\d+\.\d+)\)', line)]
-            if not m:
-                txt = txt[i + 1:]
-                break
-            else:
-                electron_configuration.append(m)
-
-        nc_np = np.zeros([len(self.AtomsNum), 5])
-        for i, itr in enumerate(electron_configuration):
-            nc_np[i, :len(itr)] = itr
-
-        self.electron_configuration = nc_np
-
-        # bond index
-        for i, line in enumerate(txt):
-            if line.find('Wiberg bond index matrix in the NAO basis') > -1:
-                txt = txt[i + 2:]
-                break
-
-        keep_going = True
-        bond_index_matrix = np.zeros([len(self.AtomsNum), len(self.AtomsNum)], dtype='float32')
-        while keep_going:
-            for i, line in enumerate(txt):
-                m = re.findall('\s+(\d+)', line)
-                if m:
-                    txt = txt[i + 2:]
-                    start, end = int(m[0]) - 1, int(m[-1])
-
-                    if end == len(self.AtomsNum):
-                        keep_going = False
-
-                    break
-
-            for i, line in enumerate(txt):
-                m = re.findall(r'\d+\.\d+', line)
-                if not m:
-                    txt = txt[i + 1:]
-                    break
-                else:
-                    bond_index_matrix[i, start:end] = [float(x) for x in m]
-
-        self.bond_index_matrix = bond_index_matrix
-
-        # occupancy of lewis structure
-        for i, line in enumerate(txt):
-            if line.find('(Occupancy)   Bond orbital / Coefficients / Hybrids') > -1:
-                txt = txt[i + 2:]
-                break
-
-        txt_generator = (x for x in txt)
-        keep_going = True
-        non_lewis = False
-        lone_pairs = np.zeros([len(self.AtomsNum), 4], dtype='float32')
-
-        bond_lewis = np.zeros([len(self.AtomsNum), len(self.AtomsNum), 3], dtype='float32')
-        bond_lewis_contribution = np.zeros([len(self.AtomsNum), len(self.AtomsNum), 3, 2], dtype='float32')
-        bond_non_lewis = np.zeros([len(self.AtomsNum), len(self.AtomsNum), 3], dtype='float32')
-        bond_non_lewis_contribution = np.zeros([len(self.AtomsNum), len(self.AtomsNum), 3, 2], dtype='float32')
-
-        while keep_going:
-            line = next(txt_generator)
-            if line.find('non-Lewis') > -1:
-                non_lewis = True
-
-            m = re.search('\((\d+\.\d+)\)\s+LP\s+\(\s+(\d+)\)\s+\S+\s+(\d+)', line)
-            if m:
-                try:
-                    occu, i, atom_num = float(m[1]), int(m[2]), int(m[3])
-                except:
-                    print(self.file)
-                    print(line)
-                lone_pairs[atom_num - 1, i - 1] = occu
-                continue
-
-            m = re.search('\((\d+\.\d+)\)\s+BD[\*\s]+\(\s+(\d+)\)\s+\S+\s+(\d+)-\s+\S+\s+(\d+)', line)
-            if m:
-                occu, i, start, end = float(m[1]), int(m[2]) - 1, int(m[3]) - 1, int(m[4]) - 1
-                line = next(txt_generator)
-                p1 = float(re.search('(\d+\.\d+)%', line)[1]) / 100
-
-                while True:
-                    line = next(txt_generator)
-                    m = re.search('(\d+\.\d+)%', line)
-                    if m:
-                        p2 = float(m[1]) / 100
-                        break
-
-                if not non_lewis:
-                    bond_lewis[start, end, i] = occu
-                    bond_lewis[end, start, i] = occu
-                    bond_lewis_contribution[start, end, i, :] = [p1, p2]
-                    bond_lewis_contribution[end, start, i, :] = [p2, p1]
-
-                else:
-                    bond_non_lewis[start, end, i] = occu
-                    bond_non_lewis[end, start, i] = occu
-                    bond_non_lewis_contribution[start, end, i, :] = [p1, p2]
-                    bond_non_lewis_contribution[end, start, i, :] = [p2, p1]
-
-            if not line.strip():
-                keep_going = False
-
-        self.lone_pairs = lone_pairs
-        self.bond_lewis = bond_lewis
-        self.bond_non_lewis = bond_non_lewis
-        self.bond_lewis_contribution = bond_lewis_contribution
-        self.bond_non_lewis_contribution = bond_non_lewis_contribution
+        if self.sections["npa"] is None:
+            raise NBOParseError("npa", "no NPA output in the log")
+        # lines after the NPA charge table header
+        lines = self.sections["npa"].lines
+        n_atoms = len(self.AtomsNum)
+        offsets = locate_nbo_sections(lines)
+
+        # every attribute is set as soon as its section is parsed, so that a malformed later
+        # section leaves the earlier ones
+        self.NPA_Charge = parse_npa_charges(lines, offsets, n_atoms)
+        self.electron_configuration = parse_electron_configuration(lines, offsets, n_atoms)
+        self.bond_index_matrix = parse_wiberg_matrix(lines, offsets, n_atoms)
+        self.lone_pairs, self.bond_lewis, self.bond_non_lewis, self.bond_lewis_contribution, self.bond_non_lewis_contribution = \
+            parse_bond_orbitals(lines, offsets, n_atoms)
 
     def GetNMR(self):
         NMR = []
-        with open(self.file, 'r') as fh:
-            for line in fh:
-                if len(NMR) == len(self.AtomsNum): break
-                m = re.search('Isotropic\s*=\s*(-?\d+\.\d+)', line)
-                if not m: continue
-                NMR.append(float(m.group(1)))
+        for line in self.sections["isotropic"]:
+            if len(NMR) == len(self.AtomsNum): break
+            NMR.append(float(ISOTROPIC_RE.search(line).group(1)))
         self.NMR = np.array(NMR)
 
     def GetHOMOLUMO(self):
-        with open(self.file, 'r') as fh:
-            txt = fh.readlines()
-        txt = [x.strip() for x in txt]
         homo = -float("inf")
         lumo = ''
-        for line in txt:
-            if line.find('Alpha  occ.') > -1:
-                m = re.findall('(-?\d+\.\d+)', line)
-                if float(m[-1]) > homo:
-                    homo = float(m[-1])
-            elif line.find('Alpha virt.') > -1:
-                m = re.findall('(-?\d+\.\d+)', line)
-                lumo = float(m[0])
-                break
+        for line in self.sections["alpha_occ"]:
+            m = SIGNED_FLOAT_RE.findall(line)
+            if float(m[-1]) > homo:
+                homo = float(m[-1])
+        if self.sections["alpha_virt"] is not None:
+            m = SIGNED_FLOAT_RE.findall(self.sections["alpha_virt"])
+            lumo = float(m[0])
 
         if homo and lumo:
             self.homo = homo
             self.lumo = lumo
-
-
-class XtbLog:
-    def __init__(self, file):
-        # default values for thermochemical calculations
-        if '.log' not in file:
-            raise TypeError('A xtb .log file must be provided')
-
-        self.file = file
-        self.name = os.path.basename(file)
-
-        self.GetTermination()
-        if not self.termination:
-            pass
-            #self.GetError()
-        else:
-            try:
-                self.GetFreq()
-            except:
-                pass
-            self.GetE()
-
-    def GetTermination(self):
-        with open(self.file) as fh:
-            for line in (fh):
-                if line.find("normal termination") > -1 and not line.find("abnormal termination") > -1:
-                    self.termination = True
-                    return True
-            self.termination = False
-
-    def GetFreq(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-        for i, line in enumerate(txt):
-            if line.find('Frequency Printout') > -1:
-                txt = txt[i + 3:]
-                break
-
-        waveNums = []
-        for i, line in enumerate(txt):
-            if line.find('reduced masses') > -1:
-                txt = txt[i + 1:]
-                break
-            m = re.findall('\s+(-?\d+\.\d+)', line)
-            if m:
-                for match in m:
-                    waveNums.append(float(match.strip()))
-
-        for i, line in enumerate(txt):
-            if line.find('IR intensities') > -1:
-                txt = txt[i + 1:]
-                break
-
-        intensities = []
-        for i, line in enumerate(txt):
-            if line.find('Raman intensities') > -1:
-                txt = txt[i + 1:]
-                break
-            m = re.findall('\d+:\s+(\d+\.\d+)', line)
-            if m:
-                for match in m:
-                    intensities.append(float(match))
-
-        waveNums, intensities = list(zip(*[(w, i) for w, i in zip(waveNums, intensities) if w != 0]))
-
-        if waveNums and intensities and len(waveNums) == len(intensities):
-            self.wavenum = waveNums
-            self.ir_intensities = intensities
-
-    def GetE(self):
-        with open(self.file) as fh:
-            txt = fh.readlines()
-
-        txt = [x.strip() for x in txt]
-        for i, line in enumerate(txt):
-            m = re.search('TOTAL ENERGY\s+(-?\d+\.\d+)', line)
-            if m:
-                self.E = m[1]
-                continue
-            m = re.search('TOTAL FREE ENERGY\s+(-?\d+\.\d+)', line)
-            if m:
-                self.G = float(m[1])
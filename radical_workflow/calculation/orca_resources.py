@@ -0,0 +1,197 @@
+import csv
+import fcntl
+import os
+import re
+
+import numpy as np
+
+# approximate number of spherical basis functions per element for
+# (H-He, Li-Ne, Na-Ar, K and heavier)
+ORBITAL_BASIS_FUNCTIONS = {
+    "def2-svp": (5, 14, 18, 32),
+    "def2-tzvp": (6, 31, 37, 48),
+    "def2-tzvpp": (14, 31, 37, 48),
+    "def2-qzvpp": (30, 69, 73, 90),
+    "cc-pvdz": (5, 14, 18, 27),
+    "cc-pvtz": (14, 30, 34, 59),
+    "cc-pvqz": (30, 55, 59, 98),
+    "cc-pvdz-f12": (9, 23, 27, 45),
+    "cc-pvtz-f12": (18, 48, 52, 77),
+}
+AUXILIARY_BASIS_FUNCTIONS = {
+    "def2-svp/c": (14, 56, 65, 100),
+    "def2-tzvp/c": (23, 81, 89, 130),
+    "def2-tzvpp/c": (23, 81, 89, 130),
+    "cc-pvdz/c": (14, 56, 65, 100),
+    "cc-pvtz/c": (23, 84, 90, 135),
+    "cc-pvqz/c": (42, 118, 125, 180),
+    "def2/j": (10, 40, 50, 70),
+    "cc-pvdz-f12-cabs": (14, 42, 50, 80),
+    "cc-pvtz-f12-cabs": (19, 53, 61, 95),
+    "cc-pvqz-f12-cabs": (28, 78, 86, 120),
+}
+
+# ORCA uses more than %maxcore per rank, so only this fraction of the memory of a node is handed out
+ORCA_MEMORY_FRACTION = 0.75
+# SCF convergence keywords, which are loosened on retries but do not change the size of a run
+SCF_CONVERGENCE_KEYWORDS = re.compile(r'(?<!\w)(?:VeryTightSCF|TightSCF|NormalSCF|LooseSCF|SlowConv)(?!\w)', flags=re.IGNORECASE)
+
+RESOURCE_HISTORY_COLUMNS = ["name", "level_of_theory", "n_basis", "n_aux", "nprocs", "maxcore", "peak_memory_mb", "wall_time", "status"]
+
+
+def element_row(symbol):
+    symbol = symbol.capitalize()
+    if symbol in ("H", "He"):
+        return 0
+    if symbol in ("Li", "Be", "B", "C", "N", "O", "F", "Ne"):
+        return 1
+    if symbol in ("Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar"):
+        return 2
+    return 3
+
+
+def resource_level_of_theory(level_of_theory):
+    """The level of theory a run is recorded and looked up under, without its SCF convergence keywords."""
+    return " ".join(SCF_CONVERGENCE_KEYWORDS.sub(" ", level_of_theory).split())
+
+
+def estimate_basis_functions(xyz_str, level_of_theory):
+    """
+    Estimate the number of orbital and auxiliary basis functions from the atoms of an
+    xyz string and the basis sets named in the level of theory. Returns (n_basis, n_aux).
+    """
+    tokens = level_of_theory.lower().split()
+    orbital = [token for token in tokens if token in ORBITAL_BASIS_FUNCTIONS]
+    auxiliary = [token for token in tokens if token in AUXILIARY_BASIS_FUNCTIONS]
+
+    row_counts = np.zeros(4)
+    for line in xyz_str.strip().splitlines():
+        if line.split():
+            row_counts[element_row(line.split()[0])] += 1
+
+    n_basis = sum(row_counts @ np.array(ORBITAL_BASIS_FUNCTIONS[basis]) for basis in orbital[:1])
+    n_aux = sum(row_counts @ np.array(AUXILIARY_BASIS_FUNCTIONS[basis]) for basis in auxiliary)
+    return int(n_basis), int(n_aux)
+
+
+class DLPNOResourceModel:
+    """
+    Pick the number of ranks and %maxcore of a DLPNO-CCSD(T) single point from its size.
+    Memory is modeled as a fixed overhead per rank plus the three-index integrals,
+    n_basis**2 * n_aux doubles scaled by memory_scale. Wall time is modeled as
+    cpu time = a * n_basis**b. Both are refined from earlier runs of the same level of
+    theory recorded in history_path, see record_resource_usage.
+    """
+    def __init__(self, level_of_theory, history_path=None, max_procs=24, node_memory_mb=None,
+                 basis_per_rank=20, overhead_mb=1000, memory_scale=4.0, min_maxcore=2000, safety_factor=1.5):
+        self.level_of_theory = level_of_theory
+        self.max_procs = max_procs
+        self.node_memory_mb = node_memory_mb
+        self.basis_per_rank = basis_per_rank
+        self.overhead_mb = overhead_mb
+        self.memory_scale = memory_scale
+        self.min_maxcore = min_maxcore
+        self.safety_factor = safety_factor
+        self.time_coefficients = None
+        if history_path is not None and os.path.exists(history_path):
+            self.refine(read_resource_history(history_path, level_of_theory))
+
+    def integral_memory(self, n_basis, n_aux):
+        return n_basis ** 2 * n_aux * 8 / 1024 ** 2
+
+    def refine(self, history):
+        """Fit the memory scale and the wall time model to finished runs."""
+        history = [row for row in history if row["status"] == "normal" and row["n_basis"] > 0]
+        if not history:
+            return
+
+        scales = []
+        for row in history:
+            if row["peak_memory_mb"] is None:
+                continue
+            integral_memory = self.integral_memory(row["n_basis"], row["n_aux"])
+            if integral_memory > 0:
+                scales.append(max(row["peak_memory_mb"] - self.overhead_mb * row["nprocs"], 0) / integral_memory)
+        if scales:
+            # cover most runs rather than the average one
+            self.memory_scale = max(np.percentile(scales, 90), 1.0)
+
+        times = [(row["n_basis"], row["wall_time"] * row["nprocs"]) for row in history if row["wall_time"]]
+        if len(times) >= 5:
+            x, y = np.log(np.array(times)).T
+            self.time_coefficients = np.polyfit(x, y, 1)
+
+    def size(self, xyz_str):
+        """
+        Returns a dict with n_basis, n_aux, nprocs, maxcore (MB per rank), memory_mb and wall_time (s),
+        or None if the basis sets of the level of theory are not in ORBITAL_BASIS_FUNCTIONS.
+        """
+        n_basis, n_aux = estimate_basis_functions(xyz_str, self.level_of_theory)
+        if n_basis == 0:
+            return None
+        nprocs = int(np.clip(round(n_basis / self.basis_per_rank), 1, self.max_procs))
+        memory_mb = self.overhead_mb * nprocs + self.memory_scale * self.integral_memory(n_basis, n_aux)
+        maxcore = max(int(memory_mb * self.safety_factor / nprocs), self.min_maxcore)
+        if self.node_memory_mb is not None:
+            maxcore = min(maxcore, int(self.node_memory_mb * ORCA_MEMORY_FRACTION / nprocs))
+
+        wall_time = None
+        if self.time_coefficients is not None and n_basis > 0:
+            wall_time = float(np.exp(np.polyval(self.time_coefficients, np.log(n_basis)))) / nprocs
+
+        return dict(n_basis=n_basis, n_aux=n_aux, nprocs=nprocs, maxcore=maxcore, memory_mb=maxcore * nprocs, wall_time=wall_time)
+
+
+def read_resource_history(history_path, level_of_theory=None):
+    history = []
+    if level_of_theory is not None:
+        level_of_theory = resource_level_of_theory(level_of_theory)
+    with open(history_path) as f:
+        for row in csv.DictReader(f):
+            if level_of_theory is not None and resource_level_of_theory(row["level_of_theory"]) != level_of_theory:
+                continue
+            for key in ["n_basis", "n_aux", "nprocs", "maxcore"]:
+                row[key] = int(row[key])
+            for key in ["peak_memory_mb", "wall_time"]:
+                row[key] = float(row[key]) if row[key] else None
+            history.append(row)
+    return history
+
+
+def record_resource_usage(history_path, row):
+    """
+    Append one run, a dict with RESOURCE_HISTORY_COLUMNS, to the history csv. The array tasks
+    of a job append to the same csv, so the file is locked while the header and row are written.
+    """
+    with open(history_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            writer = csv.DictWriter(f, fieldnames=RESOURCE_HISTORY_COLUMNS)
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerow(row)
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def pack_jobs(jobs, node_cores, node_memory_mb, memory_fraction=ORCA_MEMORY_FRACTION):
+    """
+    Fill one node with jobs, given as (name, nprocs, memory_mb) with memory_mb = maxcore * nprocs,
+    by first-fit decreasing on memory. As ORCA uses more than %maxcore, a job takes
+    memory_mb / memory_fraction of the node. Returns (name, node memory share) of the jobs that
+    fit together, the share being the memory of the node a job may use on retries: its own
+    footprint plus an even part of what is left.
+    """
+    selected = []
+    free_cores, free_memory = node_cores, node_memory_mb
+    for name, nprocs, memory_mb in sorted(jobs, key=lambda x: (x[2], x[1]), reverse=True):
+        footprint = memory_mb / memory_fraction
+        if nprocs <= free_cores and footprint <= free_memory:
+            selected.append((name, footprint))
+            free_cores -= nprocs
+            free_memory -= footprint
+    if not selected and jobs:
+        # a job larger than the node still has to run, alone
+        return [(max(jobs, key=lambda x: (x[2], x[1]))[0], node_memory_mb)]
+    return [(name, int(footprint + free_memory / len(selected))) for name, footprint in selected]
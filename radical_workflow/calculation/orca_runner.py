@@ -0,0 +1,158 @@
+import os
+import re
+import subprocess
+import time
+
+from radical_workflow.parser.orca_log_status import classify_orca_log, ORCA_MAXCORE_ERROR, ORCA_WAVE_FUNCTION_ERROR
+from .watchdog import run_command
+from .orca_resources import estimate_basis_functions, record_resource_usage, resource_level_of_theory, ORCA_MEMORY_FRACTION
+
+MAXCORE_PATTERN = re.compile(r'%maxcore\s+(\d+)', flags=re.IGNORECASE)
+NPROCS_PATTERN = re.compile(r'(?<!\w)nprocs\s+(\d+)', flags=re.IGNORECASE)
+
+# from tighter to looser, NormalSCF is the ORCA default
+SCF_FALLBACKS = [("VeryTightSCF", "TightSCF"), ("TightSCF", "NormalSCF")]
+
+
+def get_node_memory():
+    """Physical memory of the node in MB."""
+    return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 2)
+
+
+def get_orca_resources(script):
+    """Return (maxcore, nprocs) of an ORCA input, nprocs is 1 without a %pal block."""
+    maxcore = MAXCORE_PATTERN.search(script)
+    nprocs = NPROCS_PATTERN.search(script)
+    return int(maxcore[1]) if maxcore else None, int(nprocs[1]) if nprocs else 1
+
+
+def set_orca_resources(script, maxcore, nprocs):
+    script = MAXCORE_PATTERN.sub(f"%maxcore {maxcore}", script)
+    return NPROCS_PATTERN.sub(f"nprocs {nprocs}", script)
+
+
+def retune_orca_resources(maxcore, nprocs, node_memory_mb, memory_fraction=ORCA_MEMORY_FRACTION):
+    """
+    Give each rank more memory after a MaxCore/GTOInt/MDCI failure. ORCA uses more than
+    %maxcore per rank, so only memory_fraction of the node is handed out. Memory per rank is
+    first raised at the same number of ranks, and the ranks are halved once this is not
+    enough. Returns (maxcore, nprocs), or None if there is nothing left to try.
+    """
+    usable_memory = node_memory_mb * memory_fraction
+    if maxcore is not None and usable_memory / nprocs > 1.2 * maxcore:
+        return int(usable_memory / nprocs), nprocs
+    if nprocs <= 1:
+        return None
+    nprocs = nprocs // 2
+    return int(usable_memory / nprocs), nprocs
+
+
+def loosen_scf_settings(script):
+    """
+    Loosen the SCF convergence keyword by one step, VeryTightSCF -> TightSCF -> NormalSCF,
+    and add SlowConv after that. Works on a whole input or on a level of theory string.
+    Returns None once SlowConv is already used.
+    """
+    for tight, loose in SCF_FALLBACKS:
+        pattern = re.compile(rf'(?<!\w){tight}(?!\w)', flags=re.IGNORECASE)
+        if pattern.search(script):
+            return pattern.sub(loose, script)
+    if re.search(r'(?<!\w)SlowConv(?!\w)', script, flags=re.IGNORECASE):
+        return None
+    if re.search(r'^!', script, flags=re.MULTILINE):
+        return re.sub(r'^(!.*?)\s*$', r'\1 SlowConv', script, flags=re.MULTILINE)
+    return script + " SlowConv"
+
+
+def run_measured_command(command, out):
+    """Run a shell command and return (wall time in s, peak resident memory of its largest process in MB)."""
+    start = time.time()
+    proc = subprocess.Popen(command, shell=True, stdout=out, stderr=out)
+    _, wait_status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(wait_status)
+    return time.time() - start, rusage.ru_maxrss / 1024
+
+
+def get_orca_geometry(script):
+    """Return the xyz block of a single-job ORCA input, or None."""
+    m = re.search(r'^\*\s*xyz\s+-?\d+\s+\d+\s*\n(.*?)^\*', script, flags=re.MULTILINE | re.DOTALL)
+    return m[1] if m else None
+
+
+def record_orca_run(history_path, name, script, status, wall_time, peak_memory_mb):
+    if "$new_job" in script:
+        return
+    xyz_str = get_orca_geometry(script)
+    keywords = re.search(r'^!(.*)$', script, flags=re.MULTILINE)
+    if xyz_str is None or keywords is None:
+        return
+    # SCF keywords loosened on retries are dropped, so the run counts for the level it was asked for
+    level_of_theory = resource_level_of_theory(keywords[1])
+    n_basis, n_aux = estimate_basis_functions(xyz_str, level_of_theory)
+    maxcore, nprocs = get_orca_resources(script)
+    record_resource_usage(history_path, dict(name=name, level_of_theory=level_of_theory, n_basis=n_basis, n_aux=n_aux,
+                                             nprocs=nprocs, maxcore=maxcore, peak_memory_mb=peak_memory_mb,
+                                             wall_time=wall_time, status=status))
+
+
+def run_orca(infile, logfile, orca_path, node_memory_mb=None, max_retries=4, watchdog_rules=None, work_dir=None, history_path=None):
+    """
+    Run an ORCA input in work_dir, the current directory by default, and retry it with a new
+    maxcore/nprocs split after memory failures, or with looser SCF settings if the wavefunction
+    did not converge. The input file is rewritten before each retry. A $new_job batch runs only
+    once. Returns the status of the last attempt, see radical_workflow.parser.orca_log_status.
+    node_memory_mb is the memory the run may take on retries, its share of the node when it
+    runs next to other inputs. With history_path, the peak memory and wall time of each attempt are appended to that csv.
+    Peak memory is the largest rank times the number of ranks, and is only measured without
+    watchdog rules.
+    """
+    if node_memory_mb is None:
+        node_memory_mb = get_node_memory()
+    orca_command = os.path.join(orca_path, "orca")
+    work_dir = os.getcwd() if work_dir is None else work_dir
+    infile_path = os.path.join(work_dir, infile)
+    logfile_path = os.path.join(work_dir, logfile)
+
+    status = None
+    for attempt in range(max_retries + 1):
+        with open(infile_path) as f:
+            script = f.read()
+
+        command = 'cd {} && {} {} > {}'.format(work_dir, orca_command, infile, logfile)
+        peak_memory_mb = None
+        with open(f"{os.path.splitext(logfile_path)[0]}.out", "a") as out:
+            if watchdog_rules:
+                start = time.time()
+                run_command(command, logfile_path, out, watchdog_rules)
+                wall_time = time.time() - start
+            else:
+                wall_time, peak_rss = run_measured_command(command, out)
+                peak_memory_mb = peak_rss * get_orca_resources(script)[1]
+        if not os.path.exists(logfile_path):
+            return None
+        status = classify_orca_log(logfile_path)
+        if history_path is not None:
+            record_orca_run(history_path, os.path.splitext(infile)[0], script, status, wall_time, peak_memory_mb)
+
+        # a $new_job batch is not rerun as a whole, its molecules that did not finish are retried on their own
+        if "$new_job" in script:
+            return status
+        if status == ORCA_MAXCORE_ERROR:
+            maxcore, nprocs = get_orca_resources(script)
+            resources = retune_orca_resources(maxcore, nprocs, node_memory_mb)
+            if resources is None:
+                return status
+            print(f"{infile}: {status}, retrying with maxcore {resources[0]} and nprocs {resources[1]}")
+            new_script = set_orca_resources(script, *resources)
+        elif status == ORCA_WAVE_FUNCTION_ERROR:
+            new_script = loosen_scf_settings(script)
+            if new_script is None:
+                return status
+            print(f"{infile}: {status}, retrying with looser SCF settings")
+        else:
+            return status
+
+        if attempt < max_retries:
+            with open(infile_path, "w") as f:
+                f.write(new_script)
+    return status
@@ -9,6 +9,7 @@ from rdmc.ts import get_formed_and_broken_bonds
 
 from radical_workflow.calculation.semiempirical_calculation import run_xtb_opt
 from radical_workflow.calculation.utils import mol2charge, mol2mult, mol2xyz
+from radical_workflow.parser.tar_archive import install_tar
 
 
 def reset_r_p_complex_semi_opt(
@@ -92,7 +93,7 @@ def reset_r_p_complex_semi_opt(
     tar.add(os.path.join(pmol_scratch_dir, f"{p_complex_id}.log"))
     tar.close()
 
-    shutil.copyfile(tar_file, os.path.join(suboutputs_dir, tar_file))
+    install_tar(tar_file, os.path.join(suboutputs_dir, tar_file))
     os.chdir(current_dir)
     try:
         os.remove(os.path.join(subinputs_dir, f"{ts_id}.tmp"))
@@ -10,23 +10,56 @@ import numpy as np
 
 from .log_parser import XtbLog, G16Log
 from .file_parser import mol2xyz, xyz2com, write_mol_to_sdf, write_mols_to_sdf
+from .watchdog import run_command
+from .g16_batch import run_g16_link1_batch
+from radical_workflow.parser.tar_archive import install_tar
 
-def run_xtb_opt(xyz, charge, mult, mol_id, rdmc_path, g16_path, n_procs, job_ram, level_of_theory):
+def xtb_opt_head(rdmc_path, n_procs, job_ram, level_of_theory):
+    return '%nprocshared={}\n%mem={}mb\n{}\nexternal=\"{}/rdmc/external/xtb_tools/xtb_gaussian.pl --gfn 2 -P\"\n'.format(n_procs, job_ram, level_of_theory, rdmc_path)
+
+def run_xtb_opt(xyz, charge, mult, mol_id, rdmc_path, g16_path, n_procs, job_ram, level_of_theory, watchdog_rules=None):
     comfile = f"{mol_id}.gjf"
     logfile = f"{mol_id}.log"
     outfile = f"{mol_id}.out"
 
     g16_command = os.path.join(g16_path, 'g16')
 
-    head = '%nprocshared={}\n%mem={}mb\n{}\nexternal=\"{}/rdmc/external/xtb_tools/xtb_gaussian.pl --gfn 2 -P\"\n'.format(n_procs, job_ram, level_of_theory, rdmc_path)
+    head = xtb_opt_head(rdmc_path, n_procs, job_ram, level_of_theory)
 
     xyz2com(xyz, head=head, comfile=comfile, charge=charge, mult=mult, footer='\n')
 
     with open(outfile, 'w') as out:
-        subprocess.run('{} < {} >> {}'.format(g16_command, comfile, logfile), shell=True, stdout=out, stderr=out) 
+        reason = run_command('{} < {} >> {}'.format(g16_command, comfile, logfile), logfile, out, watchdog_rules)
+    return reason
 
-def semiempirical_opt(mol_id, charge, mult, xyz_FF_dict, xtb_path, rdmc_path, g16_path, level_of_theory, n_procs, job_ram, scratch_dir, tmp_mol_dir, suboutputs_dir, subinputs_dir):
+def run_xtb_opt_link1_batches(mol_id, charge, mult, confs, rdmc_path, g16_path, n_procs, job_ram, level_of_theory, link1_batch_size, scratch_dir, tmp_mol_dir, watchdog_rules=None):
+    """Optimize the conformers link1_batch_size at a time, each batch in a single g16 process."""
     current_dir = os.getcwd()
+    head = xtb_opt_head(rdmc_path, n_procs, job_ram, level_of_theory)
+
+    for i in range(0, len(confs), link1_batch_size):
+        batch = confs[i:i + link1_batch_size]
+        batch_name = f"{mol_id}_batch_{batch[0][0]}"
+        batch_scratch_dir = os.path.join(scratch_dir, batch_name)
+        os.makedirs(batch_scratch_dir)
+        os.chdir(batch_scratch_dir)
+
+        jobs = [dict(name=f"{mol_id}_{conf_ind}", head=head, xyz=xyz, charge=charge, mult=mult, footer='\n') for conf_ind, xyz in batch]
+        with open(f"{batch_name}.out", 'w') as out:
+            done = run_g16_link1_batch(jobs, g16_path, batch_name, out, watchdog_rules)
+        for name in done:
+            shutil.copyfile(f"{name}.log", os.path.join(tmp_mol_dir, f"{name}.log"))
+        if len(done) < len(jobs):
+            print(f"{len(jobs) - len(done)} conformers of {batch_name} did not run, they will be run one by one")
+        os.chdir(current_dir)
+        shutil.rmtree(batch_scratch_dir)
+
+def semiempirical_opt(mol_id, charge, mult, xyz_FF_dict, xtb_path, rdmc_path, g16_path, level_of_theory, n_procs, job_ram, scratch_dir, tmp_mol_dir, suboutputs_dir, subinputs_dir, watchdog_rules=None, link1_batch_size=1):
+    current_dir = os.getcwd()
+
+    if link1_batch_size > 1:
+        confs = [(conf_ind, xyz) for conf_ind, xyz in xyz_FF_dict[mol_id].items() if not os.path.exists(os.path.join(tmp_mol_dir, f"{mol_id}_{conf_ind}.log"))]
+        run_xtb_opt_link1_batches(mol_id, charge, mult, confs, rdmc_path, g16_path, n_procs, job_ram, level_of_theory, link1_batch_size, scratch_dir, tmp_mol_dir, watchdog_rules)
 
     for conf_ind, xyz in xyz_FF_dict[mol_id].items():
         comfile = f"{mol_id}_{conf_ind}.gjf"
@@ -40,7 +73,9 @@ def semiempirical_opt(mol_id, charge, mult, xyz_FF_dict, xtb_path, rdmc_path, g1
         os.makedirs(conf_scratch_dir)
         os.chdir(conf_scratch_dir)
 
-        run_xtb_opt(xyz, charge, mult, f"{mol_id}_{conf_ind}", rdmc_path, g16_path, n_procs, job_ram, level_of_theory)        
+        reason = run_xtb_opt(xyz, charge, mult, f"{mol_id}_{conf_ind}", rdmc_path, g16_path, n_procs, job_ram, level_of_theory, watchdog_rules)
+        if reason is not None:
+            print(f"{mol_id}_{conf_ind} aborted by watchdog: {reason}")
         shutil.copyfile(logfile, os.path.join(tmp_mol_dir, logfile))
         os.chdir(current_dir)
 
@@ -56,7 +91,7 @@ def semiempirical_opt(mol_id, charge, mult, xyz_FF_dict, xtb_path, rdmc_path, g1
         tar.add(os.path.join(tmp_mol_dir, logfile))
     tar.close()
 
-    shutil.copy(tar_file, os.path.join(suboutputs_dir, tar_file))
+    install_tar(tar_file, os.path.join(suboutputs_dir, tar_file))
     try:
         os.remove(os.path.join(subinputs_dir, f"{mol_id}.tmp"))
     except FileNotFoundError as e:
@@ -68,7 +103,7 @@ def semiempirical_opt(mol_id, charge, mult, xyz_FF_dict, xtb_path, rdmc_path, g1
 def xtb_status(folder, molid):
 
     try:
-        log = XtbLog(os.path.join(folder,'{}_freq.log'.format(molid)))
+        log = XtbLog(os.path.join(folder,'{}_freq.log'.format(molid)), fields=['wavenum'])
     except:
         raise RuntimeError(f'xtb log file not found for {molid}')
 
@@ -0,0 +1,262 @@
+import os
+import re
+import signal
+import subprocess
+import time
+
+import numpy as np
+from rdmc.mol import RDKitMol
+
+from radical_workflow.parser.connectivity import matches_reference
+from .log_parser import periodictable
+
+G16_FATAL_MESSAGES = {
+    "Convergence failure -- run terminated.": "scf convergence failure",
+    "Erroneous write": "erroneous write",
+    "galloc:  could not allocate memory": "memory allocation",
+    "The combination of multiplicity": "charge multiplicity",
+}
+
+ORCA_FATAL_MESSAGES = {
+    "Please increase MaxCore": "maxcore",
+    "ORCA finished by error termination in GTOInt": "GTOInt",
+    "ORCA finished by error termination in MDCI": "MDCI",
+    "ORCA finished by error termination in SCF": "SCF",
+    "Error : multiplicity": "charge multiplicity",
+    "The basis set was either not assigned or not available for this element": "basis set",
+}
+
+XTB_FATAL_MESSAGES = {
+    "abnormal termination": "abnormal termination",
+}
+
+COSMOTHERM_FATAL_MESSAGES = {
+    "License error": "license",
+    "Error: could not open file": "missing cosmo file",
+}
+
+WATCHDOG_FLAG = "Watchdog termination:"
+
+
+class WatchdogRule:
+    """
+    A rule applied to the text appended to a log while the job is running.
+    check returns a failure reason to abort the job, or None to keep going.
+    """
+    def reset(self):
+        pass
+
+    def check(self, new_text):
+        return None
+
+
+class FatalMessageRule(WatchdogRule):
+    def __init__(self, messages):
+        self.messages = messages
+
+    def check(self, new_text):
+        for message, reason in self.messages.items():
+            if message in new_text:
+                return reason
+        return None
+
+
+class StalledOutputRule(WatchdogRule):
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.reset()
+
+    def reset(self):
+        self.last_growth = time.time()
+
+    def check(self, new_text):
+        if new_text:
+            self.last_growth = time.time()
+            return None
+        if time.time() - self.last_growth > self.timeout:
+            return "stalled output"
+        return None
+
+
+class SCFOscillationRule(WatchdogRule):
+    """
+    Track the energy of each SCF cycle and abort when the last `window` cycles keep
+    flipping sign without the change dropping below `threshold` (Hartree).
+    Defaults match the #P cycle printout of Gaussian.
+    """
+    def __init__(self, energy_pattern=r"^\s*E=\s*(-?\d+\.\d+)\s+Delta-E=", reset_pattern=r"SCF Done", window=20, threshold=1e-5):
+        self.energy_pattern = re.compile(energy_pattern, re.MULTILINE)
+        self.reset_pattern = re.compile(reset_pattern)
+        self.window = window
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.energies = []
+        self.pending = ""
+
+    def check(self, new_text):
+        text = self.pending + new_text
+        # keep an unterminated last line for the next call
+        cut = text.rfind("\n") + 1
+        text, self.pending = text[:cut], text[cut:]
+        for line in text.splitlines():
+            if self.reset_pattern.search(line):
+                self.energies = []
+                continue
+            m = self.energy_pattern.search(line)
+            if m:
+                self.energies.append(float(m[1]))
+
+        if len(self.energies) < self.window:
+            return None
+        deltas = np.diff(self.energies[-self.window:])
+        sign_changes = np.sum(np.sign(deltas[1:]) != np.sign(deltas[:-1]))
+        if sign_changes >= 0.8 * (len(deltas) - 1) and np.min(np.abs(deltas)) > self.threshold:
+            return "scf oscillation"
+        return None
+
+
+class AdjacencyChangeRule(WatchdogRule):
+    """
+    Rebuild the molecule from every complete orientation block printed by Gaussian and
+    abort once `patience` consecutive geometries have a connectivity different from the
+    reference adjacency matrix.
+    """
+    def __init__(self, pre_adj, orientation="Input orientation:", patience=3):
+        self.pre_adj = pre_adj
+        self.orientation = orientation
+        self.patience = patience
+        self.reset()
+
+    def reset(self):
+        self.buffer = ""
+        self.n_changed = 0
+
+    def check(self, new_text):
+        self.buffer += new_text
+        reason = None
+        while True:
+            start = self.buffer.find(self.orientation)
+            if start < 0:
+                # the header could be split between two reads
+                self.buffer = self.buffer[-len(self.orientation):]
+                break
+            lines = self.buffer[start:].split("\n")
+            # header, 4 table heading lines, then atoms up to the closing dashes
+            end = None
+            for i, line in enumerate(lines[5:], start=5):
+                if "-------------------------------------------" in line:
+                    end = i
+                    break
+            if end is None:
+                self.buffer = self.buffer[start:]
+                break
+            symbols, coords = [], []
+            for line in lines[5:end]:
+                data = line.split()
+                symbols.append(periodictable[int(data[1])])
+                coords.append([float(data[3]), float(data[4]), float(data[5])])
+            self.buffer = "\n".join(lines[end + 1:])
+            if self.same_connectivity(symbols, coords):
+                self.n_changed = 0
+            else:
+                self.n_changed += 1
+            if self.n_changed >= self.patience:
+                reason = "adjacency matrix"
+        return reason
+
+    def same_connectivity(self, symbols, coords):
+        try:
+            return bool(matches_reference(self.pre_adj, symbols, coords))
+        except Exception:
+            return True
+
+
+def default_g16_rules(mol_smi=None, stall_timeout=3600):
+    rules = [FatalMessageRule(G16_FATAL_MESSAGES), SCFOscillationRule(), StalledOutputRule(stall_timeout)]
+    if mol_smi is not None:
+        pre_adj = RDKitMol.FromSmiles(mol_smi).GetAdjacencyMatrix()
+        rules.append(AdjacencyChangeRule(pre_adj))
+    return rules
+
+
+def default_orca_rules(stall_timeout=7200):
+    return [FatalMessageRule(ORCA_FATAL_MESSAGES), StalledOutputRule(stall_timeout)]
+
+
+def default_xtb_rules(stall_timeout=600):
+    return [FatalMessageRule(XTB_FATAL_MESSAGES), StalledOutputRule(stall_timeout)]
+
+
+def default_cosmotherm_rules(stall_timeout=600):
+    return [FatalMessageRule(COSMOTHERM_FATAL_MESSAGES), StalledOutputRule(stall_timeout)]
+
+
+def kill_process_group(proc, grace_period=30):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        proc.wait(timeout=grace_period)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+
+
+def run_with_watchdog(command, logfile, rules, stdout=None, stderr=None, poll_interval=10, env=None):
+    """
+    Run a shell command while tailing the log it writes. If any rule matches the newly
+    written text, the whole process group is killed and the failure reason is appended
+    to the log so that the job is classified without waiting for it to exit. The text
+    written between the last poll and the exit is checked too, and a match is appended
+    to the log of the finished job.
+    Returns (returncode, reason), with reason None if the watchdog did not fire.
+    """
+    for rule in rules:
+        rule.reset()
+
+    proc = subprocess.Popen(command, shell=True, stdout=stdout, stderr=stderr, env=env, start_new_session=True)
+    offset = 0
+    reason = None
+    while True:
+        finished = proc.poll() is not None
+        new_text = ""
+        if os.path.exists(logfile):
+            with open(logfile, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            offset += len(data)
+            new_text = data.decode("utf-8", errors="replace")
+        for rule in rules:
+            # a job that has exited did not stall
+            if finished and isinstance(rule, StalledOutputRule):
+                continue
+            reason = rule.check(new_text)
+            if reason is not None:
+                break
+        if reason is not None or finished:
+            break
+        time.sleep(poll_interval)
+
+    if reason is not None:
+        if not finished:
+            kill_process_group(proc)
+        with open(logfile, "a") as f:
+            f.write(f"\n {WATCHDOG_FLAG} {reason}\n")
+        print(f"Watchdog {'flagged' if finished else 'killed'} `{command}`: {reason}")
+
+    return proc.returncode, reason
+
+
+def run_command(command, logfile, out, watchdog_rules=None):
+    """Run a shell command the usual way, or under the watchdog if rules are given."""
+    if watchdog_rules:
+        _, reason = run_with_watchdog(command, logfile, watchdog_rules, stdout=out, stderr=out)
+        return reason
+    subprocess.run(command, shell=True, stdout=out, stderr=out)
+    return None
@@ -1,13 +1,15 @@
 from fileinput import filename
 import os
+import re
 import shutil
 import subprocess
 
 from rdkit import Chem
 from .file_parser import mol2xyz
+from .orca_runner import run_orca
 
 
-def dlpno_sp_calc(mol_id, orca_path, charge, mult, n_procs, job_ram, xyz_DFT_opt):
+def dlpno_sp_calc(mol_id, orca_path, charge, mult, n_procs, job_ram, xyz_DFT_opt, watchdog_rules=None):
     sdf = mol_id + '.sdf'
     mol_dir = os.getcwd()
 
@@ -33,11 +35,8 @@ def dlpno_sp_calc(mol_id, orca_path, charge, mult, n_procs, job_ram, xyz_DFT_opt
         f.write(script)
 
     #run jobs
-    orca_command = os.path.join(orca_path, "orca")
     logfile = mol_id + '.log'
-    outfile = mol_id + '.out'
-    with open(outfile, 'w') as out:
-        subprocess.run('{} {} > {}'.format(orca_command, infile, logfile), shell=True, stdout=out, stderr=out)
+    run_orca(infile, logfile, orca_path, watchdog_rules=watchdog_rules)
     
     # check for normal termination
     with open(logfile, "r") as f:
@@ -81,4 +80,101 @@ end
 """
     return script
 
-    
\ No newline at end of file
+def generate_dlpno_sp_batch_input(level_of_theory: str,
+                                  jobs: list,
+                                  memory_mb: int,
+                                  cpu_threads: int,
+                                  ) -> str:
+    """
+    Put several single points, given as (mol_id, xyz_str, charge, multiplicity), in one
+    ORCA input separated by $new_job. Each job gets its own %base so that it neither
+    overwrites nor restarts from the orbitals of the previous molecule.
+    """
+    scripts = []
+    for mol_id, xyz_str, charge, multiplicity in jobs:
+        script = generate_dlpno_sp_input(level_of_theory, xyz_str, charge, multiplicity, memory_mb, cpu_threads)
+        script = script.replace("\n%mdci", f"\n%base \"{mol_id}\"\n\n%mdci", 1)
+        scripts.append(script.strip() + "\n")
+    return "\n$new_job\n\n".join(scripts) + "\n\n"
+
+ORCA_BASE_PATTERN = re.compile(r'^%base "(.+)"\n\n', re.M)
+
+def split_orca_batch_input(script):
+    """
+    Split a batch made by generate_dlpno_sp_batch_input back into {mol_id: single point input},
+    the inputs generate_dlpno_sp_input makes for the same settings.
+    """
+    mol_id_to_script = dict()
+    for job in script.split("\n$new_job\n"):
+        base = ORCA_BASE_PATTERN.search(job)
+        if base is None:
+            continue
+        mol_id_to_script[base[1]] = (job[:base.start()] + job[base.end():]).strip() + "\n\n\n"
+    return mol_id_to_script
+
+ORCA_JOB_MARKER = re.compile(r'\$+\s+JOB NUMBER\s+(\d+)\s+\$+')
+ORCA_INPUT_ECHO = re.compile(r'^=+\n\s*INPUT FILE\s*\n', re.M)
+ORCA_NORMAL_TERMINATION = "****ORCA TERMINATED NORMALLY****"
+
+def split_orca_batch_log(logfile, mol_ids, save_dir):
+    """
+    Split the output of a $new_job batch into {mol_id}.log files in save_dir. The program
+    banner is kept in every log, but not the echo of the input, which holds every molecule
+    of the batch. Jobs that finished before the last started one are marked
+    as terminated normally, as ORCA only prints this once at the end of the run.
+    Returns the mol_ids for which a log was written.
+    """
+    with open(logfile) as f:
+        text = f.read()
+
+    markers = list(ORCA_JOB_MARKER.finditer(text))
+    if not markers:
+        starts = {1: 0}
+        header = ""
+    else:
+        starts = {int(m[1]): m.start() for m in markers}
+        if 1 in starts:
+            header = text[:markers[0].start()]
+            echo = ORCA_INPUT_ECHO.search(header)
+            if echo is not None:
+                header = header[:echo.start()]
+        else:
+            starts[1] = 0
+            header = ""
+    job_numbers = sorted(starts)
+    last_job = job_numbers[-1]
+
+    written = []
+    for i, job_number in enumerate(job_numbers):
+        if job_number > len(mol_ids):
+            break
+        end = starts[job_numbers[i + 1]] if i + 1 < len(job_numbers) else len(text)
+        section = header + text[starts[job_number]:end]
+        if job_number != last_job and "FINAL SINGLE POINT ENERGY" in section:
+            section += f"\n                             {ORCA_NORMAL_TERMINATION}\n"
+        mol_id = mol_ids[job_number - 1]
+        with open(os.path.join(save_dir, f"{mol_id}.log"), "w") as f:
+            f.write(section)
+        written.append(mol_id)
+    return written
+
+def count_heavy_atoms(xyz_str):
+    return sum(1 for line in xyz_str.strip().splitlines() if line.split() and line.split()[0] != "H")
+
+def select_dlpno_batches(mol_ids, mol_id_to_xyz, max_heavy_atoms, batch_size):
+    """
+    Molecules with at most max_heavy_atoms heavy atoms are grouped into batches of batch_size,
+    largest first so that a batch holds molecules of similar cost. The others run alone.
+    Returns (batches, singles).
+    """
+    small, singles = [], []
+    for mol_id in mol_ids:
+        n_heavy = count_heavy_atoms(mol_id_to_xyz[mol_id])
+        if n_heavy <= max_heavy_atoms:
+            small.append((n_heavy, mol_id))
+        else:
+            singles.append(mol_id)
+    small.sort(key=lambda x: x[0], reverse=True)
+    small = [mol_id for _, mol_id in small]
+    batches = [small[i:i + batch_size] for i in range(0, len(small), batch_size)]
+    return batches, singles
@@ -0,0 +1,143 @@
+import numpy as np
+
+# covalent radii (Angstrom) and maximum number of bonds of Open Babel, which perceives the bonds
+# of RDKitMol.FromXYZ
+COVALENT_RADII = {
+    "H": 0.31, "He": 0.28, "Li": 1.28, "Be": 0.96, "B": 0.84, "C": 0.76, "N": 0.71, "O": 0.66, "F": 0.57, "Ne": 0.58,
+    "Na": 1.66, "Mg": 1.41, "Al": 1.21, "Si": 1.11, "P": 1.07, "S": 1.05, "Cl": 1.02, "Ar": 1.06, "K": 2.03, "Ca": 1.76,
+    "Sc": 1.70, "Ti": 1.60, "V": 1.53, "Cr": 1.39, "Mn": 1.39, "Fe": 1.32, "Co": 1.26, "Ni": 1.24, "Cu": 1.32, "Zn": 1.22,
+    "Ga": 1.22, "Ge": 1.20, "As": 1.19, "Se": 1.20, "Br": 1.20, "Kr": 1.16, "Rb": 2.20, "Sr": 1.95, "Y": 1.90, "Zr": 1.75,
+    "Nb": 1.64, "Mo": 1.54, "Tc": 1.47, "Ru": 1.46, "Rh": 1.42, "Pd": 1.39, "Ag": 1.45, "Cd": 1.44, "In": 1.42, "Sn": 1.39,
+    "Sb": 1.39, "Te": 1.38, "I": 1.39, "Xe": 1.40,
+}
+MAX_BONDS = {
+    "H": 1, "He": 0, "Li": 1, "Be": 2, "B": 4, "C": 4, "N": 4, "O": 2, "F": 1, "Ne": 0,
+    "Na": 1, "Mg": 2, "Al": 6, "Si": 6, "P": 6, "S": 6, "Cl": 1, "Ar": 0, "K": 1, "Ca": 2,
+    "Sc": 6, "Ti": 6, "V": 6, "Cr": 6, "Mn": 8, "Fe": 6, "Co": 6, "Ni": 6, "Cu": 6, "Zn": 6,
+    "Ga": 3, "Ge": 4, "As": 3, "Se": 2, "Br": 1, "Kr": 0, "Rb": 1, "Sr": 2, "Y": 6, "Zr": 6,
+    "Nb": 6, "Mo": 6, "Tc": 6, "Ru": 6, "Rh": 6, "Pd": 6, "Ag": 6, "Cd": 6, "In": 3, "Sn": 4,
+    "Sb": 3, "Te": 2, "I": 1, "Xe": 0,
+}
+DEFAULT_MAX_BONDS = 6
+# atoms are bonded if their distance is between MIN_BOND_LENGTH and the sum of their radii plus BOND_TOLERANCE
+BOND_TOLERANCE = 0.45
+MIN_BOND_LENGTH = 0.4
+# bonds of an atom closer than this angle are not both kept
+MIN_BOND_ANGLE = 45.0
+# geometries per chunk in the bond angle check, which takes n_atoms^3 memory per geometry
+ANGLE_CHECK_SIZE = 2 * 10**7
+
+
+def small_bond_angles(adj, coords):
+    """(n_geoms, n_atoms) bool, True for atoms with two bonds closer than MIN_BOND_ANGLE."""
+    n_geoms, n_atoms = adj.shape[:2]
+    flagged = np.zeros((n_geoms, n_atoms), dtype=bool)
+    cos_min = np.cos(np.radians(MIN_BOND_ANGLE))
+    chunk = max(1, ANGLE_CHECK_SIZE // max(1, n_atoms**3))
+    for start in range(0, n_geoms, chunk):
+        a = adj[start:start + chunk]
+        vec = coords[start:start + chunk, None, :, :] - coords[start:start + chunk, :, None, :]
+        unit = vec / np.maximum(np.linalg.norm(vec, axis=-1, keepdims=True), 1e-12)
+        cos = np.einsum("gijx,gikx->gijk", unit, unit)
+        pairs = a[:, :, :, None] & a[:, :, None, :] & ~np.eye(n_atoms, dtype=bool)
+        flagged[start:start + chunk] = ((cos > cos_min) & pairs).any(axis=(2, 3))
+    return flagged
+
+
+def smallest_bond_angle(neighbors, coords, i):
+    """Smallest angle (degrees) between two bonds of atom i, 360 with less than two bonds."""
+    if len(neighbors) < 2:
+        return 360.0
+    vec = coords[neighbors] - coords[i]
+    unit = vec / np.maximum(np.linalg.norm(vec, axis=-1, keepdims=True), 1e-12)
+    cos = np.clip(unit @ unit.T, -1.0, 1.0)[np.triu_indices(len(neighbors), 1)]
+    return np.degrees(np.arccos(cos.max()))
+
+
+def connect_the_dots(symbols, coords, candidates, max_bonds):
+    """
+    Bonds of one geometry as Open Babel's ConnectTheDots makes them from the candidate pairs
+    within the cutoff: bonds are added in order of increasing z, a P with five bonds only takes
+    F or Cl as a sixth, and then atom by atom, while an atom has more bonds than allowed or two
+    bonds closer than MIN_BOND_ANGLE, an H first loses a bond to another H, otherwise the
+    longest bond is deleted, the first added on a tie.
+    """
+    n_atoms = len(symbols)
+    dist = np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=-1)
+    # neighbors of each atom in the order the bonds were added
+    bonds = [[] for _ in range(n_atoms)]
+
+    def valid_additional_bond(a, b):
+        return not (symbols[a] == "P" and len(bonds[a]) == 5) or symbols[b] in ("F", "Cl")
+
+    order = np.argsort(coords[:, 2], kind="stable")
+    for pos, i in enumerate(order):
+        for j in order[pos + 1:]:
+            if candidates[i, j] and valid_additional_bond(i, j) and valid_additional_bond(j, i):
+                bonds[i].append(j)
+                bonds[j].append(i)
+
+    for i in range(n_atoms):
+        while bonds[i] and (len(bonds[i]) > max_bonds[i] or smallest_bond_angle(bonds[i], coords, i) < MIN_BOND_ANGLE):
+            j = None
+            if symbols[i] == "H":
+                j = next((k for k in bonds[i] if symbols[k] == "H"), None)
+            if j is None:
+                j = bonds[i][0]
+                for k in bonds[i][1:]:
+                    if dist[i, k] > dist[i, j]:
+                        j = k
+            bonds[i].remove(j)
+            bonds[j].remove(i)
+
+    adj = np.zeros((n_atoms, n_atoms), dtype=bool)
+    for i, neighbors in enumerate(bonds):
+        adj[i, neighbors] = True
+    return adj
+
+
+def perceive_adjacency(symbols, coords):
+    """
+    Adjacency matrices of geometries of one species from covalent radii, with the tolerance
+    of Open Babel. coords is (n_atoms, 3) or a batch (n_geoms, n_atoms, 3); the result is an
+    int array of shape (n_atoms, n_atoms) or (n_geoms, n_atoms, n_atoms), like GetAdjacencyMatrix.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    single = coords.ndim == 2
+    if single:
+        coords = coords[None]
+    radii = np.array([COVALENT_RADII[symbol] for symbol in symbols])
+    max_bonds = np.array([MAX_BONDS.get(symbol, DEFAULT_MAX_BONDS) for symbol in symbols])
+
+    d2 = np.sum((coords[:, :, None, :] - coords[:, None, :, :]) ** 2, axis=-1)
+    cutoff = (radii[:, None] + radii[None, :] + BOND_TOLERANCE) ** 2
+    adj = (d2 <= cutoff) & (d2 >= MIN_BOND_LENGTH ** 2)
+
+    # only the geometries with an over-bonded atom, a too small bond angle or a P with more
+    # than five candidate bonds depend on the order of the bonds, they are redone one by one
+    is_P = np.array([symbol == "P" for symbol in symbols])
+    degree = adj.sum(axis=-1)
+    flagged = (degree > max_bonds).any(axis=-1) | (is_P & (degree > 5)).any(axis=-1) | small_bond_angles(adj, coords).any(axis=-1)
+    for g in np.flatnonzero(flagged):
+        adj[g] = connect_the_dots(symbols, coords[g], adj[g], max_bonds)
+
+    adj = adj.astype(np.int32)
+    return adj[0] if single else adj
+
+
+def matches_reference(ref_adj, symbols, coords):
+    """
+    Whether the perceived connectivity equals ref_adj, e.g. the adjacency matrix of the smiles
+    of the species: one bool for a geometry, or a bool array for a batch of geometries.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if coords.shape[-2] != len(ref_adj):
+        return False if coords.ndim == 2 else np.zeros(len(coords), dtype=bool)
+    adj = perceive_adjacency(symbols, coords)
+    return (adj == ref_adj).all(axis=(-2, -1))
+
+
+def xyz_str_to_arrays(xyz):
+    """(symbols, (n_atoms, 3) coordinates) of an xyz string without header, as made by make_xyz_str."""
+    rows = [line.split() for line in xyz.splitlines() if line.strip()]
+    return [row[0] for row in rows], np.array([row[1:4] for row in rows], dtype=np.float64).reshape(-1, 3)
@@ -1,37 +1,39 @@
 import os
-import tarfile
 
-def read_cosmo_tab_result_from_tar(f):
+from .tar_archive import IndexedTarFile
+
+def read_cosmo_tab_lines(lines):
     """
-    Modified from Yunsie's code
+    Modified from Yunsie's code. Read the lines (str) of a COSMOtherm .tab file into
+    [solvent_name, solute_name, temp, H (bar), ln(gamma), pv (bar), Gsolv (kcal/mol), None]
+    lists, one per temperature, with the values as strings.
     """
     each_data_list = []
-    # initialize everything
-    solvent_name, solute_name, temp = None, None, None
-    result_values = None
-    line = f.readline()
-    while line:
+    temp = None
+    lines = iter(lines)
+    for line in lines:
         # get the temperature and mole fraction
-        if b"Settings  job" in line:
-            temp = line.split(b'T=')[1].split(b'K')[0].strip().decode('utf-8')  # temp in K
+        if "Settings  job" in line:
+            temp = line.split('T=')[1].split('K')[0].strip()  # temp in K
 
         # get the result values
-        if b"Nr Compound" in line:
-            line = f.readline()
-            solvent_name = line.split()[1].decode('utf-8')
-            line = f.readline()
-            solute_name = line.split()[1].decode('utf-8')
+        if "Nr Compound" in line:
+            solvent_name = next(lines).split()[1]
+            line = next(lines)
+            solute_name = line.split()[1]
             result_values = line.split()[2:6]  # H (in bar), ln(gamma), pv (vapor pressure in bar), Gsolv (kcal/mol)
-            result_values = [result_value.decode('utf-8') for result_value in result_values]
-            # save the result as one list
-            each_data_list.append(
-                [solvent_name, None, solute_name, None, temp] + result_values + [None])
-            # initialize everything
-            solvent_name, solute_name, temp = None, None, None
-            result_values = None
-        line = f.readline()
+            each_data_list.append([solvent_name, solute_name, temp] + result_values + [None])
+            temp = None
     return each_data_list
 
+def read_cosmo_tab_result_from_tar(f):
+    """
+    Read a .tab file opened from a tar into
+    [solvent_name, None, solute_name, None, temp, H, ln(gamma), pv, Gsolv, None] lists.
+    """
+    return [[solvent_name, None, solute_name, None, temp] + values
+            for solvent_name, solute_name, temp, *values in read_cosmo_tab_lines(f.read().decode('utf-8').splitlines())]
+
 def get_dHsolv_value(each_data_list):
     # compute solvation enthalpy
     dGsolv_temp_dict = {}
@@ -54,7 +56,7 @@ def cosmo_parser(mol_id, tar_file_path=None, solvent_name=None):
         tar_file_path = os.path.join("output", "COSMO_calc", "outputs", f"outputs_{ids}", f"{mol_id}.tar")
     if os.path.isfile(tar_file_path):
         each_data_lists = []
-        tar = tarfile.open(tar_file_path)
+        tar = IndexedTarFile(tar_file_path)
         for member in tar:
             if ".tab" in member.name:
                 if solvent_name is not None:
@@ -0,0 +1,174 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from .cosmo_parser import read_cosmo_tab_result_from_tar
+from .tar_archive import IndexedTarFile
+
+COSMO_PROPS = ['H (bar)', 'ln(gamma)', 'Pvap (bar)', 'Gsolv (kcal/mol)']
+INDEX_FILE = "index.json"
+VALUES_FILE = "values.npy"
+DHSOLV_FILE = "dHsolv.npy"
+# bump when read_cosmo_tar_values returns something else for the same tar, to invalidate parse caches
+COSMO_PARSER_VERSION = 1
+
+
+def read_cosmo_tar_values(mol_id, solvent_to_index, temp_to_index, dtype=np.float32, tar_file_path=None):
+    """
+    Read the .tab files in the COSMO tar of mol_id into an array of shape
+    (n_solvents, n_temps, n_props), NaN where a value is missing. Returns None if there is no tar.
+    Raises a ValueError for a temperature that is not in temp_to_index.
+    """
+    if tar_file_path is None:
+        ids = str(int(int(mol_id.split("id")[1])/1000))
+        tar_file_path = os.path.join("output", "COSMO_calc", "outputs", f"outputs_{ids}", f"{mol_id}.tar")
+    if not os.path.isfile(tar_file_path):
+        return None
+
+    values = np.full((len(solvent_to_index), len(temp_to_index), len(COSMO_PROPS)), np.nan, dtype=dtype)
+    with IndexedTarFile(tar_file_path) as tar:
+        for member in tar:
+            if ".tab" not in member.name:
+                continue
+            f = tar.extractfile(member)
+            for each_data in read_cosmo_tab_result_from_tar(f):
+                solvent_ind = solvent_to_index.get(each_data[0])
+                temp_ind = temp_to_index.get(each_data[4])
+                if temp_ind is None:
+                    raise ValueError(f"{member.name} in {tar_file_path} has T = {each_data[4]} K, the store has {' '.join(temp_to_index)} K")
+                if solvent_ind is None:
+                    continue
+                values[solvent_ind, temp_ind] = [float(value) for value in each_data[5:9]]
+    return values
+
+
+def read_cosmo_tar_temperatures(tar_file_path):
+    """Temperatures (str, K) of the first .tab file in a COSMO tar, in increasing order."""
+    with IndexedTarFile(tar_file_path) as tar:
+        for member in tar:
+            if ".tab" in member.name:
+                temps = {each_data[4] for each_data in read_cosmo_tab_result_from_tar(tar.extractfile(member))}
+                return sorted(temps, key=float)
+    return []
+
+
+def compute_dHsolv(Gsolv, temps):
+    """
+    dHsolv = dGsolv - T d(dGsolv)/dT with the central difference over the temperature axis (last
+    axis of Gsolv). NaN at temperatures without a neighbour 1 K below and above.
+    """
+    temps = np.asarray(temps, dtype=np.float64)
+    Gsolv = np.asarray(Gsolv, dtype=np.float64)
+    dHsolv = np.full(Gsolv.shape, np.nan)
+    for t, T in enumerate(temps):
+        lower = np.flatnonzero(np.isclose(temps, T - 1))
+        upper = np.flatnonzero(np.isclose(temps, T + 1))
+        if len(lower) and len(upper):
+            dSsolv = - (Gsolv[..., upper[0]] - Gsolv[..., lower[0]]) / 2
+            dHsolv[..., t] = Gsolv[..., t] + T * dSsolv
+    return dHsolv
+
+
+def create_cosmo_store(store_dir, solute_names, solute_smiles, solvent_names, solvent_smiles, temps, dtype=np.float32):
+    """
+    Create an empty store for COSMO results: index.json with the solute, solvent and temperature
+    axes, and values.npy of shape (n_solutes, n_solvents, n_temps, n_props) filled with NaN.
+    Returns the values array as a writable memmap.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    index = dict(solute_names=list(solute_names), solute_smiles=list(solute_smiles),
+                 solvent_names=list(solvent_names), solvent_smiles=list(solvent_smiles),
+                 temps=[str(temp) for temp in temps], props=COSMO_PROPS)
+    with open(os.path.join(store_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+
+    values = np.lib.format.open_memmap(os.path.join(store_dir, VALUES_FILE), mode="w+", dtype=dtype,
+                                       shape=(len(index["solute_names"]), len(index["solvent_names"]), len(index["temps"]), len(COSMO_PROPS)))
+    values[:] = np.nan
+    return values
+
+
+def write_cosmo_store_dHsolv(store_dir, chunk_size=10000):
+    """Compute dHsolv for the whole store chunk by chunk and save it as dHsolv.npy."""
+    with open(os.path.join(store_dir, INDEX_FILE)) as f:
+        temps = [float(temp) for temp in json.load(f)["temps"]]
+    values = np.load(os.path.join(store_dir, VALUES_FILE), mmap_mode="r")
+    dHsolv = np.lib.format.open_memmap(os.path.join(store_dir, DHSOLV_FILE), mode="w+", dtype=values.dtype, shape=values.shape[:3])
+    Gsolv_ind = COSMO_PROPS.index('Gsolv (kcal/mol)')
+    for start in range(0, values.shape[0], chunk_size):
+        dHsolv[start:start + chunk_size] = compute_dHsolv(values[start:start + chunk_size, :, :, Gsolv_ind], temps)
+    dHsolv.flush()
+
+
+class CosmoStore:
+    """
+    Read access to a store written by create_cosmo_store. The arrays are memory mapped, so only
+    the slices that are used are read from disk.
+    """
+    def __init__(self, store_dir, mmap_mode="r"):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.solute_names = index["solute_names"]
+        self.solute_smiles = index["solute_smiles"]
+        self.solvent_names = index["solvent_names"]
+        self.solvent_smiles = index["solvent_smiles"]
+        self.temps = index["temps"]
+        self.props = index["props"]
+        self.solute_to_index = {name: ind for ind, name in enumerate(self.solute_names)}
+        self.solvent_to_index = {name: ind for ind, name in enumerate(self.solvent_names)}
+        self.temp_to_index = {temp: ind for ind, temp in enumerate(self.temps)}
+
+        self.values = np.load(os.path.join(store_dir, VALUES_FILE), mmap_mode=mmap_mode)
+        dHsolv_path = os.path.join(store_dir, DHSOLV_FILE)
+        self.dHsolv = np.load(dHsolv_path, mmap_mode=mmap_mode) if os.path.exists(dHsolv_path) else None
+
+    def indices(self, solutes=None, solvents=None, temps=None):
+        solute_inds = slice(None) if solutes is None else [self.solute_to_index[solute] for solute in solutes]
+        solvent_inds = slice(None) if solvents is None else [self.solvent_to_index[solvent] for solvent in solvents]
+        temp_inds = slice(None) if temps is None else [self.temp_to_index[str(temp)] for temp in temps]
+        return solute_inds, solvent_inds, temp_inds
+
+    def get(self, prop, solutes=None, solvents=None, temps=None):
+        """Return the (solutes, solvents, temps) array of prop, one of self.props or 'Hsolv (kcal/mol)'."""
+        solute_inds, solvent_inds, temp_inds = self.indices(solutes, solvents, temps)
+        if prop == 'Hsolv (kcal/mol)':
+            if self.dHsolv is not None:
+                array = self.dHsolv
+            else:
+                Gsolv = np.asarray(self.values[solute_inds])[..., self.props.index('Gsolv (kcal/mol)')]
+                return compute_dHsolv(Gsolv, [float(temp) for temp in self.temps])[:, solvent_inds][:, :, temp_inds]
+        else:
+            array = self.values[..., self.props.index(prop)]
+        # index one axis at a time, so that lists on several axes select the outer product
+        return np.asarray(array[solute_inds])[:, solvent_inds][:, :, temp_inds]
+
+    def to_dataframe(self, solutes=None, solvents=None, temps=None, dropna=True):
+        """
+        Long table in the layout of the old process_cosmo_result_parallel.py pickle, with
+        categorical name and smiles columns, for the selected solutes, solvents and temperatures.
+        """
+        solutes = self.solute_names if solutes is None else list(solutes)
+        solvents = self.solvent_names if solvents is None else list(solvents)
+        temps = self.temps if temps is None else [str(temp) for temp in temps]
+        shape = (len(solutes), len(solvents), len(temps))
+
+        solute_codes, solvent_codes, temp_codes = np.indices(shape).reshape(3, -1)
+        solute_inds = np.array([self.solute_to_index[solute] for solute in solutes])[solute_codes]
+        solvent_inds = np.array([self.solvent_to_index[solvent] for solvent in solvents])[solvent_codes]
+
+        columns = {
+            'solvent_name': pd.Categorical.from_codes(solvent_inds, self.solvent_names),
+            'solvent_smiles': pd.Categorical(np.array(self.solvent_smiles, dtype=object)[solvent_inds]),
+            'solute_name': pd.Categorical.from_codes(solute_inds, self.solute_names),
+            'solute_smiles': np.array(self.solute_smiles, dtype=object)[solute_inds],
+            'temp (K)': pd.Categorical.from_codes(temp_codes, temps),
+        }
+        for prop in self.props + ['Hsolv (kcal/mol)']:
+            columns[prop] = self.get(prop, solutes, solvents, temps).reshape(-1)
+        df = pd.DataFrame(columns)
+        if dropna:
+            df = df[df['Gsolv (kcal/mol)'].notna()].reset_index(drop=True)
+        return df
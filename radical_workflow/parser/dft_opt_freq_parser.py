@@ -6,9 +6,13 @@ import re
 import numpy as np
 
 from rdmc.mol import RDKitMol
-from rdmc.external.gaussian import GaussianLog
 
 from .utils import make_xyz_str
+from .connectivity import matches_reference, xyz_str_to_arrays
+from .log_blocks import mapped_log, count_blocks, find_orientation_blocks, read_orientation_block, read_frequencies, rows_to_array
+
+# bump when dft_opt_freq_parser returns something else for the same log, to invalidate parse caches
+DFT_OPT_FREQ_PARSER_VERSION = 2
 
 periodictable = ["", "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar",
              "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br",
@@ -97,6 +101,21 @@ def load_geometry(self, periodictable=periodictable, initial=False, input_geom=F
     else:
         orientation = 'Input orientation:'
 
+    if not input_geom:
+        # only the first or the last table is converted, the others are just counted
+        with mapped_log(self) as buf:
+            header = orientation.encode()
+            n_blocks = count_blocks(buf, header)
+            if n_blocks:
+                bounds = find_orientation_blocks(buf, header, "first" if initial else "last")
+                if bounds is None:
+                    raise ValueError(f'{orientation} table not terminated')
+                number, coord = read_orientation_block(buf, bounds)
+                coord = coord.tolist()
+                step = 0 if initial else n_blocks - 1
+        symbol = [periodictable[x] for x in number]
+        return make_xyz_str(symbol, coord), step
+
     with open(self, 'r') as f:
         line = f.readline()
         while line != '':
@@ -128,10 +147,6 @@ def load_geometry(self, periodictable=periodictable, initial=False, input_geom=F
             if coord and initial:
                 break
 
-    number = np.array(number)
-    if not input_geom:
-        symbol = [periodictable[x] for x in number]
-
     xyz_str = make_xyz_str(symbol, coord)
     return xyz_str, step
 
@@ -144,19 +159,9 @@ def load_freq(self):
     Return the frequencies
     calculation in cm^-1.
     """
-    frequencies = []
-    with open(self, 'r') as f:
-        line = f.readline()
-        while line != '':
-            # Read vibrational frequencies
-            if 'Frequencies --' in line:
-                frequencies.extend(line.split()[2:])
-            line = f.readline()
-
-    frequencies = [float(freq) for freq in frequencies]
-    frequencies.sort()
-    
-    return frequencies
+    with mapped_log(self) as buf:
+        frequencies = read_frequencies(buf)
+    return np.sort(frequencies).tolist()
 
 
 # In[63]:
@@ -258,6 +263,169 @@ def load_energies(self, zpe_scale_factor):
     energy['gibbs'] = load_gibbs(self)
     return energy
 
+ORIENTATION_SEPARATOR = '---------------------------------------------------------------------'
+
+# plain alternation of the lines read_dft_opt_freq_log looks at, one search per line
+DFT_LOG_TRIGGER_RE = re.compile(r"Standard orientation:|Input orientation:|Symbolic Z-matrix:|Frequencies --|SCF Done:|"
+                                r"Sum of electronic and thermal Free Energies=|Job cpu time|Elapsed time|1\\1\\GINC|1\|1\|GINC")
+
+
+def read_dft_opt_freq_log(g16_log):
+    """
+    Read a g16 opt/freq log once and keep what dft_opt_freq_parser needs: the first and last
+    standard and input orientation blocks, the number of standard orientations, the input
+    Z-matrix, the frequency lines, the last SCF Done, the first Gibbs free energy, cpu and wall
+    time lines, and the archive blocks with the whitespace removed, which hold the ZPE.
+    """
+    log_data = dict(last_line='', n_std=0, n_input=0, frequencies=[], e0=None, gibbs=None, cpu=None, wall=None, archive=[], zmat=None)
+    for orientation in ['std', 'input']:
+        log_data[f'{orientation}_first'] = log_data[f'{orientation}_last'] = None
+        log_data[f'{orientation}_truncated'] = False
+
+    block, block_kind, block_skip = None, None, 0
+    in_archive = False
+    with open(g16_log) as f:
+        for line in f:
+            log_data['last_line'] = line
+
+            if block is not None:
+                if block_skip:
+                    block_skip -= 1
+                    continue
+                if block_kind == 'zmat':
+                    if line.strip() == '':
+                        log_data['zmat'] = block
+                        block = None
+                    else:
+                        block.append(line)
+                    continue
+                if ORIENTATION_SEPARATOR in line:
+                    if log_data[f'{block_kind}_first'] is None:
+                        log_data[f'{block_kind}_first'] = block
+                    log_data[f'{block_kind}_last'] = block
+                    block = None
+                else:
+                    block.append(line)
+                continue
+
+            if in_archive:
+                log_data['archive'].append(line.replace('\n', '').replace(' ', ''))
+                if '@' in line:
+                    in_archive = False
+                continue
+
+            if DFT_LOG_TRIGGER_RE.search(line) is None:
+                continue
+
+            if 'Standard orientation:' in line:
+                log_data['n_std'] += 1
+                block, block_kind, block_skip = [], 'std', 4
+            elif 'Input orientation:' in line:
+                log_data['n_input'] += 1
+                block, block_kind, block_skip = [], 'input', 4
+            elif 'Symbolic Z-matrix:' in line:
+                if log_data['zmat'] is None:
+                    block, block_kind, block_skip = [], 'zmat', 1
+            elif 'Frequencies --' in line:
+                log_data['frequencies'].extend(line.split()[2:])
+            elif 'SCF Done:' in line:
+                log_data['e0'] = line
+            elif 'Sum of electronic and thermal Free Energies=' in line:
+                if log_data['gibbs'] is None:
+                    log_data['gibbs'] = line
+            elif 'Job cpu time' in line:
+                if log_data['cpu'] is None:
+                    log_data['cpu'] = line
+            elif 'Elapsed time' in line:
+                if log_data['wall'] is None:
+                    log_data['wall'] = line
+            else:
+                log_data['archive'].append(line.replace('\n', '').replace(' ', ''))
+                in_archive = '@' not in line
+
+    if block is not None:
+        if block_kind == 'zmat':
+            log_data['zmat'] = block
+        else:
+            log_data[f'{block_kind}_truncated'] = True
+    return log_data
+
+
+def make_orientation_xyz(rows, periodictable=periodictable):
+    table = rows_to_array(rows or [], 6)
+    symbol = [periodictable[x] for x in table[:, 1].astype(int)]
+    return make_xyz_str(symbol, table[:, 3:6].tolist())
+
+
+def get_log_geometry(log_data, initial=False, input_geom=False, standard_orientation=True):
+    """Same as load_geometry, from the output of read_dft_opt_freq_log."""
+    orientation = 'std' if standard_orientation else 'input'
+    if input_geom and log_data['zmat'] is not None:
+        symbol, coord = [], []
+        for row in log_data['zmat']:
+            data = row.split()
+            symbol.append(data[0])
+            coord.append([float(data[1]), float(data[2]), float(data[3])])
+        return make_xyz_str(symbol, coord), -1
+
+    if initial and log_data[f'{orientation}_first'] is not None:
+        rows, step = log_data[f'{orientation}_first'], 0
+    elif log_data[f'{orientation}_truncated']:
+        raise ValueError(f'{orientation} orientation block not terminated')
+    else:
+        rows, step = log_data[f'{orientation}_last'], log_data[f'n_{orientation}'] - 1
+    if input_geom:
+        # no Z-matrix, load_geometry returns an empty xyz
+        return make_xyz_str([], []), step
+    return make_orientation_xyz(rows), step
+
+
+def get_log_freq(log_data):
+    return np.sort(np.array(log_data['frequencies'], dtype=np.float64)).tolist()
+
+
+def get_log_zpe(log_data, g16_log):
+    m = re.findall('ZeroPoint=(-*\d+.\d+)', ''.join(log_data['archive']))
+    if m:
+        return float(m[0])
+    # archive not recognized, search the whole file as before
+    return load_zpe(g16_log)
+
+
+def get_log_energies(log_data, g16_log, zpe_scale_factor):
+    """Same as load_energies, from the output of read_dft_opt_freq_log."""
+    energy = dict()
+
+    e0 = float(log_data['e0'].split()[4])
+    zpe = get_log_zpe(log_data, g16_log)
+
+    energy['scf'] = e0
+    energy['zpe_scale_factor'] = zpe_scale_factor
+    energy['zpe_unscaled'] = zpe
+
+    composite = process_energy(e0, zpe, zpe_scale_factor)
+
+    energy['zpe_scaled'] = composite[0]
+    energy['scf_zpe_unscaled'] = composite[2]
+    energy['scf_zpe_scaled'] = composite[3]
+
+    energy['gibbs'] = float(log_data['gibbs'].split()[-1])
+    return energy
+
+
+def get_log_geometry_fields(log_data):
+    fields = dict()
+    fields['dft_xyz_std_ori'] = get_log_geometry(log_data, standard_orientation=True)[0]
+    fields['dft_initial_xyz_std_ori'] = get_log_geometry(log_data, initial=True, standard_orientation=True)[0]
+    fields['dft_xyz_input_ori'] = get_log_geometry(log_data, standard_orientation=False)[0]
+    fields['dft_initial_xyz_input_ori'] = get_log_geometry(log_data, initial=True, standard_orientation=False)[0]
+    fields['dft_input_xyz'] = get_log_geometry(log_data, input_geom=True)[0]
+    fields['dft_steps'] = get_log_geometry(log_data)[1]
+    fields['dft_cpu'] = get_cpu([log_data['cpu']] if log_data['cpu'] is not None else [])
+    fields['dft_wall'] = get_wall([log_data['wall']] if log_data['wall'] is not None else [])
+    return fields
+
+
 def dft_opt_freq_parser(mol_id, mol_smi, g16_log=None, parse_data=True):
 
     failed_job = dict()
@@ -276,19 +444,18 @@ def dft_opt_freq_parser(mol_id, mol_smi, g16_log=None, parse_data=True):
 
         pre_adj = RDKitMol.FromSmiles(mol_smi).GetAdjacencyMatrix()
 
-        glog = GaussianLog(g16_log)
-        post_adj = glog.get_mol(refid=glog.num_all_geoms-1,  # The last geometry in the job
-                                converged=False,
-                                sanitize=False,
-                                backend='openbabel').GetAdjacencyMatrix()
+        # everything below is taken from this one read of the log
+        log_data = read_dft_opt_freq_log(g16_log)
 
-        if not (pre_adj == post_adj).all():
+        # the last geometry in the job, in input orientation if it is printed
+        last_xyz = get_log_geometry(log_data, standard_orientation=log_data['input_last'] is None)[0]
+        if not matches_reference(pre_adj, *xyz_str_to_arrays(last_xyz)):
             failed_job[mol_id] = dict()
             failed_job[mol_id]['mol_smi'] = mol_smi
             failed_job[mol_id]['reason'] = 'adjacency matrix'
             return failed_job, valid_job 
 
-        job_stat = check_job_status(read_log_file(g16_log))
+        job_stat = check_job_status([log_data['last_line'].strip()])
 
         if not job_stat:
             try:
@@ -296,36 +463,22 @@ def dft_opt_freq_parser(mol_id, mol_smi, g16_log=None, parse_data=True):
                 failed_job[mol_id]['reason'] = 'error termination'
                 failed_job[mol_id]['mol_smi'] = mol_smi
                 if parse_data:
-                    failed_job[mol_id]['dft_xyz_std_ori'] = load_geometry(g16_log, standard_orientation=True)[0]
-                    failed_job[mol_id]['dft_initial_xyz_std_ori'] = load_geometry(g16_log, initial=True, standard_orientation=True)[0]
-                    failed_job[mol_id]['dft_xyz_input_ori'] = load_geometry(g16_log, standard_orientation=False)[0]
-                    failed_job[mol_id]['dft_initial_xyz_input_ori'] = load_geometry(g16_log, initial=True, standard_orientation=False)[0]
-                    failed_job[mol_id]['dft_input_xyz'] = load_geometry(g16_log, input_geom=True)[0]
-                    failed_job[mol_id]['dft_steps'] = load_geometry(g16_log)[1]
-                    failed_job[mol_id]['dft_cpu'] = get_cpu(read_log_file(g16_log))
-                    failed_job[mol_id]['dft_wall'] = get_wall(read_log_file(g16_log))
+                    failed_job[mol_id].update(get_log_geometry_fields(log_data))
             except:
                 failed_job[mol_id] = dict()
                 failed_job[mol_id]['mol_smi'] = mol_smi
                 failed_job[mol_id]['reason'] = 'parser1'
             return failed_job, valid_job
 
-        if not check_freq(g16_log):
+        if not check_neg_freq(get_log_freq(log_data)):
             try:
                 failed_job[mol_id] = dict()
                 failed_job[mol_id]['mol_smi'] = mol_smi
                 failed_job[mol_id]['reason'] = 'freq'
                 if parse_data:
-                    failed_job[mol_id]['dft_freq'] = load_freq(g16_log)
-                    failed_job[mol_id]['dft_freq_neg'] = not check_neg_freq(load_freq(g16_log))
-                    failed_job[mol_id]['dft_xyz_std_ori'] = load_geometry(g16_log, standard_orientation=True)[0]
-                    failed_job[mol_id]['dft_initial_xyz_std_ori'] = load_geometry(g16_log, initial=True, standard_orientation=True)[0]
-                    failed_job[mol_id]['dft_xyz_input_ori'] = load_geometry(g16_log, standard_orientation=False)[0]
-                    failed_job[mol_id]['dft_initial_xyz_input_ori'] = load_geometry(g16_log, initial=True, standard_orientation=False)[0]
-                    failed_job[mol_id]['dft_input_xyz'] = load_geometry(g16_log, input_geom=True)[0]
-                    failed_job[mol_id]['dft_steps'] = load_geometry(g16_log)[1]
-                    failed_job[mol_id]['dft_cpu'] = get_cpu(read_log_file(g16_log))
-                    failed_job[mol_id]['dft_wall'] = get_wall(read_log_file(g16_log))
+                    failed_job[mol_id]['dft_freq'] = get_log_freq(log_data)
+                    failed_job[mol_id]['dft_freq_neg'] = not check_neg_freq(get_log_freq(log_data))
+                    failed_job[mol_id].update(get_log_geometry_fields(log_data))
             except:
                 failed_job[mol_id] = dict()
                 failed_job[mol_id]['mol_smi'] = mol_smi
@@ -337,17 +490,10 @@ def dft_opt_freq_parser(mol_id, mol_smi, g16_log=None, parse_data=True):
             valid_job[mol_id] = dict()
             valid_job[mol_id]['mol_smi'] = mol_smi
             if parse_data:
-                valid_job[mol_id]['dft_freq'] = load_freq(g16_log)
-                valid_job[mol_id]['dft_freq_neg'] = not check_neg_freq(load_freq(g16_log))
-                valid_job[mol_id]['dft_xyz_std_ori'] = load_geometry(g16_log, standard_orientation=True)[0]
-                valid_job[mol_id]['dft_initial_xyz_std_ori'] = load_geometry(g16_log, initial=True, standard_orientation=True)[0]
-                valid_job[mol_id]['dft_xyz_input_ori'] = load_geometry(g16_log, standard_orientation=False)[0]
-                valid_job[mol_id]['dft_initial_xyz_input_ori'] = load_geometry(g16_log, initial=True, standard_orientation=False)[0]
-                valid_job[mol_id]['dft_input_xyz'] = load_geometry(g16_log, input_geom=True)[0]
-                valid_job[mol_id]['dft_steps'] = load_geometry(g16_log)[1]
-                valid_job[mol_id]['dft_cpu'] = get_cpu(read_log_file(g16_log))
-                valid_job[mol_id]['dft_wall'] = get_wall(read_log_file(g16_log))
-                valid_job[mol_id]['dft_energy'] = load_energies(g16_log, zpe_scale_factor)
+                valid_job[mol_id]['dft_freq'] = get_log_freq(log_data)
+                valid_job[mol_id]['dft_freq_neg'] = not check_neg_freq(get_log_freq(log_data))
+                valid_job[mol_id].update(get_log_geometry_fields(log_data))
+                valid_job[mol_id]['dft_energy'] = get_log_energies(log_data, g16_log, zpe_scale_factor)
         except:
             del valid_job[mol_id]
             failed_job[mol_id] = dict()
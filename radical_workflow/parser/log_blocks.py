@@ -0,0 +1,80 @@
+import os
+import re
+import mmap
+from contextlib import contextmanager
+
+import numpy as np
+
+ORIENTATION_SEPARATOR = b'---------------------------------------------------------------------'
+INPUT_ORIENTATION = b'Input orientation:'
+STANDARD_ORIENTATION = b'Standard orientation:'
+# lines between an orientation header and the first row: separator, two title lines, separator
+ORIENTATION_HEADER_LINES = 4
+FREQUENCIES_RE = re.compile(rb'Frequencies --([^\n]*)')
+
+
+@contextmanager
+def mapped_log(log_path):
+    """Read-only mmap of a log, or b"" for an empty file, which cannot be mapped."""
+    with open(log_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def rows_to_array(rows, n_columns):
+    """
+    Convert the rows of a block of numbers in fixed columns to an (n_rows, n_columns) float
+    array in one call. rows is a str or bytes buffer, or a list of lines.
+    """
+    if isinstance(rows, (list, tuple)):
+        rows = " ".join(rows) if rows and isinstance(rows[0], str) else b" ".join(rows)
+    return np.array(rows.split(), dtype=np.float64).reshape(-1, n_columns)
+
+
+def orientation_rows_bounds(buf, header_end):
+    """
+    (start, end) of the rows of the orientation table whose header ends at header_end, or None
+    if the log ends inside the table.
+    """
+    start = header_end
+    for i in range(ORIENTATION_HEADER_LINES + 1):
+        start = buf.find(b'\n', start) + 1
+        if start == 0:
+            return None
+    end = buf.find(ORIENTATION_SEPARATOR, start)
+    if end == -1:
+        return None
+    # the separator line starts after the last newline before it
+    return start, buf.rfind(b'\n', start - 1, end) + 1
+
+
+def find_orientation_blocks(buf, header=STANDARD_ORIENTATION, which="all"):
+    """
+    Bounds of the rows of the orientation tables under header: a list for which="all", or the
+    bounds of the first or the last table only, which are found without scanning the others.
+    Bounds are None for a table the log ends in, and the first or last is None without any table.
+    """
+    if which == "all":
+        return [orientation_rows_bounds(buf, m.end()) for m in re.finditer(re.escape(header), buf)]
+    pos = buf.find(header) if which == "first" else buf.rfind(header)
+    if pos == -1:
+        return None
+    return orientation_rows_bounds(buf, pos + len(header))
+
+
+def count_blocks(buf, header=STANDARD_ORIENTATION):
+    return len(re.findall(re.escape(header), buf))
+
+
+def read_orientation_block(buf, bounds):
+    """(atomic numbers, coordinates) of the rows between bounds as an int and an (n, 3) float array."""
+    table = rows_to_array(buf[bounds[0]:bounds[1]], 6)
+    return table[:, 1].astype(int), table[:, 3:6]
+
+
+def read_frequencies(buf):
+    """All the numbers on the Frequencies -- lines, as one float array in the order of the log."""
+    return np.array(b" ".join(FREQUENCIES_RE.findall(buf)).split(), dtype=np.float64)
@@ -0,0 +1,122 @@
+from enum import Enum
+
+from joblib import Parallel, delayed
+
+from .log_blocks import mapped_log
+from .orca_log_status import ORCA_STATUS_RE, ORCA_NORMAL, ORCA_UNFINISHED, classify_orca_buffer, status_lines
+from .parse_cache import parse_with_cache
+
+# the termination lines and error messages of g16 and xtb are within the last few kB
+TRIAGE_TAIL_BYTES = 16384
+SNIPPET_LINES = 6
+# version of the LogTriage records in a ParseCache, bump it when triage_log changes
+LOG_TRIAGE_VERSION = 2
+
+
+class LogStatus(Enum):
+    NORMAL = "normal"
+    ERROR = "error"
+    UNFINISHED = "unfinished"
+    MISSING = "missing"
+
+
+class LogTriage:
+    """Status of a log: the program, a LogStatus, a short reason and the error lines."""
+    def __init__(self, log_path, program, status, reason=None, snippet=""):
+        self.log_path = log_path
+        self.program = program
+        self.status = status
+        self.reason = reason
+        self.snippet = snippet
+
+    def __repr__(self):
+        return f"LogTriage({self.log_path!r}, {self.program!r}, {self.status}, {self.reason!r})"
+
+
+def make_snippet(lines):
+    return "\n".join(line.decode(errors="replace").rstrip() for line in lines[-SNIPPET_LINES:])
+
+
+def detect_program(tail):
+    if b"ORCA" in tail or ORCA_STATUS_RE.search(tail):
+        return "orca"
+    if b"Gaussian" in tail or b"Error termination" in tail:
+        return "g16"
+    if b"xtb" in tail or b"normal termination" in tail:
+        return "xtb"
+    return None
+
+
+def triage_orca(buf):
+    """ORCA logs are classified by classify_orca_buffer, the reason of an error is its ORCA status."""
+    lines = status_lines(buf)
+    status = classify_orca_buffer(buf, lines)
+    if status == ORCA_NORMAL:
+        return LogStatus.NORMAL, None, ""
+    if status == ORCA_UNFINISHED:
+        return LogStatus.UNFINISHED, None, ""
+    return LogStatus.ERROR, status, make_snippet(lines)
+
+
+def triage_g16(buf):
+    """g16 finished normally if its last line is a normal termination, as in G16Log.GetTermination."""
+    lines = buf[-TRIAGE_TAIL_BYTES:].splitlines()
+    last_lines = [line for line in lines if line.strip()]
+    if last_lines and b"Normal termination" in last_lines[-1]:
+        return LogStatus.NORMAL, None, ""
+    for i in range(len(lines) - 1, -1, -1):
+        if b"Error termination" in lines[i]:
+            # g16 prints the cause in the lines before the termination line
+            return LogStatus.ERROR, lines[i].strip().decode(errors="replace"), make_snippet(lines[:i + 1])
+    return LogStatus.UNFINISHED, None, ""
+
+
+def triage_xtb(buf):
+    lines = buf[-TRIAGE_TAIL_BYTES:].splitlines()
+    for i, line in enumerate(lines):
+        if b"abnormal termination" in line:
+            # xtb prints the [ERROR] block right before the abnormal termination line
+            start = next((j for j in range(i, -1, -1) if b"[ERROR]" in lines[j]), i)
+            return LogStatus.ERROR, line.strip().decode(errors="replace"), make_snippet(lines[start:i + 1])
+        if b"normal termination" in line:
+            return LogStatus.NORMAL, None, ""
+    return LogStatus.UNFINISHED, None, ""
+
+
+TRIAGE_FUNCTIONS = {
+    "g16": triage_g16,
+    "orca": triage_orca,
+    "xtb": triage_xtb,
+}
+
+
+def triage_log(log_path, program=None):
+    """
+    Classify a g16, ORCA or xtb log. program is one of TRIAGE_FUNCTIONS, or None to guess it
+    from the tail. g16 and xtb logs are classified from their last TRIAGE_TAIL_BYTES, ORCA logs
+    by classify_orca_buffer. Returns a LogTriage.
+    """
+    try:
+        with mapped_log(log_path) as buf:
+            if program is None:
+                program = detect_program(buf[-TRIAGE_TAIL_BYTES:])
+            if program is None:
+                return LogTriage(log_path, program, LogStatus.UNFINISHED)
+            status, reason, snippet = TRIAGE_FUNCTIONS[program](buf)
+    except FileNotFoundError:
+        return LogTriage(log_path, program, LogStatus.MISSING, "file not found")
+    return LogTriage(log_path, program, status, reason, snippet)
+
+
+def triage_logs(log_paths, program=None, n_jobs=16, cache=None):
+    """
+    Triage many logs with a thread pool. Returns a dict of log path to LogTriage. With a
+    ParseCache, e.g. ParseCache(path, "log_triage", LOG_TRIAGE_VERSION), only the logs whose
+    path, size or mtime are not in the cache are read.
+    """
+    if cache is None:
+        triages = Parallel(n_jobs=n_jobs, backend="threading")(delayed(triage_log)(log_path, program) for log_path in log_paths)
+    else:
+        tasks = [(log_path, program or "", (log_path, program)) for log_path in log_paths]
+        triages = parse_with_cache(cache, tasks, triage_log, n_jobs, verbose=0, backend="threading")
+    return dict(zip(log_paths, triages))
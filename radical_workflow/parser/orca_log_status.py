@@ -0,0 +1,99 @@
+import re
+
+from .log_blocks import mapped_log
+
+ORCA_NORMAL = "normal"
+ORCA_MAXCORE_ERROR = "maxcore error"
+ORCA_WAVE_FUNCTION_ERROR = "wave function error"
+ORCA_ERROR = "error"
+ORCA_UNFINISHED = "unfinished"
+
+# the last 30 lines of an ORCA log fit well within this
+TAIL_BYTES = 8192
+TAIL_LINES = 30
+
+ORCA_ERROR_MESSAGES = [
+    b"ORCA finished by error termination",
+    b"The basis set was either not assigned or not available for this element",
+    b"This wavefunction IS NOT FULLY CONVERGED!",
+    b"aborting the run",
+]
+ORCA_MAXCORE_MESSAGES = [
+    b"Please increase MaxCore - Skipping calculation",
+    b"ORCA finished by error termination in GTOInt",
+    b"ORCA finished by error termination in MDCI",
+]
+ORCA_SCF_ERROR_MESSAGE = b"ORCA finished by error termination in SCF"
+ORCA_WAVE_FUNCTION_ERROR_MESSAGE = b"This wavefunction IS NOT CONVERGED!"
+ORCA_NORMAL_MESSAGE = b"ORCA TERMINATED NORMALLY"
+# any line classify_orca_tail looks at
+ORCA_STATUS_RE = re.compile(b"|".join(re.escape(message) for message in ORCA_MAXCORE_MESSAGES + ORCA_ERROR_MESSAGES
+                                      + [ORCA_SCF_ERROR_MESSAGE, ORCA_WAVE_FUNCTION_ERROR_MESSAGE, ORCA_NORMAL_MESSAGE]))
+
+
+def classify_orca_tail(lines):
+    """Classify an ORCA run from the last lines of its log."""
+    scf_error = False
+    wave_function_error = False
+    normal_termination = False
+    for line in lines:
+        if any(message in line for message in ORCA_MAXCORE_MESSAGES):
+            return ORCA_MAXCORE_ERROR
+        if ORCA_SCF_ERROR_MESSAGE in line:
+            scf_error = True
+        if ORCA_WAVE_FUNCTION_ERROR_MESSAGE in line:
+            wave_function_error = True
+        if ORCA_NORMAL_MESSAGE in line:
+            normal_termination = True
+
+    # possibly strange SCF error
+    if scf_error and not wave_function_error:
+        return ORCA_MAXCORE_ERROR
+    if wave_function_error:
+        return ORCA_WAVE_FUNCTION_ERROR
+    if normal_termination:
+        return ORCA_NORMAL
+    for line in lines:
+        if any(message in line for message in ORCA_ERROR_MESSAGES):
+            return ORCA_ERROR
+    return ORCA_UNFINISHED
+
+
+def status_lines(buf):
+    """The lines of a log that classify_orca_tail looks at, found in one scan."""
+    lines = []
+    last_start = -1
+    for m in ORCA_STATUS_RE.finditer(buf):
+        start = buf.rfind(b"\n", 0, m.start()) + 1
+        if start != last_start:
+            end = buf.find(b"\n", m.end())
+            lines.append(buf[start:len(buf) if end == -1 else end])
+            last_start = start
+    return lines
+
+
+def buffer_tail(buf, n_lines=TAIL_LINES, n_bytes=TAIL_BYTES):
+    """The last n_lines lines of a log buffer, read from a block at its end that grows until it holds them."""
+    block = n_bytes
+    while True:
+        lines = buf[max(len(buf) - block, 0):].splitlines()
+        if len(lines) > n_lines or block >= len(buf):
+            return lines[-n_lines:]
+        block *= 2
+
+
+def classify_orca_buffer(buf, lines=None):
+    """
+    Classify an ORCA run from the last lines of its log and, if they look unfinished, from the
+    whole log, where an error message can be followed by more than TAIL_LINES lines of output.
+    lines are the status_lines of buf, if they are already known.
+    """
+    status = classify_orca_tail(buffer_tail(buf))
+    if status != ORCA_UNFINISHED:
+        return status
+    return classify_orca_tail(status_lines(buf) if lines is None else lines)
+
+
+def classify_orca_log(log_path):
+    with mapped_log(log_path) as buf:
+        return classify_orca_buffer(buf)
@@ -0,0 +1,73 @@
+import os
+import zlib
+import sqlite3
+import pickle as pkl
+
+from joblib import Parallel, delayed
+
+
+class ParseCache:
+    """
+    sqlite cache of parser outputs keyed by the identity of the parsed file: its path, size and
+    mtime, the version of the parser and a key for the other inputs of the parser, e.g. the
+    smiles. Records are stored as zlib compressed pickles. A file that changed, or a parser whose
+    version was bumped, misses the cache and is parsed again.
+    """
+    def __init__(self, cache_path, parser_name, version):
+        self.cache_path = cache_path
+        self.parser_name = parser_name
+        self.version = str(version)
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS records (parser TEXT, path TEXT, key TEXT, size INTEGER, mtime REAL, "
+                          "version TEXT, record BLOB, PRIMARY KEY (parser, path))")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, path, stat, key=""):
+        """Return (True, record) if the cache holds the record of path for this stat and key, else (False, None)."""
+        row = self.conn.execute("SELECT key, size, mtime, version, record FROM records WHERE parser = ? AND path = ?",
+                                (self.parser_name, path)).fetchone()
+        if row is None or row[:4] != (key, stat.st_size, stat.st_mtime, self.version):
+            return False, None
+        return True, pkl.loads(zlib.decompress(row[4]))
+
+    def put(self, path, stat, record, key=""):
+        self.conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (self.parser_name, path, key, stat.st_size, stat.st_mtime, self.version,
+                           zlib.compress(pkl.dumps(record, protocol=pkl.HIGHEST_PROTOCOL))))
+
+
+def parse_with_cache(cache, tasks, parse_function, n_jobs=1, chunk_size=10000, verbose=5, backend="multiprocessing"):
+    """
+    Return [parse_function(*args) for path, key, args in tasks], parsing only the files that
+    are not in the cache, with a joblib pool of the given backend. The files are stat'ed before they are parsed, so a file that changes
+    while it is parsed is parsed again next time. Files that do not exist are parsed every
+    time and not cached. New records are committed chunk by chunk, so an interrupted run keeps
+    what it parsed.
+    """
+    out = [None] * len(tasks)
+    misses = []
+    for i, (path, key, args) in enumerate(tasks):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            misses.append((i, None))
+            continue
+        hit, record = cache.get(path, stat, key)
+        if hit:
+            out[i] = record
+        else:
+            misses.append((i, stat))
+    print(f"{len(tasks) - len(misses)} of {len(tasks)} records from the parse cache, parsing {len(misses)}")
+
+    for start in range(0, len(misses), chunk_size):
+        chunk = misses[start:start + chunk_size]
+        records = Parallel(n_jobs=n_jobs, backend=backend, verbose=verbose)(delayed(parse_function)(*tasks[i][2]) for i, _ in chunk)
+        for (i, stat), record in zip(chunk, records):
+            out[i] = record
+            if stat is not None:
+                cache.put(tasks[i][0], stat, record, tasks[i][1])
+        cache.conn.commit()
+    return out
@@ -3,13 +3,18 @@
 
 import os
 import re
-import tarfile
 import numpy as np
 import rdkit
 
 from rdmc.mol import RDKitMol
 
 from .utils import make_xyz_str
+from .tar_archive import IndexedTarFile
+from .connectivity import matches_reference
+from .log_blocks import INPUT_ORIENTATION, STANDARD_ORIENTATION, orientation_rows_bounds, rows_to_array
+
+# bump when semiempirical_opt_parser returns something else for the same tar, to invalidate parse caches
+SEMIEMPIRICAL_OPT_PARSER_VERSION = 3
 
 periodictable = ["", "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar",
              "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br",
@@ -340,6 +345,137 @@ def get_title_card(member, tar, flag=b"Initial command:"):
             break
     return title_card.decode()
 
+TITLE_CARD_SEPARATOR = b"------------------------------------------------------"
+SEMIEMPIRICAL_LOG_TRIGGER_RE = re.compile(rb"Input orientation:|Standard orientation:|Frequencies --|"
+                                          rb"Sum of electronic and zero-point Energies=|Sum of electronic and thermal Free Energies=|"
+                                          rb"Job cpu time|Elapsed time|1\\1\\GINC|1\|1\|GINC")
+
+
+class SemiempiricalLog:
+    """
+    The fields semiempirical_opt_parser takes from a conformer log, from one read of the tar
+    member. The bytes are scanned once with SEMIEMPIRICAL_LOG_TRIGGER_RE through a memoryview;
+    only the matching lines are copied out. Of the orientation tables only the number and the
+    position of the last are kept, and that one is converted to an array in one call when the
+    geometry is asked for, so a failed job costs no more than the scan. The archive blocks,
+    which hold the ZPE and HF, are kept with the whitespace removed.
+    """
+    def __init__(self, data):
+        self.view = memoryview(data)
+        # orientation header: [number of tables, end of the last header]
+        self.orientations = {INPUT_ORIENTATION: [0, None], STANDARD_ORIENTATION: [0, None]}
+        self.frequencies = []
+        self.lines = dict()
+        self.archive = []
+
+        for m in SEMIEMPIRICAL_LOG_TRIGGER_RE.finditer(self.view):
+            key = m.group()
+            if key in self.orientations:
+                self.orientations[key][0] += 1
+                self.orientations[key][1] = m.end()
+                continue
+            start = self.view.obj.rfind(b'\n', 0, m.start()) + 1
+            if key.endswith(b"GINC"):
+                end = self.view.obj.find(b'@', start)
+                end = len(self.view) if end == -1 else end + 1
+                self.archive.append(self.view[start:end].tobytes().replace(b'\n', b'').replace(b' ', b''))
+                continue
+            line, pos = self.read_line(start)
+            if key == b'Frequencies --':
+                self.frequencies.extend(line.split()[2:])
+            elif key not in self.lines:
+                self.lines[key] = line
+
+    def read_line(self, pos):
+        """Return the line starting at pos and the position of the next line."""
+        end = self.view.obj.find(b'\n', pos)
+        end = len(self.view) if end == -1 else end + 1
+        return self.view[pos:end].tobytes(), end
+
+    def check_job_status(self):
+        data = self.view.obj
+        end = len(data) - 1 if data.endswith(b'\n') else len(data)
+        return b'Normal termination' in data[data.rfind(b'\n', 0, end) + 1:]
+
+    def load_freq(self):
+        return np.sort(np.array(self.frequencies, dtype=np.float64)).tolist()
+
+    def check_freq(self):
+        try:
+            check_neg_freq(self.load_freq())
+        except:
+            return False
+        return True
+
+    def load_geometry(self, orientation=INPUT_ORIENTATION):
+        n_blocks, header_end = self.orientations[orientation]
+        step = n_blocks - 1
+        idx, number, coord = [], [], []
+        if n_blocks:
+            bounds = orientation_rows_bounds(self.view.obj, header_end)
+            if bounds is None:
+                raise ValueError(f"{orientation.decode()} table not terminated")
+            table = rows_to_array(self.view[bounds[0]:bounds[1]].tobytes(), 6)
+            idx = table[:, 0].astype(int).tolist()
+            number = table[:, 1].astype(int)
+            coord = table[:, 3:6].tolist()
+
+        number = np.array(number, dtype=int)
+        symbol = [periodictable[x] for x in number]
+
+        xyz_dict = dict()
+        for x in zip(idx, symbol, coord):
+            xyz_dict[x[0]] = (x[1], tuple(x[2]))
+
+        if orientation == INPUT_ORIENTATION:
+            xyz_str = make_xyz_str(symbol, coord)
+        else:
+            xyz_str = make_input_file_from_xyz(symbol, coord)
+        return xyz_str, xyz_dict, step
+
+    def load_geometry_std(self):
+        return self.load_geometry(STANDARD_ORIENTATION)
+
+    def get_title_card(self, flag=b"Initial command:"):
+        data = self.view.obj
+        pos = data.rfind(flag)
+        if pos == -1:
+            raise IndexError(f"{flag.decode()} not found")
+        pos = data.find(b" #opt=", data.rfind(b'\n', 0, pos) + 1)
+        title_card = b""
+        if pos == -1:
+            return title_card.decode()
+        line, pos = self.read_line(data.rfind(b'\n', 0, pos) + 1)
+        while TITLE_CARD_SEPARATOR not in line:
+            if not line:
+                raise IndexError("title card not terminated")
+            title_card += line.strip()
+            line, pos = self.read_line(pos)
+        return title_card.decode()
+
+    def load_energies(self):
+        s = b''.join(self.archive)
+        zpe = float(re.search(b'ZeroPoint=(-*\d+.\d+)', s)[1])
+        e0 = float(re.search(b'HF=(-*\d+.\d+)', s)[1])
+
+        energy = dict()
+        energy['scf'] = e0
+        energy['zpe_unscaled'] = zpe
+        energy['scf_zpe_unscaled'] = float(self.lines[b'Sum of electronic and zero-point Energies='].split()[-1])
+        energy['gibbs'] = float(self.lines[b'Sum of electronic and thermal Free Energies='].split()[-1])
+        return energy
+
+    def get_cpu(self):
+        line = self.lines.get(b"Job cpu time")
+        if line is not None:
+            return tuple([int(line.split()[3]), int(line.split()[5]), int(line.split()[7]), float(line.split()[9])])
+
+    def get_wall(self):
+        line = self.lines.get(b"Elapsed time")
+        if line is not None:
+            return tuple([int(line.split()[2]), int(line.split()[4]), int(line.split()[6]), float(line.split()[8])])
+
+
 def semiempirical_opt_parser(mol_id, mol_smi, mol_confs_tar=None):
 
     valid_job = dict()
@@ -356,41 +492,57 @@ def semiempirical_opt_parser(mol_id, mol_smi, mol_confs_tar=None):
 
         pre_adj = RDKitMol.FromSmiles(mol_smi).GetAdjacencyMatrix()
 
-        tar = tarfile.open(mol_confs_tar)
+        tar = IndexedTarFile(mol_confs_tar)
+        confs = []
         for member in tar:
             conf_id = member.name.split(f"{mol_id}_")[1]
             conf_id = int(conf_id.split(".log")[0])
 
-            job_stat = check_job_status(member, tar)
-            if not job_stat:
+            # every field below comes from this one read of the member
+            log = SemiempiricalLog(tar.read(member))
+
+            if not log.check_job_status():
                 failed_job[mol_id][conf_id] = "job status"
                 continue
 
-            if not check_freq(member, tar):
+            if not log.check_freq():
                 failed_job[mol_id][conf_id] = "freq check"
                 continue
 
-            xyz, _, _ = load_geometry(member, tar)
+            confs.append((conf_id, log, log.load_geometry()))
+
+        # the connectivity of all the conformers with the same atoms is perceived in one batch
+        same_adj = dict()
+        by_symbols = dict()
+        for conf_id, log, (xyz, xyz_dict, steps) in confs:
+            symbols = tuple(symbol for symbol, coord in xyz_dict.values())
+            by_symbols.setdefault(symbols, []).append((conf_id, [coord for symbol, coord in xyz_dict.values()]))
+        for symbols, conf_coords in by_symbols.items():
             try:
-                post_mol = RDKitMol.FromXYZ(xyz, header=False, sanitize=False,)
+                matches = matches_reference(pre_adj, symbols, np.array([coords for conf_id, coords in conf_coords]).reshape(len(conf_coords), len(symbols), 3))
             except Exception as e:
-                failed_job[mol_id][conf_id] = f"rdkit failed with {e}"
-                continue
-            post_adj = post_mol.GetAdjacencyMatrix()
-            if (pre_adj == post_adj).all():
+                matches = [f"connectivity failed with {e}"] * len(conf_coords)
+            for (conf_id, coords), match in zip(conf_coords, matches):
+                same_adj[conf_id] = match
 
+        for conf_id, log, (xyz, xyz_dict, steps) in confs:
+            if isinstance(same_adj[conf_id], str):
+                failed_job[mol_id][conf_id] = same_adj[conf_id]
+                continue
+            if same_adj[conf_id]:
                 valid_job[mol_id][conf_id] = dict()
                 valid_job[mol_id][conf_id]['mol_smi'] = mol_smi
-                valid_job[mol_id][conf_id]['semiempirical_title_card'] = get_title_card(member, tar)
-                valid_job[mol_id][conf_id]['semiempirical_freq'] = load_freq(member, tar)
-                valid_job[mol_id][conf_id]['semiempirical_xyz'], valid_job[mol_id][conf_id]['semiempirical_xyz_dict'], valid_job[mol_id][conf_id]['semiempirical_steps'] = load_geometry(member, tar)
-                valid_job[mol_id][conf_id]['semiempirical_xyz_std_ori'], valid_job[mol_id][conf_id]['semiempirical_xyz_dict_std_ori'], _ = load_geometry_std(member, tar)
-                valid_job[mol_id][conf_id]['semiempirical_energy'] = load_energies(member, tar)
-                valid_job[mol_id][conf_id]['semiempirical_cpu'] = get_cpu(member, tar)
-                valid_job[mol_id][conf_id]['semiempirical_wall'] = get_wall(member, tar)
+                valid_job[mol_id][conf_id]['semiempirical_title_card'] = log.get_title_card()
+                valid_job[mol_id][conf_id]['semiempirical_freq'] = log.load_freq()
+                valid_job[mol_id][conf_id]['semiempirical_xyz'], valid_job[mol_id][conf_id]['semiempirical_xyz_dict'], valid_job[mol_id][conf_id]['semiempirical_steps'] = xyz, xyz_dict, steps
+                valid_job[mol_id][conf_id]['semiempirical_xyz_std_ori'], valid_job[mol_id][conf_id]['semiempirical_xyz_dict_std_ori'], _ = log.load_geometry_std()
+                valid_job[mol_id][conf_id]['semiempirical_energy'] = log.load_energies()
+                valid_job[mol_id][conf_id]['semiempirical_cpu'] = log.get_cpu()
+                valid_job[mol_id][conf_id]['semiempirical_wall'] = log.get_wall()
             else:
                 failed_job[mol_id][conf_id] = 'adjacency matrix'
                 continue
+        tar.close()
 
         if not valid_job[mol_id]:
             del valid_job[mol_id]
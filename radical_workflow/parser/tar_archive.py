@@ -0,0 +1,151 @@
+import io
+import os
+import json
+import shutil
+import tarfile
+
+INDEX_SUFFIX = ".idx"
+
+# in-process cache of the indices read or built, keyed by the tar path
+_index_cache = dict()
+
+
+class IndexedTarMember:
+    """Name, data offset and size of a member, enough to read it with one seek."""
+    def __init__(self, name, offset, size):
+        self.name = name
+        self.offset = offset
+        self.size = size
+
+
+def tar_index_path(tar_path):
+    return f"{tar_path}{INDEX_SUFFIX}"
+
+
+def tar_identity(tar_path):
+    """(size, mtime in ns) of a tar. Tars are padded to 10 KiB records, so a rewritten tar often has the same size."""
+    stat = os.stat(tar_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_tar_index(tar_path):
+    """
+    Return the index of a tar: its size and mtime and {member name: [data offset, size]} of the
+    regular files.
+    """
+    tar_size, tar_mtime = tar_identity(tar_path)
+    with tarfile.open(tar_path) as tar:
+        members = {member.name: [member.offset_data, member.size] for member in tar if member.isfile()}
+    return dict(tar_size=tar_size, tar_mtime=tar_mtime, members=members)
+
+
+def is_fresh(index, tar_path):
+    return index is not None and (index.get("tar_size"), index.get("tar_mtime")) == tar_identity(tar_path)
+
+
+def dump_tar_index(index, index_path):
+    # the temporary file is unique to the process, as readers may rebuild the same index at once
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def write_tar_index(tar_path):
+    """Write the sidecar index {tar_path}.idx of a tar."""
+    index = build_tar_index(tar_path)
+    dump_tar_index(index, tar_index_path(tar_path))
+    _index_cache[tar_path] = index
+    return index
+
+
+def install_tar(source_tar_path, tar_path):
+    """
+    Copy a tar written in the scratch folder to tar_path together with its index. Both are
+    written next to their destination first and renamed into place, and the index records the
+    mtime of the tar it was built from, so a reader never uses an index of another tar.
+    """
+    tmp_tar_path = f"{tar_path}.{os.getpid()}.tmp"
+    shutil.copyfile(source_tar_path, tmp_tar_path)
+    # the rename keeps the mtime, so the index of the temporary tar is the index of tar_path
+    index = build_tar_index(tmp_tar_path)
+    os.replace(tmp_tar_path, tar_path)
+    dump_tar_index(index, tar_index_path(tar_path))
+    _index_cache[tar_path] = index
+    return index
+
+
+def get_tar_index(tar_path):
+    """
+    Return the index of a tar from the cache, the sidecar file or, for tars written without one,
+    by reading the tar headers once and writing the sidecar. An index whose size or mtime does
+    not match the tar is stale and rebuilt.
+    """
+    index = _index_cache.get(tar_path)
+    if is_fresh(index, tar_path):
+        return index
+
+    index_path = tar_index_path(tar_path)
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except ValueError:
+            index = None
+        if is_fresh(index, tar_path):
+            _index_cache[tar_path] = index
+            return index
+
+    try:
+        return write_tar_index(tar_path)
+    except OSError:
+        # read-only output folder, keep the index in memory only
+        index = build_tar_index(tar_path)
+        _index_cache[tar_path] = index
+        return index
+
+
+class IndexedTarFile:
+    """
+    Read-only access to the members of a tar through its index. Drop-in for the part of
+    tarfile.TarFile used by the parsers: iterating gives members with a name, and extractfile
+    takes a member or a name and returns a file object over the member's bytes.
+    """
+    def __init__(self, tar_path):
+        self.tar_path = tar_path
+        self.members = {name: IndexedTarMember(name, offset, size) for name, (offset, size) in get_tar_index(tar_path)["members"].items()}
+        self.f = open(tar_path, "rb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.members.values())
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def close(self):
+        self.f.close()
+
+    def getnames(self):
+        return list(self.members)
+
+    def find(self, basename):
+        """Return the member whose file name is basename, or None."""
+        for member in self.members.values():
+            if os.path.basename(member.name) == basename:
+                return member
+        return None
+
+    def read(self, member):
+        if not isinstance(member, IndexedTarMember):
+            member = self.members[member]
+        self.f.seek(member.offset)
+        return self.f.read(member.size)
+
+    def extractfile(self, member):
+        return io.BytesIO(self.read(member))
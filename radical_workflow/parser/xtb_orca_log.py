@@ -0,0 +1,161 @@
+import os
+import re
+
+from .log_blocks import mapped_log
+from .log_status import LogStatus, make_snippet
+from .orca_log_status import ORCA_STATUS_RE, ORCA_NORMAL, ORCA_UNFINISHED, classify_orca_buffer
+
+
+class LogError(Exception):
+    """A log that finished without the field asked for."""
+    pass
+
+
+def line_bounds(buf, pos):
+    """(start, end) of the line of buf around pos, without its newline."""
+    end = buf.find(b"\n", pos)
+    return buf.rfind(b"\n", 0, pos) + 1, len(buf) if end == -1 else end
+
+
+def lines_after(buf, pos, n_skip, stop):
+    """
+    The lines after the line at pos, skipping n_skip of them, up to the first line containing
+    stop, and the position of that line, or of the end of buf without it.
+    """
+    start = line_bounds(buf, pos)[1] + 1
+    for i in range(n_skip):
+        start = buf.find(b"\n", start) + 1
+        if start == 0:
+            return [], len(buf)
+    end = buf.find(stop, start)
+    end = len(buf) if end == -1 else buf.rfind(b"\n", 0, end) + 1
+    return buf[start:end].splitlines(), end
+
+
+XTB_TRIGGER_RE = re.compile(rb"Frequency Printout|normal termination|TOTAL ENERGY|TOTAL FREE ENERGY")
+XTB_WAVENUM_RE = re.compile(rb"\s+(-?\d+\.\d+)")
+XTB_INTENSITY_RE = re.compile(rb"\d+:\s+(\d+\.\d+)")
+XTB_ENERGY_RE = re.compile(rb"TOTAL ENERGY[^\S\n]+(-?\d+\.\d+)")
+XTB_FREE_ENERGY_RE = re.compile(rb"TOTAL FREE ENERGY[^\S\n]+(-?\d+\.\d+)")
+# attributes of XtbLog and the section of the log they come from
+XTB_FIELD_SECTIONS = {"wavenum": "freq", "ir_intensities": "freq", "E": "energy", "G": "energy"}
+
+
+def read_xtb_frequencies(buf, pos):
+    """Wavenumbers and IR intensities of the nonzero modes of the Frequency Printout at pos."""
+    # the header dashes and the title of the frequencies follow the Frequency Printout line
+    lines, end = lines_after(buf, pos, 2, b"reduced masses")
+    wavenums = [float(m) for line in lines for m in XTB_WAVENUM_RE.findall(line.strip())]
+    ir = buf.find(b"IR intensities", end)
+    if ir == -1:
+        return [], []
+    lines, end = lines_after(buf, ir, 0, b"Raman intensities")
+    intensities = [float(m) for line in lines for m in XTB_INTENSITY_RE.findall(line.strip())]
+    pairs = [(w, i) for w, i in zip(wavenums, intensities) if w != 0]
+    return [w for w, i in pairs], [i for w, i in pairs]
+
+
+class XtbLog:
+    """
+    xtb log read in one pass: termination, status, error and snippet of the run, the last
+    TOTAL ENERGY E (str) and TOTAL FREE ENERGY G, and wavenum and ir_intensities of the
+    nonzero modes. Energies and frequencies are only set for a normal termination, and with
+    fields, names from XTB_FIELD_SECTIONS, only for those fields.
+    """
+    def __init__(self, file, fields=None):
+        if '.log' not in file:
+            raise TypeError('A xtb .log file must be provided')
+
+        self.file = file
+        self.name = os.path.basename(file)
+        sections = set(XTB_FIELD_SECTIONS.values()) if fields is None else {XTB_FIELD_SECTIONS[field] for field in fields}
+
+        with mapped_log(file) as buf:
+            freq_pos, termination_pos, energy, free_energy = None, None, None, None
+            for m in XTB_TRIGGER_RE.finditer(buf):
+                trigger = m.group()
+                if trigger == b"Frequency Printout":
+                    if freq_pos is None:
+                        freq_pos = m.start()
+                elif trigger == b"normal termination":
+                    termination_pos = m.start()
+                elif trigger == b"TOTAL ENERGY":
+                    energy = XTB_ENERGY_RE.match(buf, m.start()) or energy
+                else:
+                    free_energy = XTB_FREE_ENERGY_RE.match(buf, m.start()) or free_energy
+            self.GetTermination(buf, termination_pos)
+
+            if not self.termination:
+                return
+            if "freq" in sections and freq_pos is not None:
+                wavenums, intensities = read_xtb_frequencies(buf, freq_pos)
+                if wavenums and intensities and len(wavenums) == len(intensities):
+                    self.wavenum = tuple(wavenums)
+                    self.ir_intensities = tuple(intensities)
+            if "energy" in sections:
+                if energy is not None:
+                    self.E = energy[1].decode()
+                if free_energy is not None:
+                    self.G = float(free_energy[1])
+
+    def GetTermination(self, buf, termination_pos):
+        self.error = None
+        self.snippet = ""
+        if termination_pos is None:
+            self.status = LogStatus.UNFINISHED
+        elif buf[max(termination_pos - 2, 0):termination_pos] == b"ab":
+            start, end = line_bounds(buf, termination_pos)
+            self.status = LogStatus.ERROR
+            self.error = buf[start:end].strip().decode(errors="replace")
+            # xtb prints the [ERROR] block right before the abnormal termination line
+            error_pos = buf.rfind(b"[ERROR]", 0, start)
+            self.snippet = make_snippet(buf[line_bounds(buf, error_pos)[0] if error_pos != -1 else start:end].splitlines())
+        else:
+            self.status = LogStatus.NORMAL
+        self.termination = self.status is LogStatus.NORMAL
+        return self.termination
+
+
+ORCA_LOG_RE = re.compile(ORCA_STATUS_RE.pattern + rb"|FINAL SINGLE POINT ENERGY")
+ORCA_ENERGY_RE = re.compile(rb"FINAL SINGLE POINT ENERGY[^\S\n]+(-?\d+\.\d+)")
+
+
+class OrcaLog:
+    """
+    ORCA log read in one pass: its status from classify_orca_buffer, the same classification
+    as the DLPNO planning and runner scripts, termination, error (the status of a failed run)
+    and the last FINAL SINGLE POINT ENERGY in Hartree, or None.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.energy = None
+
+        with mapped_log(path) as buf:
+            lines = []
+            last_line_start = -1
+            for m in ORCA_LOG_RE.finditer(buf):
+                if m.group() == b"FINAL SINGLE POINT ENERGY":
+                    energy = ORCA_ENERGY_RE.match(buf, m.start())
+                    if energy is not None:
+                        self.energy = float(energy[1])
+                    continue
+                start, end = line_bounds(buf, m.start())
+                if start != last_line_start:
+                    lines.append(buf[start:end])
+                    last_line_start = start
+            self.status = classify_orca_buffer(buf, lines)
+        self.termination = self.status == ORCA_NORMAL
+        self.error = None if self.status in (ORCA_NORMAL, ORCA_UNFINISHED) else self.status
+
+    def check_for_errors(self):
+        """Returns the error of the log, or None if there is none."""
+        return self.error
+
+    def load_energy(self):
+        """
+        The last FINAL SINGLE POINT ENERGY in the log, which does not include the zero-point
+        energy.
+        """
+        if self.energy is None:
+            raise LogError('Unable to find energy in Orca output file.')
+        return self.energy
@@ -9,6 +9,7 @@ from rdmc.mol import RDKitMol
 from radical_workflow.calculation.ff_conf_generation import _genConf
 from radical_workflow.calculation.semiempirical_calculation import semiempirical_opt
 from radical_workflow.calculation.dft_calculation import dft_scf_opt
+from radical_workflow.calculation.watchdog import default_g16_rules, default_xtb_rules
 from radical_workflow.parser.semiempirical_opt_parser import semiempirical_opt_parser, get_mol_id_to_semiempirical_opted_xyz
 
 parser = ArgumentParser()
@@ -47,6 +48,8 @@ parser.add_argument('--gaussian_semiempirical_opt_n_procs', type=int, default=16
                     help='number of process for Gaussian semiempirical calculations')
 parser.add_argument('--gaussian_semiempirical_opt_job_ram', type=int, default=8000,
                     help='amount of ram (MB) allocated for each Gaussian semiempirical calculation')
+parser.add_argument('--gaussian_semiempirical_opt_link1_batch_size', type=int, default=1,
+                    help='number of conformers optimized in one g16 process with --Link1--, 1 runs each conformer separately')
 
 # DFT optimization and frequency calculation
 parser.add_argument('--DFT_opt_freq_folder', type=str, default='DFT_opt_freq',
@@ -75,6 +78,8 @@ parser.add_argument('--ORCA_path', type=str, required=False, default=None,
                     help='path to ORCA')
 parser.add_argument('--scratch_dir', type=str, required=True,
                     help='scratch directory')
+parser.add_argument('--watchdog', action='store_true',
+                    help='watch the Gaussian and xtb logs while jobs run and abort jobs that are bound to fail')
 
 args = parser.parse_args()
 
@@ -168,7 +173,7 @@ for _ in range(1):
                         print(mol_id)
                         print(smi)
                         start_time = time.time()
-                        _genConf(smi, mol_id, XTB_PATH, conf_search_FFs, args.max_n_conf, args.max_conf_try, args.rmspre, args.E_cutoff_fraction, args.rmspost, args.n_lowest_E_confs_to_save, args.scratch_dir, suboutputs_dir, subinputs_dir)
+                        _genConf(smi, mol_id, XTB_PATH, conf_search_FFs, args.max_n_conf, args.max_conf_try, args.rmspre, args.E_cutoff_fraction, args.rmspost, args.n_lowest_E_confs_to_save, args.scratch_dir, suboutputs_dir, subinputs_dir, default_xtb_rules() if args.watchdog else None)
                         end_time = time.time()
                         print(f"Time for conformer search for {mol_id} is {end_time - start_time} seconds")
 
@@ -227,8 +232,9 @@ for _ in range(1):
                         for conf_id, mol in enumerate(mols):
                             mol_id_to_FF_opted_xyz_dict[mol_id][conf_id] = mol.ToXYZ()
                         
+                        watchdog_rules = default_g16_rules(smi) if args.watchdog else None
                         start_time = time.time()
-                        semiempirical_opt(mol_id, charge, mult, mol_id_to_FF_opted_xyz_dict, XTB_PATH, RDMC_PATH, G16_PATH, args.gaussian_semiempirical_opt_theory, args.gaussian_semiempirical_opt_n_procs, args.gaussian_semiempirical_opt_job_ram, args.scratch_dir, tmp_mol_dir, suboutputs_dir, subinputs_dir)
+                        semiempirical_opt(mol_id, charge, mult, mol_id_to_FF_opted_xyz_dict, XTB_PATH, RDMC_PATH, G16_PATH, args.gaussian_semiempirical_opt_theory, args.gaussian_semiempirical_opt_n_procs, args.gaussian_semiempirical_opt_job_ram, args.scratch_dir, tmp_mol_dir, suboutputs_dir, subinputs_dir, watchdog_rules, args.gaussian_semiempirical_opt_link1_batch_size)
                         end_time = time.time()
                         print(f"Time for semiempirical optimization for {mol_id} is {end_time - start_time} seconds")
 
@@ -280,12 +286,13 @@ for _ in range(1):
                         print(mol_id)
                         print(smi)
                         semiempirical_opt_tar = os.path.join(semiempirical_opt_dir, "outputs", f"outputs_{ids}", f"{mol_id}.tar")
+                        watchdog_rules = default_g16_rules(smi) if args.watchdog else None
                         failed_job, valid_job = semiempirical_opt_parser(mol_id, smi, semiempirical_opt_tar)
 
                         if valid_job:
                             mol_id_to_semiempirical_opted_xyz = get_mol_id_to_semiempirical_opted_xyz(valid_job)
 
-                            converged = dft_scf_opt(mol_id, smi, mol_id_to_semiempirical_opted_xyz, G16_PATH, DFT_opt_freq_theories, args.DFT_opt_freq_n_procs, args.DFT_opt_freq_job_ram, charge, mult, args.scratch_dir, suboutputs_dir, subinputs_dir)
+                            converged = dft_scf_opt(mol_id, smi, mol_id_to_semiempirical_opted_xyz, G16_PATH, DFT_opt_freq_theories, args.DFT_opt_freq_n_procs, args.DFT_opt_freq_job_ram, charge, mult, args.scratch_dir, suboutputs_dir, subinputs_dir, watchdog_rules)
 
                             if not converged:
                                 print(f"DFT optimization for {mol_id} failed. Trying to optimize lowest energy FF opted conformer with DFT method...")
@@ -298,7 +305,7 @@ for _ in range(1):
                                         mol_id_to_FF_opted_xyz_dict[mol_id] = mol.ToXYZ()
                                         break
                             
-                                converged = dft_scf_opt(mol_id, smi, mol_id_to_FF_opted_xyz_dict, G16_PATH, [args.DFT_opt_freq_theory_backup], args.DFT_opt_freq_n_procs, args.DFT_opt_freq_job_ram, charge, mult, args.scratch_dir, suboutputs_dir, subinputs_dir)
+                                converged = dft_scf_opt(mol_id, smi, mol_id_to_FF_opted_xyz_dict, G16_PATH, [args.DFT_opt_freq_theory_backup], args.DFT_opt_freq_n_procs, args.DFT_opt_freq_job_ram, charge, mult, args.scratch_dir, suboutputs_dir, subinputs_dir, watchdog_rules)
 
                         else:
                             print(f"All semiempirical opted conformers failed for {mol_id}")
@@ -314,7 +321,7 @@ for _ in range(1):
                                     mol_id_to_FF_opted_xyz_dict[mol_id] = mol.ToXYZ()
                                     break
                             
-                            converged = dft_scf_opt(mol_id, smi, mol_id_to_FF_opted_xyz_dict, G16_PATH, [args.DFT_opt_freq_theory_backup], args.DFT_opt_freq_n_procs, args.DFT_opt_freq_job_ram, charge, mult, args.scratch_dir, suboutputs_dir, subinputs_dir)
+                            converged = dft_scf_opt(mol_id, smi, mol_id_to_FF_opted_xyz_dict, G16_PATH, [args.DFT_opt_freq_theory_backup], args.DFT_opt_freq_n_procs, args.DFT_opt_freq_job_ram, charge, mult, args.scratch_dir, suboutputs_dir, subinputs_dir, watchdog_rules)
 
     print("DFT optimization and frequency calculation done.")
 
@@ -13,6 +13,8 @@ from rdkit import Chem
 
 from radical_workflow.calculation.wft_calculation import generate_dlpno_sp_input
 from radical_workflow.calculation.cosmo_calculation import cosmo_calc
+from radical_workflow.calculation.watchdog import default_cosmotherm_rules
+from radical_workflow.calculation.cosmo_staging import stage_solvent_database, mark_staged_solvents
 
 parser = ArgumentParser()
 parser.add_argument('--input_smiles', type=str, required=True,
@@ -35,6 +37,20 @@ parser.add_argument('--COSMO_temperatures', type=str, nargs="+", required=False,
                     help='temperatures used for COSMO calculation')
 parser.add_argument('--COSMO_input_pure_solvents', type=str, required=False, default='common_solvent_list_final.csv',
                     help='input file containing pure solvents used for COSMO calculation.')
+parser.add_argument('--COSMO_solvent_batch_size', type=int, default=1,
+                    help='number of solvents computed in one cosmotherm run, 1 runs every solvent separately')
+parser.add_argument('--COSMO_ranks_per_node', type=int, default=None,
+                    help='number of tasks (e.g. LLsub ranks) running on one node, which share its cores')
+parser.add_argument('--COSMO_n_jobs', type=int, default=None,
+                    help='number of cosmotherm processes run at the same time, defaults to the cores of the node divided by COSMO_ranks_per_node, or 1 if it is not given')
+parser.add_argument('--COSMO_turbomole_n_procs', type=int, default=None,
+                    help='number of cores for each of the concurrent Turbomole cosmo and gas phase single points, defaults to half of COSMO_n_jobs')
+parser.add_argument('--COSMO_staging_dir', type=str, default=None,
+                    help='node-local folder to which the solvent .cosmo files are copied once and read from')
+parser.add_argument('--COSMO_max_retries', type=int, default=2,
+                    help='number of reruns of a failed solvent before the molecule is returned to the inputs')
+parser.add_argument('--watchdog', action='store_true',
+                    help='watch the COSMOtherm outputs while jobs run and abort jobs that are bound to fail')
 
 # specify paths
 parser.add_argument('--XTB_path', type=str, required=False, default=None,
@@ -124,6 +140,22 @@ for mol_id, smi in mol_ids_smis[args.task_id::args.num_tasks]:
                     f.write(mol_id)
                 print(mol_id)
 
+if args.COSMO_staging_dir is not None:
+    print("Staging solvent database...")
+    staged_solvents = stage_solvent_database(df_pure, COSMOTHERM_PATH, COSMO_DATABASE_PATH, args.COSMO_staging_dir)
+    df_pure = mark_staged_solvents(df_pure, staged_solvents)
+    solvent_database_dir = args.COSMO_staging_dir
+else:
+    solvent_database_dir = None
+
+# cores of this task: without COSMO_ranks_per_node other tasks may share the node, so only one core is assumed
+if args.COSMO_n_jobs is not None:
+    COSMO_n_jobs = args.COSMO_n_jobs
+elif args.COSMO_ranks_per_node is not None:
+    COSMO_n_jobs = max(os.cpu_count() // args.COSMO_ranks_per_node, 1)
+else:
+    COSMO_n_jobs = 1
+
 print("Starting COSMO calculations...")
 for _ in range(5):
     for subinputs_folder in os.listdir(os.path.join(COSMO_dir, "inputs")):
@@ -145,6 +177,7 @@ for _ in range(5):
                     coords = xyz_DFT_opt_dict[mol_id]
                     tmp_mol_dir = os.path.join(suboutputs_dir, mol_id)
                     os.makedirs(tmp_mol_dir, exist_ok=True)
-                    cosmo_calc(mol_id, COSMOTHERM_PATH, COSMO_DATABASE_PATH, charge, mult, args.COSMO_temperatures, df_pure, coords, args.scratch_dir, tmp_mol_dir, suboutputs_dir, subinputs_dir)
+                    watchdog_rules = default_cosmotherm_rules() if args.watchdog else None
+                    cosmo_calc(mol_id, COSMOTHERM_PATH, COSMO_DATABASE_PATH, charge, mult, args.COSMO_temperatures, df_pure, coords, args.scratch_dir, tmp_mol_dir, suboutputs_dir, subinputs_dir, watchdog_rules, args.COSMO_solvent_batch_size, COSMO_n_jobs, args.COSMO_max_retries, args.COSMO_turbomole_n_procs, solvent_database_dir)
 
 print("Done!")
\ No newline at end of file
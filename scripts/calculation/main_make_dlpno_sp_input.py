@@ -3,9 +3,13 @@ import os
 import pickle as pkl
 import pandas as pd
 import rdkit.Chem as Chem
-import subprocess
 
-from radical_workflow.calculation.wft_calculation import generate_dlpno_sp_input
+from radical_workflow.calculation.wft_calculation import generate_dlpno_sp_input, generate_dlpno_sp_batch_input, select_dlpno_batches
+from radical_workflow.calculation.orca_runner import loosen_scf_settings
+from radical_workflow.calculation.orca_resources import DLPNOResourceModel
+from radical_workflow.parser.log_status import triage_logs, LogStatus, LOG_TRIAGE_VERSION
+from radical_workflow.parser.orca_log_status import ORCA_MAXCORE_ERROR, ORCA_WAVE_FUNCTION_ERROR
+from radical_workflow.parser.parse_cache import ParseCache
 
 parser = ArgumentParser()
 parser.add_argument('--input_smiles', type=str, required=True,
@@ -14,6 +18,10 @@ parser.add_argument('--output_folder', type=str, default='output',
                     help='output folder name')
 parser.add_argument('--xyz_DFT_opt_dict', type=str, default=None,
                     help='pickle file containing a dictionary to map between the mol_id and DFT-optimized xyz for following calculations',)
+parser.add_argument('--n_scan_threads', type=int, default=16,
+                    help='number of threads used to check the status of existing logs')
+parser.add_argument('--log_status_cache', type=str, default=None,
+                    help='sqlite cache of the status of existing logs, by default log_status_cache_<task_id>.db in the DLPNO_sp folder')
 parser.add_argument('--task_id', type=int, default=0,
                     help='task id for the calculation',)
 parser.add_argument('--num_tasks', type=int, default=1,
@@ -27,6 +35,18 @@ parser.add_argument('--DLPNO_sp_n_procs', type=int, default=24,
                     help='number of process for DLPNO calculations')
 parser.add_argument('--DLPNO_sp_job_ram', type=int, default=4000,
                     help='amount of ram (MB) per core allocated for each DLPNO calculation')
+parser.add_argument('--DLPNO_resource_model', action='store_true',
+                    help='pick nprocs and maxcore per molecule from its estimated basis set size, DLPNO_sp_n_procs is the upper limit')
+parser.add_argument('--DLPNO_resource_history', type=str, default=None,
+                    help='csv of earlier runs written by run_dlpno_sp_inputs.py, used to refine the resource model')
+parser.add_argument('--DLPNO_node_memory', type=int, default=None,
+                    help='memory (MB) of a node, used to cap maxcore of the resource model')
+parser.add_argument('--DLPNO_batch_size', type=int, default=1,
+                    help='number of small molecules put in one ORCA input with $new_job, 1 disables batching')
+parser.add_argument('--DLPNO_batch_max_heavy_atoms', type=int, default=4,
+                    help='molecules with at most this many heavy atoms are batched')
+parser.add_argument('--DLPNO_batch_n_procs', type=int, default=4,
+                    help='number of process for batched DLPNO calculations')
 
 # specify paths
 parser.add_argument('--XTB_path', type=str, required=False, default=None,
@@ -101,83 +121,114 @@ os.makedirs(outputs_dir, exist_ok=True)
 
 print("Make dlpno input files...")
 
-def tail(f, n):
-    proc = subprocess.Popen(['tail', '-n', str(n), f], stdout=subprocess.PIPE)
-    lines = proc.stdout.readlines()
-    return lines
-
-def has_max_core_error(log_path):
-    lines = tail(log_path, 30)
-    for line in lines:
-        if (b"Please increase MaxCore - Skipping calculation" in line) or (b"ORCA finished by error termination in GTOInt" in line) or (b"ORCA finished by error termination in MDCI" in line):
-            return True
-    # possibly strange SCF error
-    scf_error = False
-    wave_function_error = False
-    for line in lines:
-        if b"ORCA finished by error termination in SCF" in line:
-            scf_error = True
-        if b"This wavefunction IS NOT CONVERGED!" in line:
-            wave_function_error = True
-    if scf_error and not wave_function_error:
-        return True
-
-    return False
-
-def has_wave_function_error(log_path):
-    lines = tail(log_path, 30)
-    # find wave function error
-    wave_function_error = False
-    for line in lines:
-        if b"This wavefunction IS NOT CONVERGED!" in line:
-            wave_function_error = True
-    if wave_function_error:
-        return True
-
-    return False
+subinputs_dir_to_batched_mol_ids = dict()
+def get_batched_mol_ids(subinputs_dir):
+    if subinputs_dir not in subinputs_dir_to_batched_mol_ids:
+        batched_mol_ids = set()
+        if os.path.isdir(subinputs_dir):
+            for file in os.listdir(subinputs_dir):
+                if file.endswith(".batch"):
+                    with open(os.path.join(subinputs_dir, file)) as f:
+                        batched_mol_ids.update(f.read().split())
+        subinputs_dir_to_batched_mol_ids[subinputs_dir] = batched_mol_ids
+    return subinputs_dir_to_batched_mol_ids[subinputs_dir]
+
+level_of_theory_to_resource_model = dict()
+def get_resources(mol_id, DLPNO_level_of_theory):
+    if not args.DLPNO_resource_model:
+        return args.DLPNO_sp_job_ram, args.DLPNO_sp_n_procs
+    if DLPNO_level_of_theory not in level_of_theory_to_resource_model:
+        level_of_theory_to_resource_model[DLPNO_level_of_theory] = DLPNOResourceModel(DLPNO_level_of_theory, args.DLPNO_resource_history, args.DLPNO_sp_n_procs, args.DLPNO_node_memory)
+    resources = level_of_theory_to_resource_model[DLPNO_level_of_theory].size(xyz_DFT_opt_dict[mol_id])
+    if resources is None:
+        print(f"no basis set size for {DLPNO_level_of_theory}, using DLPNO_sp_job_ram and DLPNO_sp_n_procs for {mol_id}")
+        return args.DLPNO_sp_job_ram, args.DLPNO_sp_n_procs
+    return resources["maxcore"], resources["nprocs"]
+
+def write_single_input(subinputs_dir, mol_id, DLPNO_level_of_theory):
+    charge = mol_id_to_charge_dict[mol_id]
+    mult = mol_id_to_mult_dict[mol_id]
+    coords = xyz_DFT_opt_dict[mol_id].strip()
+    job_ram, n_procs = get_resources(mol_id, DLPNO_level_of_theory)
+    script = generate_dlpno_sp_input(DLPNO_level_of_theory, coords, charge, mult, job_ram, n_procs)
+
+    with open(os.path.join(subinputs_dir, f"{mol_id}.in"), "w+") as f:
+        f.write(script)
+    print(mol_id)
+
+def write_batch_input(subinputs_dir, batch, DLPNO_level_of_theory):
+    jobs = [(mol_id, xyz_DFT_opt_dict[mol_id].strip(), mol_id_to_charge_dict[mol_id], mol_id_to_mult_dict[mol_id]) for mol_id in batch]
+    script = generate_dlpno_sp_batch_input(DLPNO_level_of_theory, jobs, args.DLPNO_sp_job_ram, args.DLPNO_batch_n_procs)
+
+    batch_id = f"batch_{batch[0]}"
+    # the mol_id list is written first, so that a worker never picks up a batch without it
+    with open(os.path.join(subinputs_dir, f"{batch_id}.batch"), "w") as f:
+        f.write("\n".join(batch))
+    with open(os.path.join(subinputs_dir, f"{batch_id}.in"), "w+") as f:
+        f.write(script)
+    print(f"{batch_id}: {' '.join(batch)}")
+
+def get_log_path(mol_id):
+    ids = str(int(int(mol_id.split("id")[1])/1000))
+    return os.path.join(outputs_dir, f"outputs_{ids}", f"{mol_id}.log")
 
 mol_ids_smis = list(zip(mol_ids, smiles_list))
-for mol_id, smi in mol_ids_smis[args.task_id::args.num_tasks]:
+task_mol_ids_smis = mol_ids_smis[args.task_id::args.num_tasks]
+
+print("Checking existing logs...")
+# one cache per task, the tasks run at the same time and check disjoint logs
+log_status_cache = ParseCache(args.log_status_cache or os.path.join(DLPNO_sp_dir, f"log_status_cache_{args.task_id}.db"), "log_triage", LOG_TRIAGE_VERSION)
+log_path_to_triage = triage_logs([get_log_path(mol_id) for mol_id, smi in task_mol_ids_smis], "orca", args.n_scan_threads, log_status_cache)
+log_status_cache.close()
+
+pending_inputs = dict()
+for mol_id, smi in task_mol_ids_smis:
     ids = str(int(int(mol_id.split("id")[1])/1000))
     subinputs_dir = os.path.join(inputs_dir, f"inputs_{ids}")
     suboutputs_dir = os.path.join(outputs_dir, f"outputs_{ids}")
     os.makedirs(suboutputs_dir, exist_ok=True)
-    log_path = os.path.join(suboutputs_dir, f"{mol_id}.log")
+    log_path = get_log_path(mol_id)
+    log_triage = log_path_to_triage[log_path]
     DLPNO_level_of_theory = args.DLPNO_level_of_theory
     if mol_id in xyz_DFT_opt_dict:
-        if os.path.exists(log_path):
+        if log_triage.status is LogStatus.ERROR:
             # check if maxcore error
-            if has_max_core_error(log_path):
+            if log_triage.reason == ORCA_MAXCORE_ERROR:
                 print(f"maxcore error for {mol_id}, removing...")
                 try:
                     os.remove(log_path)
                 except FileNotFoundError:
                     print(f"file {log_path} not found, already removed?")
             # check if wave function error
-            if has_wave_function_error(log_path):
+            elif log_triage.reason == ORCA_WAVE_FUNCTION_ERROR:
                 print(f"wave function error for {mol_id}, removing...")
                 try:
                     os.remove(log_path)
-                    if args.DLPNO_level_of_theory == "uHF UNO DLPNO-CCSD(T)-F12D cc-pvtz-f12 def2/J cc-pvqz/c cc-pvqz-f12-cabs RIJCOSX VeryTightSCF NormalPNO":
-                        DLPNO_level_of_theory = "uHF UNO DLPNO-CCSD(T)-F12D cc-pvtz-f12 def2/J cc-pvqz/c cc-pvqz-f12-cabs RIJCOSX NormalSCF NormalPNO"
+                    DLPNO_level_of_theory = loosen_scf_settings(args.DLPNO_level_of_theory) or args.DLPNO_level_of_theory
                 except FileNotFoundError:
                     print(f"file {log_path} not found, already removed?")
         if not os.path.exists(log_path):
             os.makedirs(subinputs_dir, exist_ok=True)
             mol_id_path = os.path.join(subinputs_dir, f"{mol_id}.in")
-            if not os.path.exists(os.path.join(subinputs_dir, f"{mol_id}.tmp")) and not os.path.exists(mol_id_path):
-                charge = mol_id_to_charge_dict[mol_id]
-                mult = mol_id_to_mult_dict[mol_id]
-                coords = xyz_DFT_opt_dict[mol_id].strip()
-                script = generate_dlpno_sp_input(DLPNO_level_of_theory, coords, charge, mult, args.DLPNO_sp_job_ram, args.DLPNO_sp_n_procs)
-
-                with open(mol_id_path, "w+") as f:
-                    f.write(script)
-                print(mol_id)
+            if not os.path.exists(os.path.join(subinputs_dir, f"{mol_id}.tmp")) and not os.path.exists(mol_id_path) and mol_id not in get_batched_mol_ids(subinputs_dir):
+                pending_inputs.setdefault((subinputs_dir, DLPNO_level_of_theory), []).append(mol_id)
     else:
         print(f"Cannot find xyz for {mol_id}")
         if os.path.exists(log_path):
             print(f"Removing {log_path}...")
             os.remove(log_path)
 
+for (subinputs_dir, DLPNO_level_of_theory), pending_mol_ids in pending_inputs.items():
+    if args.DLPNO_batch_size > 1:
+        batches, singles = select_dlpno_batches(pending_mol_ids, xyz_DFT_opt_dict, args.DLPNO_batch_max_heavy_atoms, args.DLPNO_batch_size)
+    else:
+        batches, singles = [], pending_mol_ids
+    for batch in batches:
+        if len(batch) > 1:
+            write_batch_input(subinputs_dir, batch, DLPNO_level_of_theory)
+        else:
+            singles.extend(batch)
+    for mol_id in singles:
+        write_single_input(subinputs_dir, mol_id, DLPNO_level_of_theory)
+
 print("Done!")
\ No newline at end of file
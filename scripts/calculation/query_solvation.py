@@ -0,0 +1,74 @@
+from argparse import ArgumentParser
+import os
+
+import pandas as pd
+
+from radical_workflow.calculation.cosmo_query import SolvationQueryService
+from radical_workflow.calculation.watchdog import default_cosmotherm_rules
+from radical_workflow.calculation.cosmo_staging import stage_solvent_database, mark_staged_solvents
+
+parser = ArgumentParser()
+parser.add_argument('--cache', type=str, default='solvation_cache.sqlite',
+                    help='sqlite file with the cached COSMOtherm results and the queue of missing ones')
+parser.add_argument('--solutes', type=str, nargs="+", required=True,
+                    help='solute ids, or a .csv file with an id column')
+parser.add_argument('--solvents', type=str, nargs="+", required=True,
+                    help='solvent cosmo_names as in the pure-solvent list')
+parser.add_argument('--temperatures', type=float, nargs="+", default=[298.15],
+                    help='temperatures (K) of the queries')
+parser.add_argument('--no_enthalpy', action='store_true',
+                    help='do not compute dHsolv, which needs the results at T - 1 and T + 1 as well')
+parser.add_argument('--output', type=str, default=None,
+                    help='csv file to which the results are written')
+parser.add_argument('--run', action='store_true',
+                    help='run COSMOtherm for the queued combinations and query again')
+parser.add_argument('--scratch_dir', type=str, default='scratch',
+                    help='scratch directory for the COSMOtherm runs')
+parser.add_argument('--watchdog', action='store_true',
+                    help='watch the COSMOtherm outputs while jobs run and abort jobs that are bound to fail')
+parser.add_argument('--output_folder', type=str, default='output',
+                    help='output folder name')
+parser.add_argument('--COSMO_folder', type=str, default='COSMO_calc',
+                    help='folder for COSMO calculation',)
+parser.add_argument('--COSMO_input_pure_solvents', type=str, required=False, default='common_solvent_list_final.csv',
+                    help='input file containing pure solvents used for COSMO calculation.')
+parser.add_argument('--COSMO_staging_dir', type=str, default=None,
+                    help='node-local folder to which the solvent .cosmo files are copied once and read from, see main_COSMO_calc.py')
+parser.add_argument('--COSMOtherm_path', type=str, required=False, default=None,
+                    help='path to COSMOthermo')
+parser.add_argument('--COSMO_database_path', type=str, required=False, default=None,
+                    help='path to COSMO_database')
+
+args = parser.parse_args()
+
+if len(args.solutes) == 1 and args.solutes[0].endswith(".csv"):
+    solutes = list(pd.read_csv(args.solutes[0])["id"])
+else:
+    solutes = args.solutes
+
+df_pure = pd.read_csv(args.COSMO_input_pure_solvents)
+if args.COSMO_staging_dir is not None:
+    # solvents that are not staged, or whose staged copy is stale, are read from the shared database
+    staged_solvents = stage_solvent_database(df_pure, args.COSMOtherm_path, args.COSMO_database_path, args.COSMO_staging_dir)
+    df_pure = mark_staged_solvents(df_pure, staged_solvents)
+outputs_dir = os.path.join(args.output_folder, args.COSMO_folder, "outputs")
+service = SolvationQueryService(args.cache, df_pure, outputs_dir, args.COSMOtherm_path, args.COSMO_database_path, args.COSMO_staging_dir)
+
+results, missing = service.query(solutes, args.solvents, args.temperatures, enthalpy=not args.no_enthalpy)
+print(f"{len(results)} combinations cached, {len(missing)} queued")
+
+if args.run and missing:
+    watchdog_rules = default_cosmotherm_rules() if args.watchdog else None
+    n_done = service.run_pending(args.scratch_dir, watchdog_rules)
+    print(f"{n_done} COSMOtherm runs done")
+    results, missing = service.query(solutes, args.solvents, args.temperatures, enthalpy=not args.no_enthalpy)
+    print(f"{len(results)} combinations cached, {len(missing)} still missing")
+
+rows = [dict(solute=solute, solvent=solvent, temperature=T, **values) for (solute, solvent, T), values in results.items()]
+df_results = pd.DataFrame(rows, columns=["solute", "solvent", "temperature", "H", "lngamma", "pv", "dGsolv", "dHsolv"])
+if args.output is not None:
+    df_results.to_csv(args.output, index=False)
+else:
+    print(df_results.to_string(index=False))
+
+service.close()
@@ -0,0 +1,140 @@
+from argparse import ArgumentParser
+import os
+import shutil
+
+from joblib import Parallel, delayed
+
+from radical_workflow.calculation.orca_runner import run_orca, get_node_memory, get_orca_resources
+from radical_workflow.calculation.orca_resources import pack_jobs
+from radical_workflow.calculation.watchdog import default_orca_rules
+from radical_workflow.calculation.wft_calculation import split_orca_batch_log, split_orca_batch_input
+from radical_workflow.parser.orca_log_status import classify_orca_log, ORCA_NORMAL, ORCA_UNFINISHED
+
+parser = ArgumentParser()
+parser.add_argument('--output_folder', type=str, default='output',
+                    help='output folder name')
+parser.add_argument('--DLPNO_sp_folder', type=str, default='DLPNO_sp',
+                    help='folder for DLPNO calculations')
+parser.add_argument('--ORCA_path', type=str, required=True,
+                    help='path to ORCA')
+parser.add_argument('--scratch_dir', type=str, required=True,
+                    help='scratch folder for the ORCA runs')
+parser.add_argument('--node_memory', type=int, default=None,
+                    help='memory (MB) of the node used to size maxcore on retries, detected if not given')
+parser.add_argument('--max_retries', type=int, default=4,
+                    help='maximum number of reruns of an input with new resources or SCF settings')
+parser.add_argument('--n_passes', type=int, default=5,
+                    help='number of passes over the input folders')
+parser.add_argument('--resource_history', type=str, default=None,
+                    help='csv to which the peak memory and wall time of each run are appended')
+parser.add_argument('--pack', action='store_true',
+                    help='run several inputs at once when their nprocs and maxcore fit on the node together')
+parser.add_argument('--watchdog', action='store_true',
+                    help='watch the ORCA logs while jobs run and abort jobs that are bound to fail, e.g. on a MaxCore error')
+parser.add_argument('--node_cores', type=int, default=None,
+                    help='number of cores of the node used for packing, detected if not given')
+
+args = parser.parse_args()
+
+submit_dir = os.path.abspath(os.getcwd())
+DLPNO_sp_dir = os.path.join(submit_dir, args.output_folder, args.DLPNO_sp_folder)
+inputs_dir = os.path.join(DLPNO_sp_dir, "inputs")
+outputs_dir = os.path.join(DLPNO_sp_dir, "outputs")
+node_memory = args.node_memory if args.node_memory is not None else get_node_memory()
+node_cores = args.node_cores if args.node_cores is not None else os.cpu_count()
+print(f"node memory {node_memory} MB, node cores {node_cores}")
+
+def get_input_resources(input_path):
+    try:
+        with open(input_path) as f:
+            maxcore, nprocs = get_orca_resources(f.read())
+    except FileNotFoundError:
+        return None
+    return nprocs, (maxcore or 0) * nprocs
+
+def run_input(subinputs_dir, suboutputs_dir, input_name, job_memory):
+    scratch_dir = os.path.join(args.scratch_dir, input_name)
+    os.makedirs(scratch_dir, exist_ok=True)
+    shutil.copyfile(os.path.join(subinputs_dir, f"{input_name}.tmp"), os.path.join(scratch_dir, f"{input_name}.in"))
+    log_path = os.path.join(scratch_dir, f"{input_name}.log")
+
+    # the rules keep the state of one log, so each input gets its own
+    watchdog_rules = default_orca_rules() if args.watchdog else None
+    status = run_orca(f"{input_name}.in", f"{input_name}.log", args.ORCA_path, job_memory, args.max_retries, watchdog_rules, scratch_dir, args.resource_history)
+    batch_path = os.path.join(subinputs_dir, f"{input_name}.batch")
+    if os.path.exists(batch_path):
+        print(f"batch {input_name}: {status}")
+        with open(batch_path) as f:
+            mol_ids = f.read().split()
+        with open(os.path.join(scratch_dir, f"{input_name}.in")) as f:
+            mol_id_to_script = split_orca_batch_input(f.read())
+        written = split_orca_batch_log(log_path, mol_ids, scratch_dir) if status is not None else []
+        # the batch ran once, molecules that did not finish get their own input and retries
+        for mol_id in mol_ids:
+            mol_log_path = os.path.join(scratch_dir, f"{mol_id}.log")
+            if mol_id in written and classify_orca_log(mol_log_path) == ORCA_NORMAL:
+                shutil.copyfile(mol_log_path, os.path.join(suboutputs_dir, f"{mol_id}.log"))
+            elif mol_id in mol_id_to_script:
+                print(f"{mol_id} of batch {input_name} did not finish, writing its own input")
+                with open(os.path.join(subinputs_dir, f"{mol_id}.in"), "w") as f:
+                    f.write(mol_id_to_script[mol_id])
+        os.remove(os.path.join(subinputs_dir, f"{input_name}.tmp"))
+        os.remove(batch_path)
+    elif status is None:
+        print(f"{input_name} failed - no log file")
+        os.rename(os.path.join(subinputs_dir, f"{input_name}.tmp"), os.path.join(subinputs_dir, f"{input_name}.in"))
+    elif status == ORCA_UNFINISHED:
+        print(f"{input_name} failed - unknown error")
+        shutil.copyfile(log_path, os.path.join(subinputs_dir, f"{input_name}.log"))
+        os.rename(os.path.join(subinputs_dir, f"{input_name}.tmp"), os.path.join(subinputs_dir, f"{input_name}.in"))
+    else:
+        print(f"{input_name} done - {status}")
+        shutil.copyfile(log_path, os.path.join(suboutputs_dir, f"{input_name}.log"))
+        os.remove(os.path.join(subinputs_dir, f"{input_name}.tmp"))
+
+    shutil.rmtree(scratch_dir)
+
+print("Starting DLPNO calculations...")
+
+for _ in range(args.n_passes):
+    for subinputs_dir in sorted(os.listdir(inputs_dir)):
+        if not subinputs_dir.startswith("inputs_"):
+            continue
+        ids = subinputs_dir.split("inputs_")[1]
+        subinputs_dir = os.path.join(inputs_dir, subinputs_dir)
+        suboutputs_dir = os.path.join(outputs_dir, f"outputs_{ids}")
+        os.makedirs(suboutputs_dir, exist_ok=True)
+
+        tried = set()
+        while True:
+            candidates = []
+            for file in sorted(os.listdir(subinputs_dir)):
+                input_name = os.path.splitext(file)[0]
+                if not file.endswith(".in") or input_name in tried:
+                    continue
+                resources = get_input_resources(os.path.join(subinputs_dir, file))
+                if resources is not None:
+                    candidates.append((input_name, *resources))
+            if not candidates:
+                break
+
+            if args.pack:
+                selected = pack_jobs(candidates, node_cores, node_memory)
+            else:
+                selected = [(candidates[0][0], node_memory)]
+
+            claimed = []
+            for input_name, job_memory in selected:
+                tried.add(input_name)
+                try:
+                    os.rename(os.path.join(subinputs_dir, f"{input_name}.in"), os.path.join(subinputs_dir, f"{input_name}.tmp"))
+                except FileNotFoundError:
+                    # picked up by another worker
+                    continue
+                print(f"input {input_name}")
+                claimed.append((input_name, job_memory))
+
+            if claimed:
+                Parallel(n_jobs=len(claimed), backend="threading")(delayed(run_input)(subinputs_dir, suboutputs_dir, input_name, job_memory) for input_name, job_memory in claimed)
+
+print("Done!")
@@ -0,0 +1,19 @@
+import os
+import sys
+
+from radical_workflow.calculation.wft_calculation import split_orca_batch_log
+
+log_path = sys.argv[1]
+batch_path = sys.argv[2]
+save_dir = sys.argv[3]
+
+with open(batch_path) as f:
+    mol_ids = f.read().split()
+
+written = split_orca_batch_log(log_path, mol_ids, save_dir)
+for mol_id in written:
+    print(f"{mol_id} -> {os.path.join(save_dir, f'{mol_id}.log')}")
+
+not_started = [mol_id for mol_id in mol_ids if mol_id not in written]
+if not_started:
+    print(f"Not started, inputs will be remade: {' '.join(not_started)}")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import pickle as pkl
+import numpy as np
+
+from rdmc.mol import RDKitMol
+
+from radical_workflow.parser.connectivity import perceive_adjacency, xyz_str_to_arrays
+
+# compare perceive_adjacency with the Open Babel perception of RDKitMol.FromXYZ that it replaces
+# usage: check_connectivity.py [semiempirical or DFT parser output .pkl]
+# without a pickle, only the geometries below are checked, which sit on both sides of the cutoffs
+
+KNOWN_GEOMETRIES = {
+    "water": """O 0.000000 0.000000 0.117300
+H 0.000000 0.757200 -0.469200
+H 0.000000 -0.757200 -0.469200""",
+    "methyl radical": """C 0.000000 0.000000 0.000000
+H 1.079000 0.000000 0.000000
+H -0.539500 0.934500 0.000000
+H -0.539500 -0.934500 0.000000""",
+    "ethanol": """C -0.047000 0.552000 0.000000
+C 1.202000 -0.347000 0.000000
+O -1.204000 -0.218000 0.000000
+H -0.040000 1.196000 0.885000
+H -0.040000 1.196000 -0.885000
+H 2.143000 0.205000 0.000000
+H 1.171000 -0.991000 0.883000
+H 1.171000 -0.991000 -0.883000
+H -1.961000 0.383000 0.000000""",
+    "acetonitrile": """C 0.000000 0.000000 -1.458000
+C 0.000000 0.000000 0.000000
+N 0.000000 0.000000 1.157000
+H 1.027000 0.000000 -1.822000
+H -0.513500 0.889400 -1.822000
+H -0.513500 -0.889400 -1.822000""",
+    "benzene": "\n".join(
+        [f"C {1.39 * np.cos(a):.6f} {1.39 * np.sin(a):.6f} 0.000000" for a in np.arange(6) * np.pi / 3]
+        + [f"H {2.47 * np.cos(a):.6f} {2.47 * np.sin(a):.6f} 0.000000" for a in np.arange(6) * np.pi / 3]),
+    "stretched C-C, bonded": """C 0.000000 0.000000 0.000000
+C 1.950000 0.000000 0.000000""",
+    "stretched C-C, broken": """C 0.000000 0.000000 0.000000
+C 2.000000 0.000000 0.000000""",
+    "chloromethane": """C 0.000000 0.000000 0.000000
+Cl 1.781000 0.000000 0.000000
+H -0.363000 1.028000 0.000000
+H -0.363000 -0.514000 0.890000
+H -0.363000 -0.514000 -0.890000""",
+    "H3 triangle, over-bonded H": """H 0.000000 0.000000 0.000000
+H 0.740000 0.000000 0.000000
+H 0.370000 0.600000 0.000000""",
+    "SF6": "\n".join(["S 0.000000 0.000000 0.000000"]
+                     + [f"F {x:.6f} {y:.6f} {z:.6f}" for x, y, z in 1.56 * np.vstack([np.eye(3), -np.eye(3)])]),
+    "silane": "\n".join(["Si 0.000000 0.000000 0.000000"]
+                        + [f"H {x:.6f} {y:.6f} {z:.6f}" for x, y, z in 1.48 / np.sqrt(3) * np.array(
+                            [[1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]])]),
+    "SiF6 dianion": "\n".join(["Si 0.000000 0.000000 0.000000"]
+                              + [f"F {x:.6f} {y:.6f} {z:.6f}" for x, y, z in 1.68 * np.vstack([np.eye(3), -np.eye(3)])]),
+    "phosphine": """P 0.000000 0.000000 0.127000
+H 1.190000 0.000000 -0.635000
+H -0.595000 1.030000 -0.635000
+H -0.595000 -1.030000 -0.635000""",
+    "PF5": "\n".join(["P 0.000000 0.000000 0.000000", "F 0.000000 0.000000 1.577000", "F 0.000000 0.000000 -1.577000"]
+                     + [f"F {1.534 * np.cos(a):.6f} {1.534 * np.sin(a):.6f} 0.000000" for a in np.arange(3) * 2 * np.pi / 3]),
+    # bonds are added by increasing z, the H comes after five F and a P with five bonds only takes F or Cl
+    "PF5 and an H on top, not bonded": "\n".join(
+        ["P 0.000000 0.000000 0.000000", "F 0.000000 0.000000 -1.577000", "H 0.000000 0.000000 1.420000"]
+        + [f"F {1.534 * np.cos(a):.6f} {1.534 * np.sin(a):.6f} 0.000000" for a in np.arange(4) * np.pi / 2]),
+}
+
+
+def openbabel_adjacency(xyz):
+    return RDKitMol.FromXYZ(xyz, header=False, sanitize=False).GetAdjacencyMatrix()
+
+
+def check(name, xyz):
+    symbols, coords = xyz_str_to_arrays(xyz)
+    expected = openbabel_adjacency(xyz)
+    perceived = perceive_adjacency(symbols, coords)
+    if expected.shape == perceived.shape and (expected == perceived).all():
+        return True
+    print(f"{name}: bonds differ")
+    print("Open Babel:", sorted(zip(*np.nonzero(np.triu(expected)))))
+    print("perceive_adjacency:", sorted(zip(*np.nonzero(np.triu(perceived)))))
+    return False
+
+
+xyzs = dict(KNOWN_GEOMETRIES)
+if len(sys.argv) > 1:
+    with open(sys.argv[1], "rb") as f:
+        jobs = pkl.load(f)
+    for mol_id, job in jobs.items():
+        # semiempirical jobs have one entry per conformer
+        confs = job.items() if "mol_smi" not in job else [(None, job)]
+        for conf_id, conf in confs:
+            for key in ["semiempirical_xyz", "dft_xyz_std_ori"]:
+                if key in conf:
+                    xyzs[f"{mol_id} {conf_id} {key}"] = conf[key]
+
+n_failed = sum(not check(name, xyz) for name, xyz in xyzs.items())
+print(f"{len(xyzs) - n_failed} of {len(xyzs)} geometries have the same bonds as Open Babel")
+sys.exit(1 if n_failed else 0)
@@ -7,6 +7,8 @@ import time
 from tqdm import tqdm
 import numpy as np
 
+from radical_workflow.parser.cosmo_store import CosmoStore
+
 logging.basicConfig(level=logging.INFO)
 start_time = time.time()
 
@@ -191,43 +193,41 @@ if not only_cosmo:
 logging.warning("Loading cosmo results")
 cosmo_results_dict = {}
 if job_type == "reactants_products":
-    with open("./calculations/aug11b/reactants_products_aug11b_cosmo_results.pkl", "rb") as f:
-        cosmo_results_dict["aug11b"] = pkl.load(f)
-    with open("./calculations/sep1a_filtered/reactants_products_sep1a_filtered_cosmo_results.pkl", "rb") as f:
-        cosmo_results_dict["sep1a_filtered"] = pkl.load(f)
+    cosmo_results_dict["aug11b"] = CosmoStore("./calculations/aug11b/reactants_products_aug11b_cosmo_results")
+    cosmo_results_dict["sep1a_filtered"] = CosmoStore("./calculations/sep1a_filtered/reactants_products_sep1a_filtered_cosmo_results")
 elif job_type == "ts":
-    with open("./calculations/sep1a/ts_sep1a_cosmo_results.pkl", "rb") as f:
-        cosmo_results_dict["sep1a"] = pkl.load(f)
+    cosmo_results_dict["sep1a"] = CosmoStore("./calculations/sep1a/ts_sep1a_cosmo_results")
 
 def fill_column_cosmo(results_dict, hased_table_df_dict, mol_id_to_index_dict):
     props = ['H (bar)', 'ln(gamma)', 'Pvap (bar)', 'Gsolv (kcal/mol)', 'Hsolv (kcal/mol)']
-    for project, df in inputs_df_dict.items():
-        cosmo_result = results_dict[project]
-
-        solvent_names = cosmo_result["solvent_name"].unique()
-        temps = cosmo_result["temp (K)"].unique()
-
-        columns_dict = {f"{solvent_name}_{temp}_{prop}": [None for _ in df.index] for solvent_name in solvent_names for temp in temps for prop in props}
-        for row_ind in tqdm(cosmo_result.index):
-            solvent_name = cosmo_result.loc[row_ind, "solvent_name"]
-            temp = cosmo_result.loc[row_ind, "temp (K)"]
-            mol_id = cosmo_result.loc[row_ind, "solute_name"]
-            index = mol_id_to_index_dict[project][mol_id]
-            for prop in props:
-                columns_dict[f"{solvent_name}_{temp}_{prop}"][index] = cosmo_result.loc[row_ind, prop]
-
-        for column_name, column in columns_dict.items():
-            df[column_name] = column
-
-def combine_cosmo_results(results_dict, mol_id_to_index_dict):
+    for project, df in hased_table_df_dict.items():
+        store = results_dict[project]
+
+        # rows of df for the solutes of the store, filled straight from the store arrays
+        solutes = [solute for solute in store.solute_names if solute in mol_id_to_index_dict[project]]
+        rows = np.array([mol_id_to_index_dict[project][solute] for solute in solutes], dtype=int)
+        for prop in props:
+            values = store.get(prop, solutes=solutes)
+            for solvent_ind, solvent_name in enumerate(store.solvent_names):
+                for temp_ind, temp in enumerate(store.temps):
+                    column = np.full(len(df.index), np.nan)
+                    column[rows] = values[:, solvent_ind, temp_ind]
+                    df[f"{solvent_name}_{temp}_{prop}"] = column
+
+def combine_cosmo_results(results_dict, output_path, chunk_size=10000):
+    """
+    Write the long tables of all stores with a project column to output_path as csv, chunk by
+    chunk of solutes, so that only one chunk of the table is in memory at a time.
+    """
     header = ['solvent_name', 'solvent_smiles', 'solute_name', 'solute_smiles', 'temp (K)',
-        'H (bar)', 'ln(gamma)', 'Pvap (bar)', 'Gsolv (kcal/mol)', 'Hsolv (kcal/mol)']
+        'H (bar)', 'ln(gamma)', 'Pvap (bar)', 'Gsolv (kcal/mol)', 'Hsolv (kcal/mol)', 'project']
 
-    df = pd.DataFrame(columns=header)
-    for project, cosmo_result in results_dict.items():
-        cosmo_result["project"] = project
-        df = pd.concat([df, cosmo_result], axis=0)
-    return df
+    pd.DataFrame(columns=header).to_csv(output_path, index=False)
+    for project, store in results_dict.items():
+        for start in tqdm(range(0, len(store.solute_names), chunk_size)):
+            df = store.to_dataframe(solutes=store.solute_names[start:start + chunk_size])
+            df["project"] = project
+            df[header].to_csv(output_path, mode="a", header=False, index=False)
 
 # logging.warning("Filling cosmo results")
 # start_time_1 = time.time()
@@ -239,17 +239,12 @@ def combine_cosmo_results(results_dict, mol_id_to_index_dict):
 
 logging.warning("Combining cosmo results")
 start_time_1 = time.time()
-cosmo_df_merged = combine_cosmo_results(cosmo_results_dict, mol_id_to_index_dict)
-end_time_1 = time.time()
-logging.warning(f"Time taken: {end_time_1 - start_time_1}")
-
-logging.warning("Saving cosmo results table")
 if job_type == "reactants_products":
-    with open("./calculations/reactants_products_aug11b_sep1a_filtered_cosmo_results_table.pkl", "wb") as f:
-        pkl.dump(cosmo_df_merged, f, protocol=pkl.HIGHEST_PROTOCOL)
+    combine_cosmo_results(cosmo_results_dict, "./calculations/reactants_products_aug11b_sep1a_filtered_cosmo_results_table.csv")
 elif job_type == "ts":
-    with open("./calculations/ts_sep1a_cosmo_results_table.pkl", "wb") as f:
-        pkl.dump(cosmo_df_merged, f, protocol=pkl.HIGHEST_PROTOCOL)
+    combine_cosmo_results(cosmo_results_dict, "./calculations/ts_sep1a_cosmo_results_table.csv")
+end_time_1 = time.time()
+logging.warning(f"Time taken: {end_time_1 - start_time_1}")
 
 logging.warning("Done")
 end_time = time.time()
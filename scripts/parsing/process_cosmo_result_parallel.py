@@ -1,12 +1,27 @@
 import os
 import sys
 import pickle as pkl
+import hashlib
 import pandas as pd
-from joblib import Parallel, delayed
 from tqdm import tqdm
-from radical_workflow.parser.cosmo_parser import cosmo_parser
+from radical_workflow.parser.cosmo_store import read_cosmo_tar_values, read_cosmo_tar_temperatures, create_cosmo_store, write_cosmo_store_dHsolv, COSMO_PARSER_VERSION
+from radical_workflow.parser.parse_cache import ParseCache, parse_with_cache
 
-def main(input_smiles_path, output_file_name, n_jobs, solvent_path):
+def get_tar_path(mol_id):
+    ids = str(int(int(mol_id.split("id")[1])/1000))
+    return os.path.join("output", "COSMO_calc", "outputs", f"outputs_{ids}", f"{mol_id}.tar")
+
+def get_cosmo_temperatures(mol_ids):
+    """The temperatures of the first COSMO tar found, which all tars of a campaign share."""
+    for mol_id in mol_ids:
+        tar_path = get_tar_path(mol_id)
+        if os.path.isfile(tar_path):
+            temps = read_cosmo_tar_temperatures(tar_path)
+            if temps:
+                return temps
+    raise ValueError("No COSMO tar with a .tab file found to take the temperatures from")
+
+def main(input_smiles_path, output_file_name, n_jobs, solvent_path, chunk_size=10000, cache_path=None, temperatures=None):
 
     submit_dir = os.getcwd()
 
@@ -16,34 +31,39 @@ def main(input_smiles_path, output_file_name, n_jobs, solvent_path):
         mol_smis = list(df_solute.smiles)
     else:
         mol_smis = list(df_solute.rxn_smi)
-    mol_id_to_mol_smi = dict(zip(mol_ids, mol_smis))
 
     df_solvent = pd.read_csv(solvent_path)
-    solvent_name_to_smi = dict(zip(df_solvent.cosmo_name, df_solvent.smiles))
-
-    out = Parallel(n_jobs=n_jobs, backend="multiprocessing", verbose=5)(delayed(cosmo_parser)(mol_id) for mol_id in tqdm(mol_ids))
-    failed_mol_ids = [mol_ids[i] for i in range(len(mol_ids)) if out[i] is None]
-    out = [x for x in out if x is not None]
-    for each_data_lists in tqdm(out):
-        for each_data_list in each_data_lists:
-            for each_data in each_data_list:
-                each_data[1] = solvent_name_to_smi[each_data[0]]
-                each_data[3] = mol_id_to_mol_smi[each_data[2]]
+    solvent_names = list(df_solvent.cosmo_name)
+    solvent_to_index = {solvent_name: ind for ind, solvent_name in enumerate(solvent_names)}
+    # as in main_COSMO_calc.py --COSMO_temperatures, by default taken from the tars
+    temperatures = get_cosmo_temperatures(mol_ids) if temperatures is None else temperatures
+    print(f"Temperatures: {' '.join(temperatures)} K")
+    temp_to_index = {temp: ind for ind, temp in enumerate(temperatures)}
 
-    headers = ['solvent_name', 'solvent_smiles', 'solute_name', 'solute_smiles', 'temp (K)',
-            'H (bar)', 'ln(gamma)', 'Pvap (bar)', 'Gsolv (kcal/mol)', 'Hsolv (kcal/mol)']
+    # solute x solvent x temperature x property array on disk, filled chunk by chunk of solutes
+    store_dir = os.path.join(submit_dir, output_file_name)
+    values = create_cosmo_store(store_dir, mol_ids, mol_smis, solvent_names, list(df_solvent.smiles), temperatures)
 
-    cosmo_data_dict = {header: [] for header in headers}
-    for each_data_lists in tqdm(out):
-        for each_data_list in each_data_lists:
-            for each_data in each_data_list:
-                for i, header in enumerate(headers):
-                    cosmo_data_dict[header].append(each_data[i])
+    # tars that did not change since the last run are taken from the cache, as long as the
+    # solvents and temperatures are the same
+    cache = ParseCache(cache_path or os.path.join(submit_dir, f"{output_file_name}_parse_cache.db"), "cosmo", COSMO_PARSER_VERSION)
+    key = hashlib.md5("|".join([",".join(solvent_names), ",".join(temperatures)]).encode()).hexdigest()
 
-    df_cosmo = pd.DataFrame(cosmo_data_dict)
+    failed_mol_ids = []
+    for start in tqdm(range(0, len(mol_ids), chunk_size)):
+        chunk_mol_ids = mol_ids[start:start + chunk_size]
+        tasks = [(get_tar_path(mol_id), key, (mol_id, solvent_to_index, temp_to_index)) for mol_id in chunk_mol_ids]
+        out = parse_with_cache(cache, tasks, read_cosmo_tar_values, n_jobs, verbose=0)
+        for i, mol_values in enumerate(out):
+            if mol_values is None:
+                failed_mol_ids.append(chunk_mol_ids[i])
+            else:
+                values[start + i] = mol_values
+        values.flush()
+    del values
+    cache.close()
 
-    with open(os.path.join(submit_dir, f'{output_file_name}.pkl'), 'wb') as outfile:
-        pkl.dump(df_cosmo, outfile, protocol=pkl.HIGHEST_PROTOCOL)
+    write_cosmo_store_dHsolv(store_dir)
 
     with open(os.path.join(submit_dir, f'{output_file_name}_failed.pkl'), 'wb') as outfile:
         pkl.dump(failed_mol_ids, outfile, protocol=pkl.HIGHEST_PROTOCOL)
@@ -58,8 +78,12 @@ if __name__ == "__main__":
     output_file_name = sys.argv[2]
     n_jobs = int(sys.argv[3])
     solvent_path = sys.argv[4]
+    chunk_size = int(sys.argv[5]) if len(sys.argv) > 5 else 10000
+    cache_path = sys.argv[6] if len(sys.argv) > 6 else None
+    # comma separated, e.g. 297.15,298.15,299.15
+    temperatures = sys.argv[7].split(",") if len(sys.argv) > 7 else None
 
     # input_smiles_path = "reactants_products_wb97xd_and_xtb_opted_ts_combo_results_hashed_chart_aug11b.csv"
     # n_jobs = 8
     # output_file_name = "test"
-    main(input_smiles_path, output_file_name, n_jobs, solvent_path)
\ No newline at end of file
+    main(input_smiles_path, output_file_name, n_jobs, solvent_path, chunk_size, cache_path, temperatures)
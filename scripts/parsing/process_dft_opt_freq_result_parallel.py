@@ -4,14 +4,15 @@ import os
 import sys
 import pandas as pd
 import pickle as pkl
-from tqdm import tqdm
-from joblib import Parallel, delayed
 
-from radical_workflow.parser.dft_opt_freq_parser import dft_opt_freq_parser
+from radical_workflow.parser.dft_opt_freq_parser import dft_opt_freq_parser, DFT_OPT_FREQ_PARSER_VERSION
+from radical_workflow.parser.parse_cache import ParseCache, parse_with_cache
 
 input_smiles_path = sys.argv[1]
 output_file_name = sys.argv[2]
 n_jobs = int(sys.argv[3])
+# logs that did not change since the last run are taken from this cache
+cache_path = sys.argv[4] if len(sys.argv) > 4 else f"{output_file_name}_parse_cache.db"
 
 # input_smiles_path = "reactants_products_wb97xd_and_xtb_opted_ts_combo_results_hashed_chart_aug11b.csv"
 # n_jobs = 8
@@ -20,7 +21,14 @@ df = pd.read_csv(input_smiles_path)
 mol_ids = df['id'].tolist()
 mol_id_to_smi = dict(zip(df['id'], df['smiles']))
 
-out = Parallel(n_jobs=n_jobs, backend="multiprocessing", verbose=5)(delayed(dft_opt_freq_parser)(mol_id, mol_id_to_smi[mol_id]) for mol_id in tqdm(mol_ids))
+def get_log_path(mol_id):
+    ids = str(int(int(mol_id.split("id")[1])/1000))
+    return os.path.join("output", "DFT_opt_freq", "outputs", f"outputs_{ids}", f"{mol_id}.log")
+
+cache = ParseCache(cache_path, "dft_opt_freq", DFT_OPT_FREQ_PARSER_VERSION)
+tasks = [(get_log_path(mol_id), mol_id_to_smi[mol_id], (mol_id, mol_id_to_smi[mol_id])) for mol_id in mol_ids]
+out = parse_with_cache(cache, tasks, dft_opt_freq_parser, n_jobs)
+cache.close()
 
 failed_jobs = dict()
 valid_jobs = dict()
@@ -2,68 +2,20 @@ import os
 import sys
 import pickle as pkl
 import pandas as pd
-from joblib import Parallel, delayed
-
-class OrcaLog(object):
-    def __init__(self, path):
-        self.path = path
-
-    def check_for_errors(self):
-        """
-        Checks for common errors in an Orca log file.
-        If any are found, this method will raise an error and crash.
-        """
-        with open(os.path.join(self.path), 'r') as f:
-            lines = f.readlines()
-            error = None
-            for line in reversed(lines):
-                # check for common error messages
-                if 'This wavefunction IS NOT CONVERGED!' in line:
-                    error = 'This wavefunction IS NOT CONVERGED!'
-                    break
-                elif 'ORCA finished by error termination in SCF' in line:
-                    error = 'SCF'
-                    break
-                elif 'ORCA finished by error termination in MDCI' in line:
-                    error = 'MDCI'
-                    break
-                elif 'Error : multiplicity' in line:
-                    error = 'The multiplicity and charge combination are wrong.'
-                    break
-                elif 'Wavefunction not fully converged!' in line:
-                    error = 'Wavefunction not fully converged!'
-                    break
-                elif 'ORCA finished by error termination in GTOInt' in line:
-                    error = 'GTOInt'
-                    break
-                elif 'ORCA TERMINATED NORMALLY' in line:
-                    break
-        return error
-
-    def load_energy(self):
-        """
-        Load the energy in J/ml from an Orca log file. Only the last energy
-        in the file is returned. The zero-point energy is *not* included in
-        the returned value.
-        """
-        e_elect = None
-        with open(self.path, 'r') as f:
-            for line in f:
-                if 'FINAL SINGLE POINT ENERGY' in line:  # for all methods in Orca
-                    try:
-                        e_elect = float(line.split()[-1])
-                    except:
-                        print(self.path)
-                        print(line)
-                        raise
-        if e_elect is None:
-            raise LogError('Unable to find energy in Orca output file.')
-        return e_elect
+
+from radical_workflow.parser.xtb_orca_log import OrcaLog, LogError
+from radical_workflow.parser.parse_cache import ParseCache, parse_with_cache
+
+# bump when parser returns something else for the same log, to invalidate parse caches
+DLPNO_PARSER_VERSION = 3
+
+def get_log_path(mol_id):
+    ids = str(int(int(mol_id.split("id")[1])/1000))
+    return os.path.join("output", "DLPNO_sp", "outputs", f"outputs_{ids}", f"{mol_id}.log")
 
 def parser(mol_id, mol_smi):
 
-    ids = str(int(int(mol_id.split("id")[1])/1000)) 
-    orca_log = os.path.join("output", "DLPNO_sp", "outputs", f"outputs_{ids}", f"{mol_id}.log")
+    orca_log = get_log_path(mol_id)
     failed_jobs = dict()
     valid_job = dict()
 
@@ -79,22 +31,34 @@ def parser(mol_id, mol_smi):
             failed_jobs[mol_id]['reason'] = error
             return failed_jobs, valid_job
 
+        try:
+            dlpno_energy = olog.load_energy()
+        except LogError as e:
+            failed_jobs[mol_id] = dict()
+            failed_jobs[mol_id]['status'] = False
+            failed_jobs[mol_id]['reason'] = str(e)
+            return failed_jobs, valid_job
+
         valid_job[mol_id] = dict()
         valid_job[mol_id]['mol_smi'] = mol_smi
-        valid_job[mol_id]['dlpno_energy'] = olog.load_energy()
+        valid_job[mol_id]['dlpno_energy'] = dlpno_energy
 
     else:
         failed_jobs[mol_id] = dict()
         failed_jobs[mol_id]['reason'] = "file not found"
     return failed_jobs, valid_job
 
-def main(input_smiles_path, output_file_name, n_jobs):
+def main(input_smiles_path, output_file_name, n_jobs, cache_path=None):
 
     df = pd.read_csv(input_smiles_path)
     mol_ids = df['id'].tolist()
     mol_id_to_smi = dict(zip(df['id'].tolist(), df['smiles'].tolist()))
 
-    out = Parallel(n_jobs=n_jobs, backend="multiprocessing", verbose=5)(delayed(parser)(mol_id, mol_id_to_smi[mol_id]) for mol_id in mol_ids)
+    # logs that did not change since the last run are taken from the cache
+    cache = ParseCache(cache_path or f"{output_file_name}_parse_cache.db", "dlpno_sp", DLPNO_PARSER_VERSION)
+    tasks = [(get_log_path(mol_id), mol_id_to_smi[mol_id], (mol_id, mol_id_to_smi[mol_id])) for mol_id in mol_ids]
+    out = parse_with_cache(cache, tasks, parser, n_jobs)
+    cache.close()
 
     failed_jobs = dict()
     valid_jobs = dict()
@@ -117,5 +81,6 @@ if __name__ == "__main__":
     input_smiles_path = sys.argv[1]
     output_file_name = sys.argv[2]
     n_jobs = int(sys.argv[3])
+    cache_path = sys.argv[4] if len(sys.argv) > 4 else None
 
-    main(input_smiles_path, output_file_name, n_jobs)
\ No newline at end of file
+    main(input_smiles_path, output_file_name, n_jobs, cache_path)
\ No newline at end of file
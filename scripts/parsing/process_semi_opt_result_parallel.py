@@ -5,14 +5,15 @@ import os
 import sys
 import pandas as pd
 import pickle as pkl
-from tqdm import tqdm
-from joblib import Parallel, delayed
 
-from radical_workflow.parser.semiempirical_opt_parser import semiempirical_opt_parser
+from radical_workflow.parser.semiempirical_opt_parser import semiempirical_opt_parser, SEMIEMPIRICAL_OPT_PARSER_VERSION
+from radical_workflow.parser.parse_cache import ParseCache, parse_with_cache
 
 input_smiles_path = sys.argv[1]
 output_file_name = sys.argv[2]
 n_jobs = int(sys.argv[3])
+# tars that did not change since the last run are taken from this cache
+cache_path = sys.argv[4] if len(sys.argv) > 4 else f"{output_file_name}_parse_cache.db"
 
 ##
 # input_smiles_path = "inputs/reactants_products_aug11b_inputs.csv"
@@ -26,7 +27,14 @@ mol_ids = list(df.id)
 ##
 # mol_ids = mol_ids[:500]
 
-out = Parallel(n_jobs=n_jobs, backend="multiprocessing", verbose=5)(delayed(semiempirical_opt_parser)(mol_id, mol_id_to_smi[mol_id]) for mol_id in tqdm(mol_ids))
+def get_tar_path(mol_id):
+    ids = str(int(int(mol_id.split("id")[1])/1000))
+    return os.path.join("output", "semiempirical_opt", "outputs", f"outputs_{ids}", f"{mol_id}.tar")
+
+cache = ParseCache(cache_path, "semiempirical_opt", SEMIEMPIRICAL_OPT_PARSER_VERSION)
+tasks = [(get_tar_path(mol_id), mol_id_to_smi[mol_id], (mol_id, mol_id_to_smi[mol_id])) for mol_id in mol_ids]
+out = parse_with_cache(cache, tasks, semiempirical_opt_parser, n_jobs)
+cache.close()
 
 failed_jobs = dict()
 valid_jobs = dict()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import pandas as pd
+
+from radical_workflow.parser.log_status import triage_logs, LOG_TRIAGE_VERSION
+from radical_workflow.parser.parse_cache import ParseCache
+
+# usage: triage_logs.py <outputs dir> <output csv> <n_threads> [g16|orca|xtb|any] [cache .db]
+outputs_dir = sys.argv[1]
+output_file_name = sys.argv[2]
+n_jobs = int(sys.argv[3])
+program = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] != "any" else None
+cache = ParseCache(sys.argv[5], "log_triage", LOG_TRIAGE_VERSION) if len(sys.argv) > 5 else None
+
+log_paths = []
+for root, dirs, files in os.walk(outputs_dir):
+    for file in files:
+        if file.endswith(".log"):
+            log_paths.append(os.path.join(root, file))
+log_paths.sort()
+print(f"Triaging {len(log_paths)} logs in {outputs_dir}...")
+
+path_to_triage = triage_logs(log_paths, program, n_jobs, cache)
+if cache is not None:
+    cache.close()
+
+df = pd.DataFrame({
+    "log": log_paths,
+    "program": [path_to_triage[log_path].program for log_path in log_paths],
+    "status": [path_to_triage[log_path].status.value for log_path in log_paths],
+    "reason": [path_to_triage[log_path].reason for log_path in log_paths],
+    "snippet": [path_to_triage[log_path].snippet for log_path in log_paths],
+})
+df.to_csv(output_file_name, index=False)
+print(df["status"].value_counts().to_string())
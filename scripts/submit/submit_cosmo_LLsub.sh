@@ -30,7 +30,7 @@ scratch_dir=$TMPDIR/$USER/$SLURM_JOB_ID-$SLURM_ARRAY_TASK_ID-$LLSUB_RANK-$LLSUB_
 mkdir -p $scratch_dir
 echo $scratch_dir
 
-python -u $QMD_PATH/scripts/calculation/main_COSMO_calc.py --input_smiles $input_smiles --xyz_DFT_opt_dict $xyz_DFT_opt_dict --scratch_dir $scratch_dir --COSMO_input_pure_solvents $QMD_PATH/common_solvent_list_final.csv --COSMOtherm_path $COSMOTHERM_PATH --COSMO_database_path $COSMO_DATABASE_PATH --task_id $LLSUB_RANK --num_tasks $LLSUB_SIZE
+python -u $QMD_PATH/scripts/calculation/main_COSMO_calc.py --input_smiles $input_smiles --xyz_DFT_opt_dict $xyz_DFT_opt_dict --scratch_dir $scratch_dir --COSMO_input_pure_solvents $QMD_PATH/common_solvent_list_final.csv --COSMOtherm_path $COSMOTHERM_PATH --COSMO_database_path $COSMO_DATABASE_PATH --COSMO_staging_dir $TMPDIR/cosmo_solvents --task_id $LLSUB_RANK --num_tasks $LLSUB_SIZE
 
 rm -rf $scratch_dir
 
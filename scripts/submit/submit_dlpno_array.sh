@@ -48,9 +48,21 @@ xyz_DFT_opt_dict=$3
 echo $xyz_DFT_opt_dict
 DLPNO_sp_n_procs=24
 DLPNO_sp_job_ram=7200
+# batch_size 1 runs every molecule on its own
+DLPNO_batch_size=1
+DLPNO_batch_max_heavy_atoms=4
+DLPNO_batch_n_procs=4
+# opt in with DLPNO_resource_model="--DLPNO_resource_model" and DLPNO_pack="--pack"
+DLPNO_resource_model=""
+DLPNO_pack=""
 
 echo "DLPNO_sp_n_procs $DLPNO_sp_n_procs"
 echo "DLPNO_sp_job_ram $DLPNO_sp_job_ram"
+echo "DLPNO_batch_size $DLPNO_batch_size"
+echo "DLPNO_batch_max_heavy_atoms $DLPNO_batch_max_heavy_atoms"
+echo "DLPNO_batch_n_procs $DLPNO_batch_n_procs"
+echo "DLPNO_resource_model $DLPNO_resource_model"
+echo "DLPNO_pack $DLPNO_pack"
 
 #svp calculations
 DLPNO_sp_folder="DLPNO_sp"
@@ -65,74 +77,23 @@ python -u $QMD_PATH/scripts/calculation/main_make_dlpno_sp_input.py \
 --DLPNO_level_of_theory "$DLPNO_level_of_theory" \
 --DLPNO_sp_n_procs $DLPNO_sp_n_procs \
 --DLPNO_sp_job_ram $DLPNO_sp_job_ram \
+--DLPNO_batch_size $DLPNO_batch_size \
+--DLPNO_batch_max_heavy_atoms $DLPNO_batch_max_heavy_atoms \
+--DLPNO_batch_n_procs $DLPNO_batch_n_procs \
+$DLPNO_resource_model \
+--DLPNO_resource_history output/$DLPNO_sp_folder/resource_history.csv \
 --task_id $SLURM_ARRAY_TASK_ID \
 --num_tasks $SLURM_ARRAY_TASK_COUNT \
 --ORCA_path $orcadir
 
 SubmitDir=`pwd`
 
-echo "Starting DLPNO calculations..."
-
-for i in {1..5}; do
-    cd $SubmitDir
-    for folder in $SubmitDir/output/$DLPNO_sp_folder/inputs/inputs_*; do
-
-        folderind="${folder##$SubmitDir/output/$DLPNO_sp_folder/inputs/inputs_}"
-        echo "folderind $folderind"
-        
-        for filename in $folder/*.in; do
-            
-            input=`basename $filename .in`
-            
-            if [ -e $folder/$input.in ]
-            then
-                echo "input $input"
-                mv $folder/$input.in $folder/$input.tmp
-                ScratchDir=$TMPDIR/$USER/orca/$SLURM_JOB_ID-$SLURM_ARRAY_TASK_ID-$input
-                echo "ScratchDir $ScratchDir"
-                mkdir -p $ScratchDir
-
-                cd $ScratchDir
-                echo $PATH
-                cp $folder/$input.tmp $input.in
-                $orcadir/orca $input.in > $input.log
-                if [ -e $input.log ]
-                then
-                    if grep -Fq "ORCA TERMINATED NORMALLY" $input.log
-                    then
-                        echo "done"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    elif grep -Fq "ORCA finished by error termination" $input.log
-                    then
-                        echo "done with error termination"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    elif grep -Fq "The basis set was either not assigned or not available for this element" $input.log
-                    then
-                        echo "basis set not available"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    elif grep -Fq "This wavefunction IS NOT FULLY CONVERGED!" $input.log
-                    then
-                        echo "wavefunction not converged"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    else
-                        echo "failed - unknown error"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/inputs/inputs_$folderind/
-                        mv $folder/$input.tmp $folder/$input.in
-                    fi
-                else
-                    echo "failed - no log file"
-                    mv $folder/$input.tmp $folder/$input.in
-                fi
-                cd $SubmitDir
-                rm -rf $ScratchDir
-            fi
-        done
-    done
-done
+python -u $QMD_PATH/scripts/calculation/run_dlpno_sp_inputs.py \
+--DLPNO_sp_folder $DLPNO_sp_folder \
+--ORCA_path $orcadir \
+--scratch_dir $TMPDIR/$USER/orca/$SLURM_JOB_ID-$SLURM_ARRAY_TASK_ID \
+--resource_history output/$DLPNO_sp_folder/resource_history.csv \
+$DLPNO_pack
 
 # f12 calculations
 DLPNO_sp_folder="DLPNO_sp_f12"
@@ -147,71 +108,20 @@ python -u $QMD_PATH/scripts/calculation/main_make_dlpno_sp_input.py \
 --DLPNO_level_of_theory "$DLPNO_level_of_theory" \
 --DLPNO_sp_n_procs $DLPNO_sp_n_procs \
 --DLPNO_sp_job_ram $DLPNO_sp_job_ram \
+--DLPNO_batch_size $DLPNO_batch_size \
+--DLPNO_batch_max_heavy_atoms $DLPNO_batch_max_heavy_atoms \
+--DLPNO_batch_n_procs $DLPNO_batch_n_procs \
+$DLPNO_resource_model \
+--DLPNO_resource_history output/$DLPNO_sp_folder/resource_history.csv \
 --ORCA_path $orcadir \
 --task_id $SLURM_ARRAY_TASK_ID \
 --num_tasks $SLURM_ARRAY_TASK_COUNT
 
 SubmitDir=`pwd`
 
-echo "Starting DLPNO calculations..."
-
-for i in {1..5}; do
-    cd $SubmitDir
-    for folder in $SubmitDir/output/$DLPNO_sp_folder/inputs/inputs_*; do
-
-        folderind="${folder##$SubmitDir/output/$DLPNO_sp_folder/inputs/inputs_}"
-        echo "folderind $folderind"
-        
-        for filename in $folder/*.in; do
-            
-            input=`basename $filename .in`
-            
-            if [ -e $folder/$input.in ]
-            then
-                echo "input $input"
-                mv $folder/$input.in $folder/$input.tmp
-                ScratchDir=$TMPDIR/$USER/orca/$SLURM_JOB_ID-$SLURM_ARRAY_TASK_ID-$input
-                echo "ScratchDir $ScratchDir"
-                mkdir -p $ScratchDir
-
-                cd $ScratchDir
-                echo $PATH
-                cp $folder/$input.tmp $input.in
-                $orcadir/orca $input.in > $input.log
-                if [ -e $input.log ]
-                then
-                    if grep -Fq "ORCA TERMINATED NORMALLY" $input.log
-                    then
-                        echo "done"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    elif grep -Fq "ORCA finished by error termination" $input.log
-                    then
-                        echo "done with error termination"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    elif grep -Fq "The basis set was either not assigned or not available for this element" $input.log
-                    then
-                        echo "basis set not available"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    elif grep -Fq "This wavefunction IS NOT FULLY CONVERGED!" $input.log
-                    then
-                        echo "wavefunction not converged"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/outputs/outputs_$folderind/
-                        rm $folder/$input.tmp
-                    else
-                        echo "failed - unknown error"
-                        cp $input.log $SubmitDir/output/$DLPNO_sp_folder/inputs/inputs_$folderind/
-                        mv $folder/$input.tmp $folder/$input.in
-                    fi
-                else
-                    echo "failed - no log file"
-                    mv $folder/$input.tmp $folder/$input.in
-                fi
-                cd $SubmitDir
-                rm -rf $ScratchDir
-            fi
-        done
-    done
-done
\ No newline at end of file
+python -u $QMD_PATH/scripts/calculation/run_dlpno_sp_inputs.py \
+--DLPNO_sp_folder $DLPNO_sp_folder \
+--ORCA_path $orcadir \
+--scratch_dir $TMPDIR/$USER/orca/$SLURM_JOB_ID-$SLURM_ARRAY_TASK_ID \
+--resource_history output/$DLPNO_sp_folder/resource_history.csv \
+$DLPNO_pack
\ No newline at end of file